@@ -5,10 +5,30 @@ import re
 import json
 import logging
 import random
-from datetime import datetime, timedelta
-from flask import Flask, request, render_template_string
-from threading import Thread, Lock
+import sqlite3
+import sys
+import math
+import hashlib
+import mmap
+import zlib
+import numpy as np
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from flask import Flask, Response, request, render_template_string, send_from_directory, abort
+from threading import Thread, Lock, Event, BoundedSemaphore, current_thread, get_ident, enumerate as threading_enumerate
+from collections import deque, OrderedDict, namedtuple
+from types import MappingProxyType
+from itertools import islice
+from queue import Queue, Empty, Full
+from functools import lru_cache
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
+try:
+    import fcntl  # blokada lidera (tylko POSIX)
+except ImportError:
+    fcntl = None
 
 # ========== KONFIGURACJA ==========
 app = Flask(__name__)
@@ -16,7 +36,31 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 
 # Zmienne środowiskowe
 DISCORD_WEBHOOK = os.getenv('DISCORD_WEBHOOK', '').strip()
-BASE_CHECK_INTERVAL = int(os.getenv('CHECK_INTERVAL', '180'))
+BASE_CHECK_INTERVAL = int(os.getenv('CHECK_INTERVAL', '180'))  # interwał, dopóki harmonogram nie zbierze danych
+SCAN_MIN_INTERVAL = int(os.getenv('SCAN_MIN_INTERVAL', '60'))
+SCAN_MAX_INTERVAL = int(os.getenv('SCAN_MAX_INTERVAL', '900'))
+REQUEST_BUDGET_PER_HOUR = int(os.getenv('REQUEST_BUDGET_PER_HOUR', '600'))
+SCAN_TARGET_NEW = float(os.getenv('SCAN_TARGET_NEW', '3'))  # ile nowych ofert ma się pojawić między skanami
+FETCH_WORKERS = max(1, int(os.getenv('FETCH_WORKERS', '4')))
+MAX_REQUESTS_PER_SECOND = float(os.getenv('MAX_REQUESTS_PER_SECOND', '2'))  # górna granica adaptacyjnego tempa (0 = bez limitu)
+MIN_REQUESTS_PER_SECOND = float(os.getenv('MIN_REQUESTS_PER_SECOND', '0.2'))  # dolna granica po spowolnieniach
+FETCH_BURST = max(1, int(os.getenv('FETCH_BURST', '1')))  # ile zapytań naraz może wydać kubełek tokenów
+FETCH_SLOW_SECONDS = float(os.getenv('FETCH_SLOW_SECONDS', '5'))  # wolniejsza odpowiedź = zwolnij
+FETCH_RETRIES = int(os.getenv('FETCH_RETRIES', '1'))  # ponowienia strony po błędzie sieci/429/5xx
+FETCH_BACKOFF_BASE = float(os.getenv('FETCH_BACKOFF_BASE', '2'))
+FETCH_BACKOFF_MAX = float(os.getenv('FETCH_BACKOFF_MAX', '300'))
+BREAKER_FAILURES = int(os.getenv('BREAKER_FAILURES', '5'))  # kolejne błędy, po których bezpiecznik wstrzymuje skan
+BREAKER_COOLDOWN = float(os.getenv('BREAKER_COOLDOWN', '300'))
+BREAKER_MAX_COOLDOWN = float(os.getenv('BREAKER_MAX_COOLDOWN', '3600'))
+MAX_CONCURRENT_PROFILES = max(1, int(os.getenv('MAX_CONCURRENT_PROFILES', '4')))
+NOTIFY_QUEUE_SIZE = int(os.getenv('NOTIFY_QUEUE_SIZE', '100'))
+NOTIFY_LINGER_SECONDS = float(os.getenv('NOTIFY_LINGER_SECONDS', '0.5'))
+SCANNER_MODE = os.getenv('SCANNER_MODE', 'single').strip().lower()  # 'leader' = wiele workerów, jeden skaner
+LEADER_HEARTBEAT_SECONDS = float(os.getenv('LEADER_HEARTBEAT_SECONDS', '5'))
+DETAIL_WORKERS = max(1, int(os.getenv('DETAIL_WORKERS', '2')))
+DETAIL_REQUESTS_PER_SECOND = float(os.getenv('DETAIL_REQUESTS_PER_SECOND', '0.5'))  # osobny budżet - nie zjada limitu skanu
+DETAIL_QUEUE_SIZE = int(os.getenv('DETAIL_QUEUE_SIZE', '50'))
+DETAIL_CACHE_FRESH_SECONDS = float(os.getenv('DETAIL_CACHE_FRESH_SECONDS', '3600'))  # młodszy wpis bez rewalidacji
 
 # ========== CENNIK IPHONE ==========
 IPHONE_PRICE_RANGES = {
@@ -57,69 +101,1009 @@ CONFIG = {
     "max_ad_age_hours": 8760,
     "max_pages": 50,
     "include_damaged": True,
-    "ignore_age_limit": True
+    "ignore_age_limit": True,
+    "incremental_crawl": True,
+    "stop_after_seen_pages": 2,
+    "deep_scan_every": 10,
+    "auto_price_ranges": False,  # stosuj zakresy wyliczone z indeksu cen rynkowych
+    "price_overrides": {},  # model -> {"min", "max"} nadpisujące cennik
+    "enrich_details": False,  # po alercie dociągnij pamięć/baterię/sprzedawcę ze strony oferty i zaktualizuj wiadomość
+    "repost_mode": "tag",  # ponownie wystawione oferty: "tag" (oznacz w alercie), "suppress" (nie wysyłaj), "off"
+    "min_deal_score": None,  # wysyłaj tylko oferty z wynikiem okazji >= progu (None = wszystkie)
+    "profiles": []  # dodatkowe wyszukiwania: {"name", "url", "max_pages", "active", + opcjonalne filtry}
 }
+MAIN_PROFILE_NAME = "główny"
 
 # ========== PLIKI I ŚCIEŻKI ==========
-SEEN_ADS_FILE = os.getenv('SEEN_ADS_FILE', 'seen_ads.json')
+SEEN_ADS_FILE = os.getenv('SEEN_ADS_FILE', 'seen_ads.json')  # dawny format - importowany jednorazowo do bazy
+SEEN_ADS_DB = os.getenv('SEEN_ADS_DB', 'seen_ads.db')
+SEEN_ADS_TTL_DAYS = float(os.getenv('SEEN_ADS_TTL_DAYS', '90'))
+SEEN_ADS_CACHE_SIZE = int(os.getenv('SEEN_ADS_CACHE_SIZE', '50000'))
+SEEN_BLOOM_FP_RATE = float(os.getenv('SEEN_BLOOM_FP_RATE', '0.001'))  # 0 = bez filtra Blooma
+SEEN_BLOOM_CAPACITY = int(os.getenv('SEEN_BLOOM_CAPACITY', '1000000'))
+SCHEDULER_FILE = os.getenv('SCHEDULER_FILE', 'scheduler_stats.json')
+CRAWL_INDEX_SIZE = int(os.getenv('CRAWL_INDEX_SIZE', '20000'))
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiling')
+LEADER_LOCK_FILE = os.getenv('LEADER_LOCK_FILE', 'scanner.lock')
+SHARED_STATE_DB = os.getenv('SHARED_STATE_DB', 'shared_state.db')
+PROFILE_SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL', '0.005'))
+PRICE_HISTORY_DIR = os.getenv('PRICE_HISTORY_DIR', 'price_history')
+DETAIL_CACHE_DIR = os.getenv('DETAIL_CACHE_DIR', 'detail_cache')
+REPOST_INDEX_FILE = os.getenv('REPOST_INDEX_FILE', 'repost_index.json')
+REPOST_WINDOW_DAYS = float(os.getenv('REPOST_WINDOW_DAYS', '14'))
+REPOST_INDEX_SIZE = int(os.getenv('REPOST_INDEX_SIZE', '20000'))
+REPOST_SIMILARITY = float(os.getenv('REPOST_SIMILARITY', '0.6'))  # szacowane podobieństwo Jaccarda cech
+PAGE_ARCHIVE_DIR = os.getenv('PAGE_ARCHIVE_DIR', '').strip()  # puste = archiwum stron wyłączone
+PAGE_ARCHIVE_MAX_MB = float(os.getenv('PAGE_ARCHIVE_MAX_MB', '512'))  # po przekroczeniu usuwane są najstarsze segmenty
+PAGE_ARCHIVE_SEGMENT_MB = float(os.getenv('PAGE_ARCHIVE_SEGMENT_MB', '16'))
+PAGE_ARCHIVE_QUEUE_SIZE = int(os.getenv('PAGE_ARCHIVE_QUEUE_SIZE', '200'))
+PRICE_HISTORY_DEDUPE = int(os.getenv('PRICE_HISTORY_DEDUPE', '200000'))  # ile ostatnich ID pamiętać, by nie liczyć oferty wielokrotnie
+PRICE_INDEX_WINDOW_DAYS = int(os.getenv('PRICE_INDEX_WINDOW_DAYS', '30'))
+PRICE_INDEX_MIN_SAMPLES = int(os.getenv('PRICE_INDEX_MIN_SAMPLES', '30'))
+PRICE_SUGGEST_MIN_PCT = float(os.getenv('PRICE_SUGGEST_MIN_PCT', '5'))  # poniżej - podejrzanie tanio (atrapy, oszustwa)
+PRICE_SUGGEST_MAX_PCT = float(os.getenv('PRICE_SUGGEST_MAX_PCT', '30'))  # górna granica "okazji"
+DEAL_SCORE_RATE = float(os.getenv('DEAL_SCORE_RATE', '0.05'))  # tempo adaptacji bieżącej mediany
+DEAL_MIN_SAMPLES = int(os.getenv('DEAL_MIN_SAMPLES', '10'))
 
 # ========== KLASY ==========
+MonitorSnapshot = namedtuple('MonitorSnapshot', [
+    'last_found_time', 'last_status_time', 'consecutive_zero_count',
+    'last_first_alert_s',  # czas od startu cyklu do pierwszego alertu
+    'last_cycle_pages',
+    'last_cycle_fresh_rate',  # nieznane (nowe na OLX) oferty/min w ostatnim cyklu; None - brak danych
+    'profile_stats',  # profil -> liczniki (tylko do odczytu)
+])
+
 class MonitorState:
+    """Stan monitora publikowany jako niezmienne migawki - odczyt bez blokady"""
+    def __init__(self):
+        now = datetime.now()
+        self.snapshot = MonitorSnapshot(now, now, 0, None, 0, None, MappingProxyType({}))
+        self.lock = TimedLock('monitor_state')
+
+    def update(self, **changes):
+        """Podmienia wskazane pola i publikuje nową migawkę"""
+        with self.lock:
+            self.snapshot = self.snapshot._replace(**changes)
+            return self.snapshot
+
+    def update_profile(self, name, add=None, **values):
+        """Aktualizuje liczniki profilu (`add` = przyrosty) i publikuje migawkę; zwraca nowe liczniki"""
+        with self.lock:
+            profiles = dict(self.snapshot.profile_stats)
+            stats = dict(profiles.get(name) or new_profile_stats())
+            for key, amount in (add or {}).items():
+                stats[key] += amount
+            stats.update(values)
+            profiles[name] = MappingProxyType(stats)
+            self.snapshot = self.snapshot._replace(profile_stats=MappingProxyType(profiles))
+            return profiles[name]
+
+class PolitenessLimiter:
+    """Globalny limit zapytań do OLX - wspólny dla wszystkich wątków pobierających"""
+    def __init__(self, max_per_second):
+        self.interval = 1.0 / max_per_second if max_per_second > 0 else 0.0
+        self.next_slot = time.monotonic()
+        self.lock = Lock()
+
+    def acquire(self):
+        """Rezerwuje najbliższy wolny slot i czeka na niego (poza blokadą)"""
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        wait = slot - now
+        if wait > 0:
+            time.sleep(wait)
+
+class BloomFilter:
+    """Filtr Blooma na identyfikatorach całkowitych: 'nie ma' jest pewne, 'jest' z zadanym prawd. błędu"""
+    def __init__(self, capacity, fp_rate):
+        self.capacity = max(1000, int(capacity))
+        self.fp_rate = fp_rate
+        self.num_bits = max(8, int(-self.capacity * math.log(fp_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.items = 0
+
+    def _positions(self, key):
+        # podwójne haszowanie (Kirsch-Mitzenmacher) z mieszania splitmix64
+        h = (key + 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+        h = ((h ^ (h >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+        h = ((h ^ (h >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+        h ^= h >> 31
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        m = self.num_bits
+        return [(h1 + i * h2) % m for i in range(self.num_hashes)]
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.items += 1
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def stats(self):
+        return {
+            'bytes': len(self.bits),
+            'hashes': self.num_hashes,
+            'items': self.items,
+            'capacity': self.capacity,
+            'est_fp_rate': (1 - math.exp(-self.num_hashes * self.items / self.num_bits)) ** self.num_hashes,
+        }
+
+class SeenAdsStore:
+    """Trwały zbiór widzianych ogłoszeń (ID ofert) w SQLite (WAL) z wygasaniem po TTL"""
+    def __init__(self, path, ttl_days, cache_size, bloom_fp_rate=0.0, bloom_capacity=1000000, lock=None):
+        self.path = path
+        self.ttl_seconds = ttl_days * 86400
+        self.cache_size = cache_size
+        self.bloom_fp_rate = bloom_fp_rate
+        self.bloom_capacity = bloom_capacity
+        self.bloom = None
+        self.conn = None
+        self.pending = {}  # ID -> (czas, czy_nowy), do zapisu przy flush()
+        self.cache = OrderedDict()  # LRU ID potwierdzonych w bazie
+        self.count = 0
+        self.db_lookups = 0
+        self.bloom_skips = 0
+        self.lock = lock or Lock()
+
+    def open(self):
+        """Otwiera bazę (idempotentne)"""
+        with self.lock:
+            if self.conn is not None:
+                return
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS seen_ids (ad_id INTEGER PRIMARY KEY, seen_at REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS seen_ids_seen_at ON seen_ids (seen_at)")
+            self.count = conn.execute("SELECT COUNT(*) FROM seen_ids").fetchone()[0]
+            self.conn = conn
+            self._rebuild_bloom()
+
+    def _rebuild_bloom(self):
+        """Buduje filtr Blooma strumieniowo z bazy (bez trzymania listy ID w pamięci)"""
+        if self.bloom_fp_rate <= 0 or self.conn is None:
+            self.bloom = None
+            return
+        bloom = BloomFilter(max(self.bloom_capacity, self.count * 2), self.bloom_fp_rate)
+        for (ad_id,) in self.conn.execute("SELECT ad_id FROM seen_ids"):
+            bloom.add(ad_id)
+        for ad_id in self.pending:
+            bloom.add(ad_id)
+        self.bloom = bloom
+
+    def __contains__(self, key):
+        with self.lock:
+            return self._contains(key)
+
+    def _contains(self, key):
+        if key in self.pending:
+            return True
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return True
+        if self.conn is None:
+            return False
+        if self.bloom is not None and key not in self.bloom:
+            self.bloom_skips += 1
+            return False
+        self.db_lookups += 1
+        row = self.conn.execute("SELECT seen_at FROM seen_ids WHERE ad_id = ?", (key,)).fetchone()
+        if row is None:
+            return False
+        # nadal widoczne na OLX - odśwież czas, żeby TTL nie usunął aktywnej oferty
+        if time.time() - row[0] > self.ttl_seconds / 2:
+            self.pending[key] = (time.time(), False)
+        else:
+            self._cache_put(key)
+        return True
+
+    def known_keys(self, keys):
+        """Zwraca podzbiór już widzianych kluczy całej strony: jedna blokada i jedno zapytanie do bazy"""
+        with self.lock:
+            return self._known_keys(keys)
+
+    def _known_keys(self, keys):
+        known = set()
+        lookup = []
+        for key in keys:
+            if key in self.pending:
+                known.add(key)
+            elif key in self.cache:
+                self.cache.move_to_end(key)
+                known.add(key)
+            elif self.conn is None:
+                continue
+            elif self.bloom is not None and key not in self.bloom:
+                self.bloom_skips += 1
+            else:
+                lookup.append(key)
+        if not lookup:
+            return known
+        self.db_lookups += len(lookup)
+        now = time.time()
+        for start in range(0, len(lookup), 500):
+            chunk = lookup[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            for key, seen_at in self.conn.execute(f"SELECT ad_id, seen_at FROM seen_ids WHERE ad_id IN ({placeholders})", chunk):
+                known.add(key)
+                # nadal widoczne na OLX - odśwież czas, żeby TTL nie usunął aktywnej oferty
+                if now - seen_at > self.ttl_seconds / 2:
+                    self.pending[key] = (now, False)
+                else:
+                    self._cache_put(key)
+        return known
+
+    def _cache_put(self, key):
+        self.cache[key] = None
+        self.cache.move_to_end(key)
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def _mark_new(self, key):
+        self.pending[key] = (time.time(), True)
+        if self.bloom is not None:
+            self.bloom.add(key)
+
+    def add(self, key):
+        with self.lock:
+            if not self._contains(key):
+                self._mark_new(key)
+
+    def add_if_new(self, key):
+        """Atomowo sprawdza i oznacza klucz; True gdy był nowy"""
+        with self.lock:
+            if self._contains(key):
+                return False
+            self._mark_new(key)
+            return True
+
+    def add_new_many(self, keys):
+        """Atomowo oznacza klucze jako widziane; zwraca zbiór tych, które były nowe"""
+        with self.lock:
+            known = self._known_keys(keys)
+            added = set()
+            for key in keys:
+                if key not in known and key not in added:
+                    self._mark_new(key)
+                    added.add(key)
+            return added
+
+    def __len__(self):
+        with self.lock:
+            return self.count + sum(1 for _, new in self.pending.values() if new)
+
+    def flush(self):
+        """Zapisuje tylko nowe/odświeżone klucze (O(nowe)) w jednej transakcji"""
+        with self.lock:
+            if not self.pending or self.conn is None:
+                return 0
+            rows = [(key, ts) for key, (ts, _) in self.pending.items()]
+            self.conn.execute("BEGIN")
+            try:
+                before = self.conn.total_changes
+                self.conn.executemany("INSERT OR IGNORE INTO seen_ids (ad_id, seen_at) VALUES (?, ?)", rows)
+                inserted = self.conn.total_changes - before
+                self.conn.executemany("UPDATE seen_ids SET seen_at = ? WHERE ad_id = ?", [(ts, key) for key, ts in rows])
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.count += inserted
+            for key, _ in rows:
+                self._cache_put(key)
+            self.pending.clear()
+            # filtr przepełniony - odbuduj z większą pojemnością
+            if self.bloom is not None and self.bloom.items > self.bloom.capacity:
+                self._rebuild_bloom()
+            return inserted
+
+    def prune(self):
+        """Usuwa ogłoszenia niewidziane dłużej niż TTL"""
+        with self.lock:
+            if self.conn is None or self.ttl_seconds <= 0:
+                return 0
+            cur = self.conn.execute("DELETE FROM seen_ids WHERE seen_at < ?", (time.time() - self.ttl_seconds,))
+            removed = cur.rowcount
+            self.count -= removed
+            if removed:
+                self.cache.clear()
+                # usunięte ID zostają w filtrze jako fałszywe trafienia - odbuduj po większym sprzątaniu
+                if self.bloom is not None and removed > self.count // 10:
+                    self._rebuild_bloom()
+            return removed
+
+    def import_keys(self, keys):
+        """Jednorazowy import (np. z dawnego seen_ads.json)"""
+        with self.lock:
+            for key in keys:
+                self._mark_new(key)
+        return self.flush()
+
+    def stats(self):
+        """Statystyki pamięci indeksu (do panelu)"""
+        with self.lock:
+            return {
+                'count': self.count + sum(1 for _, new in self.pending.values() if new),
+                'cache_entries': len(self.cache),
+                'cache_bytes': sys.getsizeof(self.cache) + len(self.cache) * 32,
+                'pending': len(self.pending),
+                'db_lookups': self.db_lookups,
+                'bloom_skips': self.bloom_skips,
+                'bloom': self.bloom.stats() if self.bloom is not None else None,
+            }
+
+class ScanScheduler:
+    """Adaptacyjny harmonogram skanów z tempa pojawiania się ofert per (dzień tygodnia, godzina)"""
+    def __init__(self, path, base_interval, min_interval, max_interval, budget_per_hour, target_new, jitter=0.2, alpha=0.3):
+        self.path = path
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.budget_per_hour = budget_per_hour
+        self.target_new = target_new
+        self.jitter = jitter
+        self.alpha = alpha
+        self.rates = {}  # "dzień-godzina" -> [średnia EWMA ofert/min, liczba próbek]
+        self.requests = deque()  # (time.time(), liczba zapytań) z ostatniej godziny
+        self.last_delay = None
+        self.last_reason = "brak danych"
+        self.lock = Lock()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.rates = json.load(f).get('rates', {})
+            logging.info(f"📈 Wczytano statystyki harmonogramu ({len(self.rates)} przedziałów)")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.error(f"❌ Błąd wczytywania statystyk harmonogramu: {e}")
+
+    def save(self):
+        try:
+            with self.lock:
+                data = {'rates': dict(self.rates)}
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logging.error(f"❌ Błąd zapisu statystyk harmonogramu: {e}")
+
+    @staticmethod
+    def bucket(moment):
+        return f"{moment.weekday()}-{moment.hour}"
+
+    def record_cycle(self, rate, requests_made, now=None):
+        """Rejestruje wynik cyklu: tempo pojawiania się nieznanych ofert (na minutę, None - brak danych)"""
+        now = now or datetime.now()
+        with self.lock:
+            self.requests.append((time.time(), requests_made))
+            if rate is not None:
+                entry = self.rates.setdefault(self.bucket(now), [rate, 0])
+                entry[0] = rate if entry[1] == 0 else self.alpha * rate + (1 - self.alpha) * entry[0]
+                entry[1] += 1
+        self.save()
+
+    def _estimate_rate(self, now):
+        """Tempo ofert/min dla bieżącego przedziału; awaryjnie średnia tej godziny z innych dni, potem globalna"""
+        entry = self.rates.get(self.bucket(now))
+        if entry and entry[1] >= 2:
+            return entry[0], "dzień+godzina"
+        same_hour = [r for key, (r, n) in self.rates.items() if key.endswith(f"-{now.hour}") and n]
+        if same_hour:
+            return sum(same_hour) / len(same_hour), "godzina"
+        every = [r for r, n in self.rates.values() if n]
+        if every:
+            return sum(every) / len(every), "średnia"
+        return None, None
+
+    def next_delay(self, now=None):
+        """Zwraca (opóźnienie w sekundach, powód)"""
+        now = now or datetime.now()
+        with self.lock:
+            rate, source = self._estimate_rate(now)
+            if rate is None:
+                delay, reason = self.base_interval, "brak danych - interwał bazowy"
+            elif rate <= 0:
+                delay, reason = self.max_interval, f"cisza ({source}) - maksymalny interwał"
+            else:
+                delay = self.target_new / rate * 60
+                reason = f"{rate:.2f} ofert/min ({source})"
+            # budżet zapytań: średni koszt cyklu nie może przekroczyć limitu na godzinę
+            horizon = time.time() - 3600
+            while self.requests and self.requests[0][0] < horizon:
+                self.requests.popleft()
+            if self.requests and self.budget_per_hour > 0:
+                used = sum(n for _, n in self.requests)
+                per_cycle = used / len(self.requests)
+                budget_delay = 3600 * per_cycle / self.budget_per_hour
+                if used >= self.budget_per_hour:
+                    budget_delay = max(budget_delay, self.requests[0][0] + 3600 - time.time())
+                if budget_delay > delay:
+                    delay, reason = budget_delay, f"{reason}; limit {self.budget_per_hour} zapytań/h"
+            clamped = max(self.min_interval, min(self.max_interval, delay))
+            if clamped != delay:
+                reason += f"; ograniczono do {'min' if clamped < delay else 'max'}"
+            delay = clamped * random.uniform(1 - self.jitter, 1 + self.jitter)
+            self.last_delay = int(delay)
+            self.last_reason = reason
+            return int(delay), reason
+
+# ========== METRYKI ==========
+class Counter:
+    """Licznik Prometheusa z opcjonalnymi etykietami"""
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.values = {}
+        self.lock = Lock()
+
+    def inc(self, amount=1, *labels):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            items = sorted(self.values.items()) or ([((), 0)] if not self.label_names else [])
+        for labels, value in items:
+            lines.append(f"{self.name}{format_labels(self.label_names, labels)} {value}")
+        return lines
+
+class Gauge:
+    """Wskaźnik liczony przy odczycie /metrics (zero kosztu w gorącej ścieżce)"""
+    def __init__(self, name, help_text, callback):
+        self.name = name
+        self.help_text = help_text
+        self.callback = callback
+
+    def render(self):
+        try:
+            value = float(self.callback())
+        except Exception:
+            value = float('nan')
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge", f"{self.name} {value}"]
+
+class Histogram:
+    """Histogram Prometheusa (opcjonalnie z etykietami); observe() to bisect + dwa dodawania pod krótką blokadą"""
+    def __init__(self, name, help_text, buckets, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.label_names = label_names
+        self.series = {} if label_names else {(): self._new_series()}  # etykiety -> [kubełki..., +Inf, suma]
+        self.lock = Lock()
+
+    def _new_series(self):
+        return [0] * (len(self.buckets) + 1) + [0.0]
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = self._new_series()
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        with self.lock:
+            all_series = sorted((labels, list(series)) for labels, series in self.series.items())
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, series in all_series:
+            pairs = [f'{n}="{v}"' for n, v in zip(self.label_names, labels)]
+            label_text = format_labels(self.label_names, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series[:-1]):
+                cumulative += count
+                bucket_labels = ','.join(pairs + [f'le="{bound}"'])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {cumulative}")
+            lines.append(f"{self.name}_sum{label_text} {series[-1]}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{n}="{str(v)}"' for n, v in zip(names, values))
+    return '{' + pairs + '}'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+FAST_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+LOCK_BUCKETS = (0.00001, 0.0001, 0.001, 0.01, 0.1, 1)
+
+class Metrics:
+    """Rejestr metryk bota (eksportowany na /metrics)"""
     def __init__(self):
-        self.last_found_time = datetime.now()
-        self.last_status_time = datetime.now()
-        self.consecutive_zero_count = 0
+        self.fetch_seconds = Histogram('olx_fetch_seconds', 'Czas pobrania strony OLX', LATENCY_BUCKETS)
+        self.parse_seconds = Histogram('olx_parse_seconds', 'Czas parsowania jednej strony wyników', FAST_BUCKETS)
+        self.filter_seconds = Histogram('olx_filter_seconds', 'Łączny czas filtrów na stronę', FAST_BUCKETS)
+        self.webhook_seconds = Histogram('discord_webhook_seconds', 'Czas odpowiedzi webhooka Discord', LATENCY_BUCKETS)
+        self.pages = Counter('olx_pages_total', 'Sprawdzone strony wyników')
+        self.candidates = Counter('olx_candidates_total', 'Karty ofert znalezione na stronach')
+        self.matches = Counter('olx_matches_total', 'Nowe ogłoszenia spełniające filtry')
+        self.duplicates = Counter('olx_duplicates_total', 'Karty pominięte jako już widziane')
+        self.http_errors = Counter('olx_http_errors_total', 'Błędy HTTP przy pobieraniu OLX', ('status',))
+        self.downloaded_bytes = Counter('olx_downloaded_bytes_total', 'Bajty stron wyników pobrane z sieci (przed rozpakowaniem)')
+        self.unchanged_pages = Counter('olx_unchanged_pages_total', 'Strony wyników bez zmian - parsowanie pominięte', ('reason',))
+        self.lock_wait_seconds = Histogram('olx_lock_wait_seconds', 'Czas oczekiwania na blokadę stanu', LOCK_BUCKETS, ('lock',))
+        self.lock_contended = Counter('olx_lock_contended_total', 'Wejścia do blokady, które musiały czekać', ('lock',))
+        self.gauges = []
+
+    def add_gauge(self, name, help_text, callback):
+        self.gauges.append(Gauge(name, help_text, callback))
+
+    def render(self):
+        lines = []
+        for metric in (self.fetch_seconds, self.parse_seconds, self.filter_seconds, self.webhook_seconds,
+                       self.lock_wait_seconds, self.pages, self.candidates, self.matches, self.duplicates,
+                       self.http_errors, self.downloaded_bytes, self.unchanged_pages, self.lock_contended, *self.gauges):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
+
+class TimedLock:
+    """Nie-reentrant Lock mierzący czas oczekiwania (olx_lock_wait_seconds{lock=...})"""
+    def __init__(self, name):
+        self.name = name
+        self._lock = Lock()
+
+    def acquire(self):
+        wait = 0.0
+        if not self._lock.acquire(blocking=False):
+            started = time.perf_counter()
+            self._lock.acquire()
+            wait = time.perf_counter() - started
+            metrics.lock_contended.inc(1, self.name)
+        metrics.lock_wait_seconds.observe(wait, self.name)
+        return True
+
+    def release(self):
+        self._lock.release()
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+# ========== PROFILOWANIE ==========
+class CycleProfiler:
+    """Próbkujący profiler najbliższych N cykli skanu (domyślnie wyłączony)"""
+    def __init__(self, output_dir, interval=0.005, top_n=25):
+        self.output_dir = output_dir
+        self.interval = interval
+        self.top_n = top_n
         self.lock = Lock()
+        self.remaining = 0
+        self.active = False
+        self.stop_event = Event()
+        self.sampler = None
+        self.last_report = None  # podsumowanie ostatniej sesji (dla panelu)
+        self._reset()
+
+    def _reset(self):
+        self.samples = 0
+        self.folded = {}  # "wątek;f1;f2;...;liść" -> liczba próbek (format flamegraph/speedscope)
+        self.self_counts = {}
+        self.total_counts = {}
+        self.spans = []  # (rodzaj, url, start od początku sesji [s], czas [s], wątek)
+        self.cycle_times = []
+        self.session_started = None
+        self.cycle_started = None
+
+    def arm(self, cycles):
+        """Włącza profilowanie dla kolejnych `cycles` cykli"""
+        with self.lock:
+            if self.remaining == 0:
+                self._reset()
+            self.remaining = max(0, int(cycles))
+        logging.info(f"🔬 Profilowanie włączone na {cycles} cykli")
+
+    def start_cycle(self):
+        if not self.remaining:
+            return
+        now = time.perf_counter()
+        with self.lock:
+            if self.session_started is None:
+                self.session_started = now
+            self.cycle_started = now
+            self.active = True
+        self.stop_event.clear()
+        self.sampler = Thread(target=self._sample_loop, args=(get_ident(),), name='profiler', daemon=True)
+        self.sampler.start()
+
+    def end_cycle(self):
+        if not self.active:
+            return
+        self.stop_event.set()
+        self.sampler.join()
+        with self.lock:
+            self.active = False
+            self.cycle_times.append(time.perf_counter() - self.cycle_started)
+            self.remaining -= 1
+            finished = self.remaining <= 0
+        if finished:
+            self.write_report()
+
+    def span(self, kind, url, started, duration):
+        """Zapisuje czas (wall-clock) etapu strony - tylko gdy sesja jest aktywna"""
+        if self.active:
+            with self.lock:
+                self.spans.append((kind, url, started - self.session_started, duration, current_thread().name))
+
+    def _sample_loop(self, loop_ident):
+        own_ident = get_ident()
+        while not self.stop_event.wait(self.interval):
+            names = {t.ident: t.name for t in threading_enumerate()}
+            for ident, frame in sys._current_frames().items():
+                name = names.get(ident, '')
+                if ident == own_ident or not (ident == loop_ident or name.startswith(('olx-', 'discord-'))):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.reverse()
+                self._record(name.rstrip('_0123456789') or 'main', stack)
+
+    def _record(self, thread_name, stack):
+        with self.lock:
+            self.samples += 1
+            key = ';'.join([thread_name] + stack)
+            self.folded[key] = self.folded.get(key, 0) + 1
+            leaf = stack[-1]
+            self.self_counts[leaf] = self.self_counts.get(leaf, 0) + 1
+            for func in set(stack):
+                self.total_counts[func] = self.total_counts.get(func, 0) + 1
+
+    def summary(self):
+        """Top-N funkcji (własny i łączny czas) + sumy czasów etapów stron"""
+        with self.lock:
+            samples = self.samples or 1
+            top = sorted(self.self_counts.items(), key=lambda item: item[1], reverse=True)[:self.top_n]
+            spans_by_kind = {}
+            for kind, _, _, duration, _ in self.spans:
+                count, total, worst = spans_by_kind.get(kind, (0, 0.0, 0.0))
+                spans_by_kind[kind] = (count + 1, total + duration, max(worst, duration))
+            return {
+                'finished_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'cycles': len(self.cycle_times),
+                'cycle_seconds': [round(t, 2) for t in self.cycle_times],
+                'samples': self.samples,
+                'interval_ms': self.interval * 1000,
+                'top': [{'function': func, 'self_pct': round(100 * count / samples, 1),
+                         'total_pct': round(100 * self.total_counts.get(func, 0) / samples, 1)} for func, count in top],
+                'spans': {kind: {'count': count, 'total_s': round(total, 3), 'max_s': round(worst, 3)}
+                          for kind, (count, total, worst) in spans_by_kind.items()},
+            }
+
+    def write_report(self):
+        """Zapisuje raport (JSON z podsumowaniem i czasami stron) oraz stosy w formacie folded"""
+        report = self.summary()
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            with self.lock:
+                folded = '\n'.join(f"{stack} {count}" for stack, count in self.folded.items())
+                spans = [{'kind': kind, 'url': url, 'start_s': round(start, 4), 'duration_s': round(duration, 4), 'thread': thread}
+                         for kind, url, start, duration, thread in self.spans]
+            report['files'] = {'report': f"profile_{stamp}.json", 'folded': f"profile_{stamp}.folded"}
+            with open(os.path.join(self.output_dir, report['files']['folded']), 'w', encoding='utf-8') as f:
+                f.write(folded + '\n')
+            with open(os.path.join(self.output_dir, report['files']['report']), 'w', encoding='utf-8') as f:
+                json.dump(dict(report, page_spans=spans), f, ensure_ascii=False, indent=2)
+            logging.info(f"🔬 Raport profilowania zapisany: {report['files']['report']} ({report['samples']} próbek)")
+        except OSError as e:
+            logging.error(f"❌ Błąd zapisu raportu profilowania: {e}")
+        self.last_report = report
+
+# ========== HTTP ==========
+HTTP_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept-Encoding': requests.utils.DEFAULT_ACCEPT_ENCODING,  # gzip/deflate (+ br/zstd, gdy zainstalowane brotli/zstandard)
+}
+
+def create_http_session(pool_size):
+    """Tworzy sesję HTTP z pulą połączeń keep-alive (jedna pula dla wszystkich wątków)"""
+    session = requests.Session()
+    session.headers.update(HTTP_HEADERS)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
 
 # ========== ZMIENNE GLOBALNE ==========
 monitor_state = MonitorState()
-seen_ads = set()
-config_lock = Lock()
+seen_ads = SeenAdsStore(SEEN_ADS_DB, SEEN_ADS_TTL_DAYS, SEEN_ADS_CACHE_SIZE, SEEN_BLOOM_FP_RATE, SEEN_BLOOM_CAPACITY,
+                        lock=TimedLock('seen_ads'))
+crawled_links = {}  # profil -> ID wszystkich ofert widzianych na jego listach (nie tylko wysłanych), w kolejności dodania
+crawled_pages = {}  # profil -> {numer strony: czas ostatniego przejrzenia}
+config_lock = TimedLock('config')
+http_session = create_http_session(FETCH_WORKERS * MAX_CONCURRENT_PROFILES + DETAIL_WORKERS)
+cycle_profiler = CycleProfiler(PROFILE_DIR, PROFILE_SAMPLE_INTERVAL)
 
 # ========== FUNKCJE POMOCNICZE ==========
+AD_ID_TOKEN_RE = re.compile(r'-ID([0-9A-Za-z]{1,10})\.html$')
+OLX_HOST_RE = re.compile(r'^https?://(www\.|m\.)?olx\.pl', re.IGNORECASE)
+BASE62_DIGITS = {ch: i for i, ch in enumerate('0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ')}
+
+def canonical_ad_id(url):
+    """Stały identyfikator oferty z URL-a (niezależny od parametrów śledzących i kotwicy).
+    Token '-ID<base62>.html' dekodowany do liczby; inne URL-e - 62-bitowy skrót ścieżki."""
+    path = url.split('#', 1)[0].split('?', 1)[0]
+    m = AD_ID_TOKEN_RE.search(path)
+    if m:
+        ad_id = 0
+        for ch in m.group(1):
+            ad_id = ad_id * 62 + BASE62_DIGITS[ch]
+        return ad_id
+    path = OLX_HOST_RE.sub('', path).rstrip('/')
+    digest = int.from_bytes(hashlib.blake2b(path.encode('utf-8'), digest_size=8).digest(), 'big')
+    # osobna przestrzeń wartości (bit 62) - skróty nie kolidują z dekodowanymi tokenami (< 2^60)
+    return (digest & ((1 << 62) - 1)) | (1 << 62)
+
 def load_seen_ads():
-    """Ładuje zapisane ogłoszenia z pliku"""
-    global seen_ads
-    if os.path.exists(SEEN_ADS_FILE):
-        try:
+    """Otwiera bazę widzianych ogłoszeń; jednorazowo importuje dawny plik seen_ads.json"""
+    try:
+        seen_ads.open()
+        if os.path.exists(SEEN_ADS_FILE):
             with open(SEEN_ADS_FILE, 'r', encoding='utf-8') as f:
                 loaded_ads = json.load(f)
             if isinstance(loaded_ads, list):
-                with monitor_state.lock:
-                    seen_ads = set(loaded_ads)
-                logging.info(f"✅ Załadowano {len(seen_ads)} śledzonych ogłoszeń")
+                imported = seen_ads.import_keys(canonical_ad_id(url) for url in loaded_ads)
+                os.replace(SEEN_ADS_FILE, SEEN_ADS_FILE + '.migrated')
+                logging.info(f"📦 Zaimportowano {imported} ogłoszeń z {SEEN_ADS_FILE}")
             else:
                 logging.error("❌ Nieprawidłowy format pliku seen_ads.json")
-        except Exception as e:
-            logging.error(f"❌ Błąd ładowania seen_ads: {e}")
-    else:
-        logging.info("📁 Plik seen_ads.json nie istnieje, zostanie utworzony przy zapisie")
+        pruned = seen_ads.prune()
+        logging.info(f"✅ Baza widzianych ogłoszeń: {len(seen_ads)} (wygasło: {pruned})")
+    except Exception as e:
+        logging.error(f"❌ Błąd ładowania seen_ads: {e}")
 
 def save_seen_ads():
-    """Zapisuje seen_ads do pliku"""
+    """Dopisuje nowe ogłoszenia do bazy (tylko przyrost) i usuwa wygasłe"""
     try:
-        with monitor_state.lock:
-            ads_list = list(seen_ads)
-        with open(SEEN_ADS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(ads_list, f, ensure_ascii=False, indent=2)
-        logging.info(f"💾 Zapisano {len(ads_list)} ogłoszeń do pliku")
+        inserted = seen_ads.flush()
+        pruned = seen_ads.prune()
+        logging.info(f"💾 Zapisano {inserted} nowych ogłoszeń (wygasło: {pruned}, razem: {len(seen_ads)})")
     except Exception as e:
         logging.error(f"❌ Błąd zapisywania seen_ads: {e}")
 
-def get_random_delay():
-    """Losowe opóźnienie od 2 do 7 minut (w sekundach)"""
-    return random.randint(120, 420)
-
 # ========== FUNKCJE DISCORD ==========
-def send_discord_notification(ad):
-    """Wysyła powiadomienie na Discord (embed)"""
-    if not DISCORD_WEBHOOK:
-        logging.error("❌ Brak skonfigurowanego webhooka Discord!")
-        return False
+DISCORD_MAX_EMBEDS = 10  # limit Discorda na jedną wiadomość webhooka
+DISCORD_MAX_MESSAGE_CHARS = 6000  # limit sumy tekstu embedów w jednej wiadomości
+
+class TokenBucket:
+    """Kubełek tokenów: `rate` tokenów/s, maksymalnie `capacity` naraz; pause_until() wstrzymuje wydawanie"""
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause_until(self, until):
+        """Wstrzymuje wydawanie tokenów do chwili `until` (time.monotonic) i zeruje zapas"""
+        with self.lock:
+            self.paused_until = max(self.paused_until, until)
+            self.tokens = 0
+            self.updated = max(self.updated, until)
+
+    def set_rate(self, rate):
+        """Zmienia tempo; tokeny narosłe do teraz liczone są jeszcze po starym"""
+        with self.lock:
+            now = time.monotonic()
+            if now > self.updated:
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+            self.rate = rate
+
+class DiscordDispatcher:
+    """Wysyła embedy paczkami (do 10 na wiadomość) z poszanowaniem limitów Discorda, ponowieniami i licznikami"""
+    def __init__(self, webhook, rate=2.5, burst=5, max_attempts=5, tracked_messages=500):
+        self.webhook = webhook
+        self.bucket = TokenBucket(rate, burst)  # webhook: ~5 zapytań / 2 s
+        self.max_attempts = max_attempts
+        self.session = requests.Session()
+        self.lock = Lock()
+        self.edit_locks = {}  # ID wiadomości -> Lock: edycje jednej wiadomości po kolei (nowsza treść nie zostanie nadpisana starszą)
+        self.tracked_messages = tracked_messages
+        self.messages = OrderedDict()  # ID wiadomości -> lista embedów (do późniejszej edycji)
+        self.ad_messages = OrderedDict()  # URL ogłoszenia -> (ID wiadomości, pozycja embeda)
+        self.stats = {'delivered': 0, 'dropped': 0, 'messages': 0, 'retries': 0, 'rate_limited': 0, 'edited': 0}
+
+    def _count(self, key, n=1):
+        with self.lock:
+            self.stats[key] += n
+
+    def send_ads(self, ads, track=False):
+        """Wysyła ogłoszenia; zwraca liczbę dostarczonych. `track` zapamiętuje wiadomości do późniejszej edycji (update_ad).
+        Błąd budowania embedów liczy całą paczkę jako utraconą i jest przekazywany dalej."""
+        try:
+            embeds = [build_ad_embed(ad) for ad in ads]
+        except Exception:
+            self._count('dropped', len(ads))
+            raise
+        return self.send_embeds(embeds, [ad['url'] for ad in ads] if track else None)
+
+    def send_embeds(self, embeds, urls=None):
+        """Pakuje embedy w wiadomości i wysyła; zwraca liczbę dostarczonych embedów"""
+        if not self.webhook:
+            logging.error("❌ Brak skonfigurowanego webhooka Discord!")
+            self._count('dropped', len(embeds))
+            return 0
+        delivered = 0
+        offset = 0
+        for batch in pack_embeds(embeds):
+            response = self._post(batch, wait=urls is not None)
+            if response is not None:
+                delivered += len(batch)
+                self._count('delivered', len(batch))
+                if urls is not None:
+                    self._track(response, batch, urls[offset:offset + len(batch)])
+            else:
+                self._count('dropped', len(batch))
+            offset += len(batch)
+        return delivered
+
+    def _track(self, response, batch, urls):
+        """Zapamiętuje ID wysłanej wiadomości (odpowiedź z ?wait=true) i pozycje ogłoszeń"""
+        try:
+            message_id = response.json().get('id')
+        except (ValueError, AttributeError):
+            message_id = None
+        if not message_id:
+            return
+        with self.lock:
+            self.messages[message_id] = list(batch)
+            for position, url in enumerate(urls):
+                self.ad_messages[url] = (message_id, position)
+            while len(self.messages) > self.tracked_messages:
+                evicted, _ = self.messages.popitem(last=False)
+                self.edit_locks.pop(evicted, None)
+            while len(self.ad_messages) > self.tracked_messages * DISCORD_MAX_EMBEDS:
+                self.ad_messages.popitem(last=False)
+
+    def is_tracked(self, url):
+        """Czy ogłoszenie zostało dostarczone w śledzonej wiadomości (można je później edytować)"""
+        with self.lock:
+            return self.ad_messages.get(url, (None, None))[0] in self.messages
+
+    def update_ad(self, ad):
+        """Podmienia embed już wysłanego ogłoszenia (PATCH wiadomości webhooka); False gdy nieznane.
+        Blokada per wiadomość - wolna edycja (ponowienia) nie wstrzymuje edycji innych wiadomości."""
+        with self.lock:
+            message_id, _ = self.ad_messages.get(ad['url'], (None, None))
+            if message_id not in self.messages:
+                return False
+            edit_lock = self.edit_locks.setdefault(message_id, Lock())
+        with edit_lock:
+            with self.lock:
+                message_id, position = self.ad_messages.get(ad['url'], (None, None))
+                embeds = self.messages.get(message_id)
+                if embeds is None:
+                    return False
+                embeds[position] = build_ad_embed(ad)
+                batch = list(embeds)
+            base, _, query = self.webhook.partition('?')
+            url = f"{base}/messages/{message_id}" + (f"?{query}" if query else '')
+            if self._post(batch, url=url, method='PATCH') is None:
+                return False
+            self._count('edited')
+            return True
+
+    def _post(self, batch, wait=False, url=None, method='POST'):
+        """Jedna wiadomość z ponowieniami: 429 -> retry_after, 5xx/sieć -> wykładniczy backoff. Zwraca odpowiedź albo None."""
+        if url is None:
+            url = self.webhook
+            if wait:
+                url += ('&' if '?' in url else '?') + 'wait=true'
+        for attempt in range(self.max_attempts):
+            if attempt:
+                self._count('retries')
+            self.bucket.acquire()
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, json={"embeds": batch}, timeout=10)
+                metrics.webhook_seconds.observe(time.perf_counter() - started)
+            except requests.exceptions.RequestException as e:
+                logging.error(f"❌ Błąd wysyłania na Discord: {e}")
+                time.sleep(min(30, 2 ** attempt) + random.random())
+                continue
+            self._respect_rate_headers(response)
+            if response.status_code in (200, 204):
+                if method == 'POST':
+                    self._count('messages')
+                return response
+            if response.status_code == 429:
+                self._count('rate_limited')
+                retry_after = discord_retry_after(response)
+                logging.warning(f"⏳ Discord 429 - czekam {retry_after:.1f}s")
+                self.bucket.pause_until(time.monotonic() + retry_after)
+                continue
+            if response.status_code >= 500:
+                logging.warning(f"⚠️ Discord {response.status_code} - ponawiam")
+                time.sleep(min(30, 2 ** attempt) + random.random())
+                continue
+            logging.error(f"❌ Błąd Discorda: {response.status_code} - {response.text[:300]}")
+            return None
+        logging.error(f"❌ Porzucono wiadomość ({len(batch)} embedów) po {self.max_attempts} próbach")
+        return None
+
+    def _respect_rate_headers(self, response):
+        """Gdy wyczerpaliśmy limit (X-RateLimit-Remaining: 0), czekaj do resetu"""
+        if response.headers.get('X-RateLimit-Remaining') == '0':
+            try:
+                reset_after = float(response.headers.get('X-RateLimit-Reset-After', '0'))
+            except ValueError:
+                reset_after = 0.0
+            if reset_after > 0:
+                self.bucket.pause_until(time.monotonic() + reset_after)
+
+def discord_retry_after(response):
+    """Czas oczekiwania z odpowiedzi 429 (JSON retry_after albo nagłówek Retry-After), w sekundach"""
+    try:
+        return max(0.0, float(response.json().get('retry_after')))
+    except (ValueError, TypeError, AttributeError):
+        pass
+    try:
+        return max(0.0, float(response.headers.get('Retry-After', '1')))
+    except ValueError:
+        return 1.0
+
+def embed_size(embed):
+    """Liczba znaków embeda wliczana do limitu 6000 na wiadomość"""
+    size = len(embed.get('title', '')) + len(embed.get('description', ''))
+    size += len((embed.get('footer') or {}).get('text', ''))
+    for field in embed.get('fields', []):
+        size += len(field.get('name', '')) + len(field.get('value', ''))
+    return size
+
+def pack_embeds(embeds):
+    """Dzieli embedy na paczki mieszczące się w limitach jednej wiadomości"""
+    batch, batch_size = [], 0
+    for embed in embeds:
+        size = embed_size(embed)
+        if batch and (len(batch) >= DISCORD_MAX_EMBEDS or batch_size + size > DISCORD_MAX_MESSAGE_CHARS):
+            yield batch
+            batch, batch_size = [], 0
+        batch.append(embed)
+        batch_size += size
+    if batch:
+        yield batch
+
+def build_ad_embed(ad):
+    """Embed Discorda dla ogłoszenia (kolor i pole okazji wg wyniku względem mediany rynkowej)"""
+    score = ad.get('deal_score')
     embed = {
         "title": f"📱 {ad['title'][:200]}",
         "url": ad['url'],
-        "color": 0x00ff00,
+        "color": deal_color(score),
         "fields": [
             {"name": "💰 Cena", "value": f"**{ad['price']}**", "inline": True},
             {"name": "📱 Model", "value": f"{ad['model']}", "inline": True},
@@ -128,20 +1112,24 @@ def send_discord_notification(ad):
             {"name": "🎯 Zakres cenowy", "value": f"{ad['price_range']['min']}-{ad['price_range']['max']} zł", "inline": True}
         ],
         "thumbnail": {"url": ad.get('image') or ''},
-        "footer": {"text": f"OLX iPhone Hunter • {ad.get('time_ago','')[:40]}"},
+        "footer": {"text": f"OLX iPhone Hunter • {ad.get('profile', MAIN_PROFILE_NAME)} • {ad.get('time_ago','')[:40]}"},
         "timestamp": datetime.utcnow().isoformat() + "Z"
     }
-    try:
-        response = requests.post(DISCORD_WEBHOOK, json={"embeds": [embed]}, timeout=10)
-        if response.status_code in (200, 204):
-            logging.info(f"✅ Wysłano na Discord: iPhone {ad['model']} - {ad['price']}")
-            return True
-        else:
-            logging.error(f"❌ Błąd Discorda: {response.status_code} - {response.text}")
-            return False
-    except Exception as e:
-        logging.error(f"❌ Błąd wysyłania na Discord: {e}")
-        return False
+    repost = ad.get('repost_of')
+    if repost:
+        embed["title"] = f"♻️ {ad['title'][:200]}"
+        embed["fields"].append({"name": "♻️ Ponownie wystawione",
+                                "value": f"{repost['similarity'] * 100:.0f}% zgodności z [ofertą]({repost['url']}) sprzed {repost['age_days']} dni ({repost['price']:.0f} zł)",
+                                "inline": False})
+    details = ad.get('details') or {}
+    for key, label in (('storage', "💾 Pamięć"), ('battery', "🔋 Bateria"), ('seller', "👤 Sprzedawca")):
+        if details.get(key):
+            embed["fields"].append({"name": label, "value": str(details[key])[:100], "inline": True})
+    if score is not None:
+        median = ad['market_median']
+        price = ad.get('price_value') or median
+        embed["fields"].append({"name": "🔥 Okazja", "value": f"{(price - median) / median * 100:+.0f}% vs mediana {median} zł (wynik {score:.1f})", "inline": True})
+    return embed
 
 def send_discord_alert(message):
     """Wysyła alert na Discord"""
@@ -154,18 +1142,14 @@ def send_discord_alert(message):
         "timestamp": datetime.utcnow().isoformat() + "Z",
         "footer": {"text": "OLX iPhone Hunter PRO • System Alert"}
     }
-    try:
-        requests.post(DISCORD_WEBHOOK, json={"embeds": [embed]}, timeout=10)
+    if discord_dispatcher.send_embeds([embed]):
         logging.info("✅ Wysłano alert systemowy na Discord")
-    except Exception as e:
-        logging.error(f"❌ Błąd wysyłania alertu: {e}")
 
 def send_discord_status():
     """Wysyła status co godzinę na Discord"""
     if not DISCORD_WEBHOOK:
         return
-    with monitor_state.lock:
-        last_found = monitor_state.last_found_time
+    last_found = monitor_state.snapshot.last_found_time
     embed = {
         "title": "📊 STATUS SYSTEMU",
         "description": "🤖 Bot ciągle szuka nowych ogłoszeń iPhone na OLX!",
@@ -178,33 +1162,34 @@ def send_discord_status():
         "timestamp": datetime.utcnow().isoformat() + "Z",
         "footer": {"text": "OLX iPhone Hunter PRO • Hourly Status"}
     }
-    try:
-        requests.post(DISCORD_WEBHOOK, json={"embeds": [embed]}, timeout=10)
+    if discord_dispatcher.send_embeds([embed]):
         logging.info("✅ Wysłano status godzinny na Discord")
-    except Exception as e:
-        logging.error(f"❌ Błąd wysyłania statusu: {e}")
 
 def check_8_hours_alert():
-    """Sprawdza czy minęło 8 godzin bez znalezienia ogłoszeń"""
-    with monitor_state.lock:
-        time_without_results = datetime.now() - monitor_state.last_found_time
-        if time_without_results.total_seconds() >= 8 * 3600:
-            alert_msg = (f"⚠️ **BRAK NOWYCH OGŁOSZEŃ OD 8 GODZIN!**\n\n"
-                       f"Ostatnie znalezione: {monitor_state.last_found_time.strftime('%Y-%m-%d %H:%M:%S')}\n"
-                       f"Aktywne modele: {len(CONFIG['active_models'])}\n"
-                       f"Śledzone oferty: {len(seen_ads)}")
-            send_discord_alert(alert_msg)
-            with monitor_state.lock:
-                monitor_state.last_found_time = datetime.now()
+    """Sprawdza czy minęło 8 godzin bez znalezienia ogłoszeń (decyzja z migawki, wysyłka bez blokady)"""
+    last_found = monitor_state.snapshot.last_found_time
+    if (datetime.now() - last_found).total_seconds() < 8 * 3600:
+        return
+    alert_msg = (f"⚠️ **BRAK NOWYCH OGŁOSZEŃ OD 8 GODZIN!**\n\n"
+               f"Ostatnie znalezione: {last_found.strftime('%Y-%m-%d %H:%M:%S')}\n"
+               f"Aktywne modele: {len(CONFIG['active_models'])}\n"
+               f"Śledzone oferty: {len(seen_ads)}")
+    send_discord_alert(alert_msg)
+    monitor_state.update(last_found_time=datetime.now())
 
 def check_hourly_status():
     """Sprawdza czy wysłać status co godzinę"""
-    with monitor_state.lock:
-        time_since_last_status = datetime.now() - monitor_state.last_status_time
-        if time_since_last_status.total_seconds() >= 3600:
-            send_discord_status()
-            with monitor_state.lock:
-                monitor_state.last_status_time = datetime.now()
+    if (datetime.now() - monitor_state.snapshot.last_status_time).total_seconds() < 3600:
+        return
+    send_discord_status()
+    monitor_state.update(last_status_time=datetime.now())
+
+discord_dispatcher = DiscordDispatcher(DISCORD_WEBHOOK)
+metrics.add_gauge('olx_seen_ads', 'Liczba śledzonych (widzianych) ogłoszeń', lambda: len(seen_ads))
+metrics.add_gauge('olx_seconds_since_last_found', 'Sekundy od ostatniego znalezionego ogłoszenia',
+                  lambda: (datetime.now() - monitor_state.snapshot.last_found_time).total_seconds())
+scan_scheduler = ScanScheduler(SCHEDULER_FILE, BASE_CHECK_INTERVAL, SCAN_MIN_INTERVAL, SCAN_MAX_INTERVAL,
+                               REQUEST_BUDGET_PER_HOUR, SCAN_TARGET_NEW)
 
 # ========== PARSOWANIE I FILTROWANIE ==========
 def extract_price(price_text):
@@ -226,49 +1211,50 @@ def extract_price(price_text):
         logging.debug(f"❌ Błąd parsowania ceny '{price_text}': {e}")
         return None
 
+class ModelClassifier:
+    """Rozpoznaje model z tytułu jednym skompilowanym wzorcem; budowany raz z cennika"""
+    PATTERN = re.compile(r"""
+        iphone[\W_]*
+        (?:
+            (?P<num>\d{1,2})(?P<suffix>e|s|c)?       # 13, 16e, 6s
+            | (?P<named>se|air|xs|xr|x)             # modele bez numeru
+        )
+        (?:[\W_]*(?P<variant>pro[\W_]*max|pro|mini|plus|air))?
+        (?![a-z0-9])
+    """, re.IGNORECASE | re.VERBOSE)
+    VARIANT_SEP_RE = re.compile(r'[\W_]+')
+
+    def __init__(self, price_ranges, cache_size=4096):
+        self.key_map = {key.lower(): key for key in price_ranges}
+        self.classify = lru_cache(maxsize=cache_size)(self._classify)
+
+    def _classify(self, title):
+        """Zwraca klucz cennika albo None (także dla rozpoznanych modeli spoza cennika, np. 16e, SE, Air)"""
+        if not title:
+            return None
+        m = self.PATTERN.search(title)
+        if not m:
+            return None
+        if m.group('named'):
+            candidate = m.group('named').lower()
+        else:
+            candidate = str(int(m.group('num'))) + (m.group('suffix') or '').lower()
+        variant = m.group('variant')
+        if variant:
+            variant = self.VARIANT_SEP_RE.sub('', variant).lower()
+            candidate += ' pro max' if variant == 'promax' else f" {variant}"
+        return self.key_map.get(candidate)
+
+    def classify_many(self, titles):
+        """Klasyfikuje listę tytułów (np. całą stronę) w jednym wywołaniu"""
+        classify = self.classify
+        return [classify(title) for title in titles]
+
+model_classifier = ModelClassifier(IPHONE_PRICE_RANGES)
+
 def extract_model_and_variant(title):
     """Rozpoznaje model i wariant (odporne na wielkość liter i znaki specjalne)."""
-    if not title:
-        return None
-    norm = re.sub(r'[^A-Za-z0-9\s]', ' ', title).lower()
-    norm = re.sub(r'\s+', ' ', norm).strip()
-    # Spróbuj wykryć warianty w kolejności od najbardziej specyficznych
-    m = re.search(r'iphone\s*(\d+)\s*(pro\s*max|promax|promax|pro max)\b', norm)
-    if m:
-        num = m.group(1)
-        candidate = f"{num} pro max"
-    else:
-        m = re.search(r'iphone\s*(\d+)\s*(pro)\b', norm)
-        if m:
-            num = m.group(1)
-            candidate = f"{num} pro"
-        else:
-            m = re.search(r'iphone\s*(\d+)\s*(mini)\b', norm)
-            if m:
-                num = m.group(1)
-                candidate = f"{num} mini"
-            else:
-                m = re.search(r'iphone\s*(\d+)\s*(plus)\b', norm)
-                if m:
-                    num = m.group(1)
-                    candidate = f"{num} plus"
-                else:
-                    m = re.search(r'iphone\s*(\d+)\b', norm)
-                    if m:
-                        num = m.group(1)
-                        candidate = f"{num}"
-                    else:
-                        return None
-    # Dopasuj do klucza w IPHONE_PRICE_RANGES (ignoruj wielkość liter)
-    candidate = candidate.strip()
-    for key in IPHONE_PRICE_RANGES.keys():
-        if key.lower() == candidate:
-            return key
-    # nie znaleziono dokładnego dopasowania, spróbuj uprościć (np. '11 pro' -> '11 Pro')
-    for key in IPHONE_PRICE_RANGES.keys():
-        if key.lower().startswith(candidate):
-            return key
-    return None
+    return model_classifier.classify(title)
 
 def parse_olx_time(time_text):
     """Parsuje tekst OLX na datetime (dzisiaj/wczoraj/godz/ minuty / dni)"""
@@ -302,196 +1288,1710 @@ def parse_olx_time(time_text):
         logging.debug(f"❌ Błąd parsowania czasu '{time_text}': {e}")
         return None
 
-def is_within_time_limit(ad_time, max_hours=None):
-    """Sprawdza limit czasu. Jeśli CONFIG['ignore_age_limit'] True => zawsze True"""
-    if CONFIG.get('ignore_age_limit', True):
-        return True
-    if not ad_time:
-        return False
-    if max_hours is None:
-        max_hours = CONFIG.get('max_ad_age_hours', 8760)
-    return (datetime.now() - ad_time).total_seconds() <= max_hours * 3600
+class FilterPlan:
+    """Niezmienny, prekompilowany plan filtrów - budowany raz przy zmianie konfiguracji"""
+    __slots__ = ('active_models', 'price_bounds', 'required_re', 'blocked_re', 'damaged_re', 'ignore_age_limit', 'max_age_seconds',
+                 'min_deal_score', 'repost_mode')
 
-def check_filters(title, price, model):
-    """Sprawdza wszystkie filtry: model, cena, wymagane słowa, blokady (z uwzględnieniem include_damaged)."""
-    title_lower = title.lower()
-    # model
-    if not model or model not in CONFIG['active_models']:
-        return False
-    # price
-    price_range = IPHONE_PRICE_RANGES.get(model)
-    if not price_range or price is None:
-        return False
-    try:
-        if float(price) < float(price_range['min']) or float(price) > float(price_range['max']):
+    def __init__(self, config, price_ranges):
+        self.active_models = frozenset(config.get('active_models', []))
+        # progi cenowe jako liczby - tylko dla aktywnych modeli
+        self.price_bounds = {model: (float(r['min']), float(r['max']))
+                             for model, r in price_ranges.items() if model in self.active_models}
+        self.required_re = compile_phrase_matcher(config.get('keywords', []))
+        # zablokowane słowa działają tylko gdy include_damaged == False (ale zawsze oznaczają ofertę jako uszkodzoną w historii cen)
+        self.damaged_re = compile_phrase_matcher(config.get('blocked_keywords', []))
+        self.blocked_re = None if config.get('include_damaged', False) else self.damaged_re
+        self.ignore_age_limit = config.get('ignore_age_limit', True)
+        self.max_age_seconds = config.get('max_ad_age_hours', 8760) * 3600
+        self.min_deal_score = config.get('min_deal_score')
+        self.repost_mode = config.get('repost_mode', 'tag')
+
+    def matches(self, title, price, model):
+        """Sprawdza model, cenę, wymagane i zablokowane słowa"""
+        bounds = self.price_bounds.get(model)
+        if bounds is None or price is None:
             return False
-    except Exception:
-        return False
-    # required keywords
-    if CONFIG.get('keywords'):
-        if not any(k.lower() in title_lower for k in CONFIG.get('keywords', [])):
+        try:
+            price = float(price)
+        except (TypeError, ValueError):
             return False
-    # blocked keywords: tylko gdy include_damaged == False
-    if not CONFIG.get('include_damaged', False):
-        if CONFIG.get('blocked_keywords'):
-            if any(b.lower() in title_lower for b in CONFIG.get('blocked_keywords', [])):
-                return False
-    return True
+        if price < bounds[0] or price > bounds[1]:
+            return False
+        if self.required_re is None and self.blocked_re is None:
+            return True
+        title_lower = title.lower()
+        if self.required_re is not None and not self.required_re.search(title_lower):
+            return False
+        if self.blocked_re is not None and self.blocked_re.search(title_lower):
+            return False
+        return True
 
-# ========== MONITOROWANIE OLX ==========
-def check_olx_page(page_url):
-    """Sprawdza pojedynczą stronę OLX i zwraca listę nowych ogłoszeń"""
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-        }
-        logging.info(f"🌐 Pobieram stronę: {page_url}")
-        resp = requests.get(page_url, headers=headers, timeout=30)
-        resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, 'html.parser')
-        new_ads = []
-        # heurystyka: szukaj linków ofert
-        anchors = soup.find_all('a', href=True)
-        candidates = []
-        for a in anchors:
-            href = a['href']
+    def within_time_limit(self, ad_time):
+        """Sprawdza limit wieku ogłoszenia"""
+        if self.ignore_age_limit:
+            return True
+        if not ad_time:
+            return False
+        return (datetime.now() - ad_time).total_seconds() <= self.max_age_seconds
+
+def compile_phrase_matcher(phrases):
+    """Jeden regex dla wszystkich fraz (dopasowanie podciągu, bez wielkości liter); None gdy brak fraz"""
+    phrases = sorted({p.lower() for p in phrases if p}, key=len, reverse=True)
+    if not phrases:
+        return None
+    return re.compile('|'.join(re.escape(p) for p in phrases))
+
+def check_filters(title, price, model, plan=None):
+    """Sprawdza wszystkie filtry: model, cena, wymagane słowa, blokady (z uwzględnieniem include_damaged)."""
+    return (plan or filter_plan).matches(title, price, model)
+
+def effective_price_ranges(config):
+    """Cennik bazowy z nałożonymi zakresami z indeksu rynkowego (CONFIG['price_overrides'])"""
+    overrides = config.get('price_overrides') or {}
+    if not overrides:
+        return IPHONE_PRICE_RANGES
+    return {model: overrides.get(model, prices) for model, prices in IPHONE_PRICE_RANGES.items()}
+
+class SearchProfile:
+    """Niezmienny profil wyszukiwania: adres, głębokość, tryb przyrostowy i własny plan filtrów"""
+    __slots__ = ('name', 'url', 'max_pages', 'active', 'incremental', 'stop_after', 'deep_every', 'plan')
+
+    def __init__(self, config, overrides=None):
+        merged = dict(config)
+        # puste pola profilu dziedziczą ustawienia główne
+        merged.update({k: v for k, v in (overrides or {}).items() if v not in (None, '', [])})
+        self.name = merged.get('name') or MAIN_PROFILE_NAME
+        self.url = merged['url']
+        self.max_pages = max(1, min(int(merged.get('max_pages', 50)), 100)) # ograniczenie do 100
+        self.active = merged.get('active', True) if overrides else True
+        self.incremental = merged.get('incremental_crawl', True)
+        self.stop_after = max(1, int(merged.get('stop_after_seen_pages', 2)))
+        self.deep_every = max(1, int(merged.get('deep_scan_every', 10)))
+        self.plan = FilterPlan(merged, effective_price_ranges(merged))
+
+def build_search_profiles(config):
+    """Profil główny (z CONFIG['url']) + dodatkowe profile z CONFIG['profiles']"""
+    profiles = [SearchProfile(config)]
+    for overrides in config.get('profiles', []):
+        try:
+            profiles.append(SearchProfile(config, overrides))
+        except (KeyError, ValueError, TypeError) as e:
+            logging.error(f"❌ Nieprawidłowy profil {overrides.get('name')}: {e}")
+    return tuple(profiles)
+
+def apply_config(config):
+    """Podmienia konfigurację razem z prekompilowanymi profilami i planami filtrów.
+    Plany budowane są przed podmianą - wątek skanu widzi stary albo nowy komplet, nigdy pół na pół."""
+    global CONFIG, search_profiles, filter_plan
+    profiles = build_search_profiles(config)
+    CONFIG = config
+    search_profiles = profiles
+    filter_plan = profiles[0].plan
+
+search_profiles = build_search_profiles(CONFIG)
+filter_plan = search_profiles[0].plan
+
+# ========== KARTY OGŁOSZEŃ ==========
+HTML_PARSER = 'lxml'
+OFFER_HREF_RE = re.compile(r'/oferta/')
+PRICE_TEXT_RE = re.compile(r'\d[\d\s,.]*\s*(zł|pln)', re.IGNORECASE)
+DIGIT_TEXT_RE = re.compile(r'\d')
+TIME_TEXT_RE = re.compile(r'(teraz|przed chwil|dzisiaj|wczoraj|godz|minut|dni)', re.IGNORECASE)
+NOT_LOCATION_RE = re.compile(r'\d+\s*zł|pln|godz|min|teraz|wczoraj|dzisiaj', re.IGNORECASE)
+TITLE_TAGS = ('h6', 'h4', 'h3', 'h2', 'strong')
+PROMOTED_LABELS = ('wyróżnione', 'wyróżnione ogłoszenie')
+PRERENDERED_STATE_MARKER = 'window.__PRERENDERED_STATE__'
+
+def extract_listing_cards(soup):
+    """Znajduje każdą kartę ogłoszenia dokładnie raz i wyciąga z niej dane (jeden przebieg na kartę)"""
+    cards = []
+    seen_links = set()
+    nodes = soup.find_all(attrs={'data-cy': 'l-card'})
+    if not nodes:
+        # brak znaczników kart (zmiana layoutu) - karta = najwyższy przodek linku z tylko tą jedną ofertą
+        nodes = []
+        for anchor in soup.find_all('a', href=OFFER_HREF_RE):
+            if anchor['href'] in seen_links:
+                continue
+            seen_links.add(anchor['href'])
+            nodes.append(_card_container(anchor))
+        seen_links = set()
+    for node in nodes:
+        card = parse_listing_card(node)
+        if card and card['link'] not in seen_links:
+            seen_links.add(card['link'])
+            cards.append(card)
+    return cards
+
+def read_prerendered_state(html):
+    """Osadzony JSON stanu strony OLX (lista wyników i strona oferty) albo None"""
+    pos = html.find(PRERENDERED_STATE_MARKER)
+    if pos < 0:
+        return None
+    pos = html.find('=', pos + len(PRERENDERED_STATE_MARKER)) + 1
+    while html[pos:pos + 1].isspace():
+        pos += 1
+    decoder = json.JSONDecoder()
+    state, _ = decoder.raw_decode(html, pos)
+    # stan bywa zapisany jako string JSON wewnątrz literału JS
+    if isinstance(state, str):
+        state = json.loads(state)
+    return state
+
+def extract_state_cards(html):
+    """Szybka ścieżka: dane ofert z osadzonego JSON-a stanu strony (bez budowania drzewa DOM).
+    Zwraca None, gdy strona nie zawiera stanu - wtedy używana jest heurystyka DOM."""
+    state = read_prerendered_state(html)
+    if state is None:
+        return None
+    ads = ((state.get('listing') or {}).get('listing') or {}).get('ads')
+    if not isinstance(ads, list) or not ads:
+        return None
+    cards = []
+    for ad in ads:
+        card = state_ad_to_card(ad)
+        if card:
+            cards.append(card)
+    return cards
+
+def state_ad_to_card(ad):
+    """Zamienia ogłoszenie z JSON-a stanu na kartę w formacie parse_listing_card"""
+    link = ad.get('url')
+    if not link:
+        return None
+    if not link.startswith('http'):
+        link = 'https://www.olx.pl' + link
+    regular = ((ad.get('price') or {}).get('regularPrice') or {})
+    price = regular.get('value')
+    if isinstance(price, float) and price.is_integer():
+        price = int(price)
+    ad_time = None
+    time_text = ''
+    if ad.get('createdTime'):
+        try:
+            ad_time = datetime.fromisoformat(ad['createdTime']).astimezone().replace(tzinfo=None)
+            time_text = ad_time.strftime('%d.%m.%Y %H:%M')
+        except ValueError:
+            pass
+    location = ad.get('location') or {}
+    city = location.get('cityName') or location.get('regionName') or "Brak lokalizacji"
+    photos = ad.get('photos') or []
+    img_url = photos[0] if photos and isinstance(photos[0], str) else ''
+    img_url = img_url.replace('{width}', '640').replace('{height}', '480')
+    promoted = bool(ad.get('isPromoted')) or is_promoted_link(link)
+    user = ad.get('user')
+    return {
+        'link': link,
+        'ad_id': ad.get('id'),
+        'title': (ad.get('title') or '').strip(),
+        'price': price if isinstance(price, (int, float)) else None,
+        'time_text': time_text,
+        'ad_time': ad_time,
+        'location': city,
+        'image': img_url,
+        'promoted': promoted,
+        'seller_id': user.get('id') if isinstance(user, dict) else None,
+    }
+
+def _card_container(anchor):
+    """Wspina się od linku maksymalnie 4 poziomy, dopóki przodek zawiera linki tylko do tej oferty"""
+    node = anchor
+    href = anchor['href']
+    for _ in range(4):
+        parent = node.parent
+        if parent is None or parent.name in ('body', 'html', '[document]'):
+            break
+        if any(a['href'] != href for a in parent.find_all('a', href=OFFER_HREF_RE)):
+            break
+        node = parent
+    return node
+
+def parse_listing_card(card):
+    """Jeden przebieg po karcie: link, tytuł, cena, czas, lokalizacja, zdjęcie, wyróżnienie"""
+    link = None
+    anchor_titles = []
+    title_el = None
+    price_el = None
+    location_el = None
+    img = card if card.name == 'img' else None
+    strings = []
+    for node in card.descendants:
+        name = getattr(node, 'name', None)
+        if name is None:
+            s = node.strip()
+            if s:
+                strings.append(s)
+            continue
+        if name == 'a':
+            href = node.get('href') or ''
             if '/oferta/' in href:
-                candidates.append(a)
-        logging.info(f"📄 Znaleziono {len(candidates)} potencjalnych ofert (anchor z '/oferta/')")
-        for anchor in candidates:
-            try:
-                # link
-                link = anchor['href']
-                if not link.startswith('http'):
-                    link = 'https://www.olx.pl' + link
-                # czy już widziany
-                with monitor_state.lock:
-                    if link in seen_ads:
+                if link is None:
+                    link = href
+                if href == link:
+                    anchor_titles.append(node)
+        elif name in TITLE_TAGS and title_el is None:
+            title_el = node
+        elif name == 'img' and img is None:
+            img = node
+        testid = node.get('data-testid')
+        if testid == 'ad-price' and price_el is None:
+            price_el = node
+        elif testid == 'location-date' and location_el is None:
+            location_el = node
+    if card.name == 'a' and '/oferta/' in (card.get('href') or ''):
+        link = card['href']
+        anchor_titles.insert(0, card)
+    if not link:
+        return None
+    if not link.startswith('http'):
+        link = 'https://www.olx.pl' + link
+    # tytuł: nagłówek karty, potem tekst linku
+    title = title_el.get_text(separator=' ', strip=True) if title_el else ''
+    if len(title) < 3:
+        for a in anchor_titles:
+            title = a.get_text(separator=' ', strip=True)
+            if len(title) >= 3:
+                break
+    # cena: element ceny, potem pierwszy tekst z walutą, na końcu pierwszy tekst z cyfrą spoza tytułu
+    price = extract_price(price_el.get_text(separator=' ', strip=True)) if price_el else None
+    if price is None:
+        price_text = next((s for s in strings if PRICE_TEXT_RE.search(s)), None)
+        if price_text is None:
+            price_text = next((s for s in strings if DIGIT_TEXT_RE.search(s) and s not in title), None)
+        price = extract_price(price_text)
+    # czas i lokalizacja
+    if location_el is not None:
+        time_text = location_el.get_text(separator=' ', strip=True)
+    else:
+        time_text = next((s for s in strings if TIME_TEXT_RE.search(s)), '')
+    location = "Brak lokalizacji"
+    if time_text and ' - ' in time_text:
+        location = time_text.split(' - ')[0].strip()
+    else:
+        # krótszy tekst w karcie, który nie jest ceną ani tytułem
+        found_loc = next((s for s in strings[:20] if len(s) < 60 and s not in title and not NOT_LOCATION_RE.search(s)), None)
+        if found_loc:
+            location = found_loc
+    # obrazek
+    img_url = ""
+    if img is not None:
+        img_url = img.get('data-src') or img.get('src') or ''
+        if img_url.startswith('//'):
+            img_url = 'https:' + img_url
+    promoted = is_promoted_link(link) or any(s.lower() in PROMOTED_LABELS for s in strings)
+    return {
+        'link': link,
+        'ad_id': None,
+        'title': title,
+        'price': price,
+        'time_text': time_text,
+        'ad_time': None,
+        'location': location,
+        'image': img_url,
+        'promoted': promoted,
+        'seller_id': None,  # karta DOM nie zawiera sprzedawcy
+    }
+
+# ========== INDEKS CEN RYNKOWYCH ==========
+class PriceHistory:
+    """Kolumnowa historia cen wszystkich sparsowanych ofert (plik append-only na kolumnę)"""
+    COLUMNS = (('ts', '<u4'), ('ad_id', '<u8'), ('price', '<f4'), ('model', 'u1'), ('damaged', 'u1'))
+
+    def __init__(self, path, dedupe_size=200000):
+        self.path = path
+        self.dedupe_size = dedupe_size
+        self.models = []  # indeks kolumny `model` -> nazwa
+        self.model_index = {}
+        self.rows = 0
+        self.buffer = []
+        self.recent = OrderedDict()
+        self.opened = False
+        self.lock = Lock()
+
+    def _column_path(self, name):
+        return os.path.join(self.path, f"{name}.col")
+
+    def open(self):
+        """Wczytuje meta i przycina kolumny do zatwierdzonej liczby wierszy (po przerwanym zapisie)"""
+        with self.lock:
+            if self.opened:
+                return
+            os.makedirs(self.path, exist_ok=True)
+            meta_path = os.path.join(self.path, 'meta.json')
+            if os.path.exists(meta_path):
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+                self.rows = meta.get('rows', 0)
+                self.models = meta.get('models', [])
+                self.model_index = {model: i for i, model in enumerate(self.models)}
+            for name, dtype in self.COLUMNS:
+                with open(self._column_path(name), 'ab') as f:
+                    f.truncate(self.rows * np.dtype(dtype).itemsize)
+            self.opened = True
+
+    def record(self, listings):
+        """Dopisuje do bufora (ad_id, model, cena, uszkodzony); wołane raz na stronę. Zwraca oferty widziane pierwszy raz."""
+        if not listings:
+            return []
+        now = int(time.time())
+        fresh = []
+        with self.lock:
+            for listing in listings:
+                ad_id, model, price, damaged = listing
+                if ad_id in self.recent:
+                    continue
+                self.recent[ad_id] = None
+                fresh.append(listing)
+                index = self.model_index.get(model)
+                if index is None:
+                    if len(self.models) >= 255:
                         continue
-                # tytuł
-                title = anchor.get_text(separator=' ', strip=True)
-                if not title or len(title) < 3:
-                    # spróbuj elementów wewnątrz anchor
-                    t_el = anchor.find(['h3', 'h2', 'h4', 'strong'])
-                    title = t_el.get_text(strip=True) if t_el else title
-                if not title or len(title) < 3:
+                    index = self.model_index[model] = len(self.models)
+                    self.models.append(model)
+                self.buffer.append((now, ad_id, price, index, damaged))
+            overflow = len(self.recent) - self.dedupe_size
+            for _ in range(max(0, overflow)):
+                self.recent.popitem(last=False)
+        return fresh
+
+    def flush(self):
+        """Dopisuje bufor do plików kolumn i zatwierdza liczbę wierszy; zwraca liczbę dopisanych"""
+        with self.lock:
+            if not self.opened or not self.buffer:
+                return 0
+            buffer, self.buffer = self.buffer, []
+            table = np.array(buffer, dtype=list(self.COLUMNS))
+            for name, _ in self.COLUMNS:
+                with open(self._column_path(name), 'ab') as f:
+                    table[name].tofile(f)
+            self.rows += len(table)
+            meta_path = os.path.join(self.path, 'meta.json')
+            with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump({'rows': self.rows, 'models': self.models}, f, ensure_ascii=False)
+            os.replace(meta_path + '.tmp', meta_path)
+            return len(table)
+
+    def column(self, name, start=0, stop=None):
+        """Wycinek kolumny [start, stop) czytany wprost z pliku (bez wczytywania całej historii)"""
+        dtype = np.dtype(dict(self.COLUMNS)[name])
+        stop = self.rows if stop is None else stop
+        if stop <= start:
+            return np.empty(0, dtype)
+        return np.fromfile(self._column_path(name), dtype=dtype, count=stop - start, offset=start * dtype.itemsize)
+
+    def first_row_since(self, ts):
+        """Pierwszy wiersz z czasem >= ts (kolumna czasu rośnie - wyszukiwanie binarne na mapie pamięci)"""
+        if self.rows == 0:
+            return 0
+        times = np.memmap(self._column_path('ts'), dtype=np.dtype('<u4'), mode='r', shape=(self.rows,))
+        return int(np.searchsorted(times, ts, side='left'))
+
+class MarketIndex:
+    """Kroczące percentyle cen per model z dziennych histogramów (koszyki logarytmiczne, ~2%)"""
+    PERCENTILES = (5, 10, 25, 50, 75, 90)
+
+    def __init__(self, history, window_days=30, min_samples=30, suggest_min_pct=5, suggest_max_pct=30,
+                 bins=320, low_price=50.0, high_price=20000.0):
+        self.history = history
+        self.window_days = window_days
+        self.min_samples = min_samples
+        self.suggest_min_pct = suggest_min_pct
+        self.suggest_max_pct = suggest_max_pct
+        self.edges = np.geomspace(low_price, high_price, bins + 1)
+        self.centers = np.sqrt(self.edges[:-1] * self.edges[1:])
+        self.counts = np.zeros((window_days, 0, bins), dtype=np.uint32)  # pierścień dni x model x koszyk
+        self.slot_day = np.full(window_days, -1, dtype=np.int64)
+        self.processed = None  # wiersze historii już wliczone (None = jeszcze nie liczono)
+        self.stats = {}  # model -> percentyle i sugerowany zakres (podmieniany w całości)
+        self.last_update_ms = 0.0
+        self.last_rows = 0
+
+    def update(self, now=None):
+        """Dolicza nowe wiersze i przelicza percentyle; zwraca liczbę wliczonych wierszy"""
+        started = time.perf_counter()
+        now = time.time() if now is None else now
+        today = int(now // 86400)
+        first_day = today - self.window_days + 1
+        rows = self.history.rows
+        start = self.processed
+        if start is None:
+            start = self.history.first_row_since(first_day * 86400)
+        if rows > start:
+            self._accumulate(start, rows, first_day)
+        self.processed = rows
+        self._expire(first_day)
+        self.stats = self._percentiles()
+        self.last_rows = rows - start
+        self.last_update_ms = (time.perf_counter() - started) * 1000
+        return self.last_rows
+
+    def _accumulate(self, start, stop, first_day):
+        days = self.history.column('ts', start, stop) // 86400
+        prices = self.history.column('price', start, stop)
+        models = self.history.column('model', start, stop).astype(np.int64)
+        keep = (self.history.column('damaged', start, stop) == 0) & (days >= first_day) & (prices > 0)
+        days, prices, models = days[keep].astype(np.int64), prices[keep], models[keep]
+        if not len(days):
+            return
+        model_count = max(len(self.history.models), self.counts.shape[1])
+        if model_count > self.counts.shape[1]:
+            grown = np.zeros((self.window_days, model_count, self.counts.shape[2]), dtype=np.uint32)
+            grown[:, :self.counts.shape[1]] = self.counts
+            self.counts = grown
+        slots = days % self.window_days
+        for day in np.unique(days):
+            slot = day % self.window_days
+            if self.slot_day[slot] != day:
+                self.counts[slot] = 0
+                self.slot_day[slot] = day
+        bins = np.clip(np.searchsorted(self.edges, prices, side='right') - 1, 0, len(self.centers) - 1)
+        flat = (slots * model_count + models) * len(self.centers) + bins
+        self.counts += np.bincount(flat, minlength=self.counts.size).reshape(self.counts.shape).astype(np.uint32)
+
+    def _expire(self, first_day):
+        stale = (self.slot_day >= 0) & (self.slot_day < first_day)
+        if stale.any():
+            self.counts[stale] = 0
+            self.slot_day[stale] = -1
+
+    def _percentiles(self):
+        histogram = self.counts.sum(axis=0, dtype=np.int64)  # model x koszyk (całe okno)
+        stats = {}
+        for index, model in enumerate(self.history.models[:histogram.shape[0]]):
+            cumulative = np.cumsum(histogram[index])
+            total = int(cumulative[-1]) if len(cumulative) else 0
+            if total == 0:
+                continue
+            ranks = np.array(self.PERCENTILES + (self.suggest_min_pct, self.suggest_max_pct)) / 100 * total
+            values = self.centers[np.minimum(np.searchsorted(cumulative, ranks, side='left'), len(self.centers) - 1)]
+            entry = {'samples': total}
+            entry.update({f"p{pct}": round(float(value)) for pct, value in zip(self.PERCENTILES, values)})
+            if total >= self.min_samples:
+                entry['suggested'] = {'min': int(round(values[-2], -1)), 'max': int(round(values[-1], -1))}
+            stats[model] = entry
+        return stats
+
+    def suggestions(self):
+        return {model: entry['suggested'] for model, entry in self.stats.items() if 'suggested' in entry}
+
+class DealScorer:
+    """Bieżąca mediana i rozrzut cen per model w O(1) na ofertę; wynik okazji = (mediana - cena) / rozrzut"""
+    def __init__(self, rate=0.05, min_samples=10):
+        self.rate = rate
+        self.min_samples = min_samples
+        self.models = {}  # model -> [mediana, rozrzut, liczba obserwacji]
+        self.lock = Lock()
+
+    def observe(self, listings):
+        """Aktualizuje statystyki ofertami (ad_id, model, cena, uszkodzony) - jedna blokada na stronę"""
+        with self.lock:
+            for _, model, price, damaged in listings:
+                if damaged or not price or price <= 0:
+                    continue
+                state = self.models.get(model)
+                if state is None:
+                    self.models[model] = [float(price), float(price) * 0.15, 1]
+                    continue
+                median, spread, count = state
+                count += 1
+                rate = max(self.rate, 1.0 / count)
+                deviation = max(-5 * spread, min(5 * spread, price - median))  # odstające ceny (1 zł, 99999 zł) nie rozbijają estymaty
+                median += rate * spread * (1 if deviation > 0 else -1 if deviation < 0 else 0)
+                spread += rate * (abs(deviation) - spread)
+                state[0], state[1], state[2] = median, max(spread, 1.0), count
+
+    def seed(self, market_stats):
+        """Startowe wartości z indeksu rynkowego dla modeli, które mają jeszcze mało obserwacji"""
+        with self.lock:
+            for model, entry in market_stats.items():
+                state = self.models.get(model)
+                if entry['samples'] >= self.min_samples and (state is None or state[2] < self.min_samples):
+                    self.models[model] = [float(entry['p50']), max((entry['p75'] - entry['p25']) / 2, 1.0), entry['samples']]
+
+    def score(self, model, price):
+        """(wynik, mediana) albo (None, None), gdy model nie ma jeszcze wiarygodnej mediany"""
+        state = self.models.get(model)
+        if state is None or state[2] < self.min_samples:
+            return None, None
+        median, spread, _ = state
+        return round((median - price) / spread, 2), round(median)
+
+    def snapshot(self):
+        with self.lock:
+            return {model: {'median': round(median), 'spread': round(spread), 'samples': count}
+                    for model, (median, spread, count) in self.models.items()}
+
+def deal_color(score):
+    """Kolor embeda wg wyniku okazji (brak wyniku = dotychczasowa zieleń)"""
+    if score is None:
+        return 0x00ff00
+    if score >= 2:
+        return 0xff2d55  # wyjątkowa okazja
+    if score >= 1:
+        return 0xff8c00
+    if score >= 0:
+        return 0x00ff00
+    return 0x95a5a6  # drożej niż mediana
+
+def update_market_index():
+    """Zapisuje bufor historii cen, dolicza przyrost do indeksu i (opcjonalnie) stosuje sugerowane zakresy"""
+    try:
+        price_history.open()
+        written = price_history.flush()
+        market_index.update()
+        deal_scorer.seed(market_index.stats)
+        logging.info(f"📈 Indeks cen: +{written} ofert (historia {price_history.rows}), przeliczono w {market_index.last_update_ms:.0f} ms")
+        if CONFIG.get('auto_price_ranges'):
+            apply_price_suggestions()
+    except Exception as e:
+        logging.error(f"❌ Błąd indeksu cen: {e}")
+
+def apply_price_suggestions():
+    """Przenosi sugerowane zakresy do konfiguracji (nadpisania cennika); zwraca liczbę zmienionych modeli"""
+    suggestions = market_index.suggestions()
+    with config_lock:
+        overrides = dict(CONFIG.get('price_overrides') or {})
+        changed = [model for model, prices in suggestions.items()
+                   if model in IPHONE_PRICE_RANGES and overrides.get(model) != prices]
+        if not changed:
+            return 0
+        for model in changed:
+            overrides[model] = suggestions[model]
+        apply_config(dict(CONFIG, price_overrides=overrides))
+        publish_config()
+    logging.info(f"🎯 Zaktualizowano zakresy cen z indeksu rynkowego: {', '.join(changed)}")
+    return len(changed)
+
+price_history = PriceHistory(PRICE_HISTORY_DIR, PRICE_HISTORY_DEDUPE)
+deal_scorer = DealScorer(DEAL_SCORE_RATE, DEAL_MIN_SAMPLES)
+market_index = MarketIndex(price_history, PRICE_INDEX_WINDOW_DAYS, PRICE_INDEX_MIN_SAMPLES,
+                           PRICE_SUGGEST_MIN_PCT, PRICE_SUGGEST_MAX_PCT)
+
+# ========== WYKRYWANIE REPOSTÓW ==========
+REPOST_TOKEN_RE = re.compile(r'[0-9a-ząćęłńóśźż]+')
+REPOST_STOPWORDS = frozenset(('iphone', 'apple', 'sprzedam', 'stan', 'okazja', 'do', 'na', 'w', 'z', 'i'))
+IMAGE_HOST_RE = re.compile(r'^[a-z]+://[^/]+')
+
+def image_key(url):
+    """Ścieżka zdjęcia bez hosta, parametrów i rozmiaru (';s=640x480') - ten sam plik w różnych miniaturach"""
+    return IMAGE_HOST_RE.sub('', url.split('?', 1)[0].split(';', 1)[0]) if url else None
+
+class RepostIndex:
+    """Indeks podobieństwa wysłanych ofert (MinHash + LSH) do wykrywania ponownie wystawionych ogłoszeń"""
+    def __init__(self, path, window_days=14, max_entries=20000, threshold=0.6, price_tolerance=0.15, bands=8, rows=4):
+        self.path = path
+        self.window_seconds = window_days * 86400
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.price_tolerance = price_tolerance
+        self.bands = bands
+        self.rows = rows
+        rng = np.random.default_rng(0x5EED)  # stałe ziarno - sygnatury zapisane na dysku pozostają porównywalne
+        self.hash_a = rng.integers(1, 2 ** 63, bands * rows, dtype=np.uint64) | np.uint64(1)
+        self.hash_b = rng.integers(0, 2 ** 63, bands * rows, dtype=np.uint64)
+        self.entries = OrderedDict()  # ad_id -> (czas, model, cena, url, sygnatura, zdjęcie, sprzedawca), od najstarszego
+        self.buckets = {}  # (pasmo, fragment sygnatury) -> lista ad_id
+        self.lock = Lock()
+        self.stats = {'checked': 0, 'reposts': 0}
+
+    def features(self, ad):
+        tokens = [t for t in REPOST_TOKEN_RE.findall(ad['title'].lower()) if t not in REPOST_STOPWORDS]
+        features = set(tokens)
+        features.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+        features.add(f"m:{ad['model']}")
+        price = ad.get('price_value')
+        if price and price > 0:
+            position = math.log(price) / math.log(1.1)
+            features.add(f"p:{int(position)}")
+            features.add(f"q:{int(position + 0.5)}")
+        if ad.get('location'):
+            features.add(f"l:{ad['location'].lower()}")
+        if ad.get('image'):
+            features.add(f"i:{image_key(ad['image'])}")
+        return features
+
+    @staticmethod
+    def same_identity(entry, image, seller):
+        """Silny sygnał, że to ta sama oferta: rozstrzyga sprzedawca, a gdy go brakuje - to samo zdjęcie"""
+        other_image, other_seller = entry[5], entry[6]
+        if seller and other_seller:
+            return seller == other_seller  # repost wgrywa zdjęcia od nowa (nowe ID plików), więc ich nie porównujemy
+        return bool(image and image == other_image)
+
+    def signature(self, features):
+        hashed = np.fromiter((int.from_bytes(hashlib.blake2b(f.encode(), digest_size=8).digest(), 'little') for f in features),
+                             dtype=np.uint64, count=len(features))
+        # multiply-shift: min po cechach dla każdej funkcji skrótu (przepełnienie uint64 jest zamierzone)
+        return ((hashed[:, None] * self.hash_a + self.hash_b) >> np.uint64(32)).min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature):
+        raw = signature.tobytes()
+        width = self.rows * 4
+        return [(band, raw[band * width:(band + 1) * width]) for band in range(self.bands)]
+
+    def check_and_add(self, ad_id, ad, now=None):
+        """Zwraca najbliższy wcześniejszy duplikat {'url', 'price', 'age_days', 'similarity'} albo None; zawsze indeksuje ofertę"""
+        now = time.time() if now is None else now
+        signature = self.signature(self.features(ad))
+        band_keys = self._band_keys(signature)
+        price = ad.get('price_value') or 0
+        image = image_key(ad.get('image'))
+        seller = ad.get('seller_id')
+        with self.lock:
+            self._expire(now)
+            self.stats['checked'] += 1
+            best = None
+            candidates = {other for key in band_keys for other in self.buckets.get(key, ())}
+            for other in candidates:
+                entry = self.entries.get(other)
+                if entry is None or other == ad_id or entry[1] != ad['model']:
                     continue
-                # cena - szukaj w najbliższych elementach rodzica
-                price = None
-                parent = anchor
-                # climb a few levels to find price
-                for _ in range(3):
-                    texts = parent.find_all(text=re.compile(r'\d[\d\s,.]*\s*(zł|pln)?', re.IGNORECASE))
-                    if texts:
-                        price = extract_price(texts[0])
-                        break
-                    if parent.parent is None:
-                        break
-                    parent = parent.parent
-                # jeśli dalej brak ceny, ignoruj (opcjonalnie można wysyłać oferty bez ceny)
-                if price is None:
+                if price and entry[2] and abs(entry[2] - price) > self.price_tolerance * entry[2]:
                     continue
-                # model
-                model = extract_model_and_variant(title)
-                if not model:
+                if not self.same_identity(entry, image, seller):
                     continue
-                # czas i lokalizacja - szukaj w najbliższych tekstach
-                time_text = ""
-                parent = anchor
-                for _ in range(4):
-                    texts = parent.find_all(text=True)
-                    for txt in texts:
-                        s = str(txt).strip()
-                        if re.search(r'(teraz|przed chwil|dzisiaj|wczoraj|godz|minut|dni)', s, re.IGNORECASE):
-                            time_text = s
-                            break
-                    if time_text:
-                        break
-                    if parent.parent is None:
-                        break
-                    parent = parent.parent
-                ad_time = parse_olx_time(time_text) if time_text else None
-                if not is_within_time_limit(ad_time, CONFIG.get('max_ad_age_hours')):
-                    # jeśli ograniczenie czasu włączone i nie mieści się -> pomin
+                similarity = np.count_nonzero(np.frombuffer(entry[4], dtype=np.uint32) == signature) / len(signature)
+                if similarity >= self.threshold and (best is None or similarity > best['similarity']):
+                    best = {'url': entry[3], 'price': entry[2], 'age_days': round((now - entry[0]) / 86400, 1),
+                            'similarity': round(float(similarity), 2)}
+            if best is not None:
+                self.stats['reposts'] += 1
+            self._add(ad_id, (now, ad['model'], price, ad['url'], signature.tobytes(), image, seller), band_keys)
+        return best
+
+    def _add(self, ad_id, entry, band_keys):
+        if ad_id in self.entries:
+            self._remove(ad_id)
+        self.entries[ad_id] = entry
+        for key in band_keys:
+            self.buckets.setdefault(key, []).append(ad_id)
+        while len(self.entries) > self.max_entries:
+            self._remove(next(iter(self.entries)))
+
+    def _remove(self, ad_id):
+        entry = self.entries.pop(ad_id)
+        for key in self._band_keys(np.frombuffer(entry[4], dtype=np.uint32)):
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                continue
+            bucket.remove(ad_id)
+            if not bucket:
+                del self.buckets[key]
+
+    def _expire(self, now):
+        while self.entries:
+            ad_id, entry = next(iter(self.entries.items()))
+            if now - entry[0] <= self.window_seconds:
+                break
+            self._remove(ad_id)
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                rows = json.load(f)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError) as e:
+            logging.error(f"❌ Błąd wczytywania indeksu repostów: {e}")
+            return 0
+        with self.lock:
+            for ad_id, ts, model, price, url, signature_hex, image, seller in rows:
+                signature = np.frombuffer(bytes.fromhex(signature_hex), dtype=np.uint32)
+                self._add(ad_id, (ts, model, price, url, signature.tobytes(), image, seller), self._band_keys(signature))
+            self._expire(time.time())
+            return len(self.entries)
+
+    def save(self):
+        with self.lock:
+            rows = [[ad_id, ts, model, price, url, signature.hex(), image, seller]
+                    for ad_id, (ts, model, price, url, signature, image, seller) in self.entries.items()]
+        with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(rows, f, ensure_ascii=False)
+        os.replace(self.path + '.tmp', self.path)
+
+def load_repost_index():
+    loaded = repost_index.load()
+    logging.info(f"♻️ Indeks repostów: {loaded} ofert z ostatnich {REPOST_WINDOW_DAYS:g} dni")
+
+def save_repost_index():
+    try:
+        repost_index.save()
+    except OSError as e:
+        logging.error(f"❌ Błąd zapisu indeksu repostów: {e}")
+
+repost_index = RepostIndex(REPOST_INDEX_FILE, REPOST_WINDOW_DAYS, REPOST_INDEX_SIZE, REPOST_SIMILARITY)
+
+# ========== ARCHIWUM STRON ==========
+PAGE_NUMBER_RE = re.compile(r'[?&]page=(\d+)')
+
+def page_number(page_url):
+    match = PAGE_NUMBER_RE.search(page_url)
+    return int(match.group(1)) if match else 1
+
+def read_archived_page(segment_path, offset, length):
+    """Jedna strona z segmentu archiwum: mmap pliku i rozpakowanie tylko jej bloku"""
+    with open(segment_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return zlib.decompress(mm[offset:offset + length]).decode('utf-8')
+
+class PageArchive:
+    """Opcjonalne archiwum surowych stron wyników w segmentach zlib z indeksem (dla replay.py)"""
+    def __init__(self, path, max_bytes, segment_bytes, queue_size=200, level=6):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self.level = level
+        self.queue = Queue(maxsize=queue_size)
+        self.thread = None
+        self.segment = None  # (nazwa, plik danych, plik indeksu) - tylko wątek archiwum
+        self.lock = Lock()
+        self.stats = {'archived': 0, 'dropped': 0, 'raw_bytes': 0, 'stored_bytes': 0, 'evicted': 0, 'failed': 0}
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def _count(self, key, value=1):
+        with self.lock:
+            self.stats[key] += value
+
+    def submit(self, page_url, html):
+        """Zleca zapis strony; nie blokuje (pełna kolejka = strona pominięta)"""
+        if not self.enabled:
+            return False
+        with self.lock:
+            if self.thread is None:
+                self.thread = Thread(target=self._run, name='olx-archive', daemon=True)
+                self.thread.start()
+        try:
+            self.queue.put_nowait((time.time(), page_url, html))
+        except Full:
+            self._count('dropped')
+            return False
+        return True
+
+    def _run(self):
+        while True:
+            ts, page_url, html = self.queue.get()
+            try:
+                self._write(ts, page_url, html)
+            except (OSError, ValueError) as e:
+                self._count('failed')
+                logging.error(f"❌ Błąd zapisu archiwum stron: {e}")
+                self._close_segment()
+            finally:
+                self.queue.task_done()
+
+    def _write(self, ts, page_url, html):
+        raw = html.encode('utf-8')
+        blob = zlib.compress(raw, self.level)
+        if self.segment is None or (self.segment[1].tell() and self.segment[1].tell() + len(blob) > self.segment_bytes):
+            self._rotate(ts)
+        _, data, index = self.segment
+        offset = data.tell()
+        data.write(blob)
+        data.flush()  # dane przed wpisem w indeksie - indeks nigdy nie wskazuje niezapisanego bloku
+        index.write(json.dumps({'ts': round(ts, 3), 'url': page_url, 'page': page_number(page_url),
+                                'offset': offset, 'length': len(blob)}, ensure_ascii=False) + '\n')
+        index.flush()
+        with self.lock:
+            self.stats['archived'] += 1
+            self.stats['raw_bytes'] += len(raw)
+            self.stats['stored_bytes'] += len(blob)
+
+    def _close_segment(self):
+        if self.segment is not None:
+            for f in self.segment[1:]:
+                try:
+                    f.close()
+                except OSError:
+                    pass
+            self.segment = None
+
+    def _rotate(self, ts):
+        self._close_segment()
+        os.makedirs(self.path, exist_ok=True)
+        name = f"seg_{int(ts * 1000):013d}"
+        base = os.path.join(self.path, name)
+        self.segment = (name, open(base + '.bin', 'ab'), open(base + '.idx', 'a', encoding='utf-8'))
+        self._evict()
+
+    def _evict(self):
+        """Usuwa najstarsze segmenty (poza bieżącym), aż archiwum zmieści się w limicie"""
+        names = self.segments()
+        sizes = {}
+        for name in names:
+            base = os.path.join(self.path, name)
+            sizes[name] = sum(os.path.getsize(base + ext) for ext in ('.bin', '.idx') if os.path.exists(base + ext))
+        total = sum(sizes.values())
+        for name in names[:-1]:
+            if total <= self.max_bytes:
+                break
+            base = os.path.join(self.path, name)
+            for ext in ('.idx', '.bin'):
+                if os.path.exists(base + ext):
+                    os.remove(base + ext)
+            total -= sizes[name]
+            self._count('evicted')
+            logging.info(f"🗄️ Archiwum stron: usunięto najstarszy segment {name}")
+
+    def segments(self):
+        """Nazwy segmentów od najstarszego (nazwa zawiera czas utworzenia w ms)"""
+        if not self.path or not os.path.isdir(self.path):
+            return []
+        return sorted(name[:-4] for name in os.listdir(self.path) if name.startswith('seg_') and name.endswith('.bin'))
+
+    def entries(self, since=None):
+        """Wpisy indeksu od najstarszego (z kluczem `segment`); urwane linie po awarii są pomijane"""
+        for name in self.segments():
+            try:
+                with open(os.path.join(self.path, name + '.idx'), 'r', encoding='utf-8') as f:
+                    lines = f.readlines()
+            except OSError:
+                continue
+            for line in lines:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
                     continue
-                # filtry (model/price/keywords/blocked)
-                if not check_filters(title, price, model):
+                if since is not None and entry['ts'] < since:
                     continue
-                # lokalizacja - heurystyka: teksty obok czasu często zawierają lokalizację
-                location = "Brak lokalizacji"
-                if time_text and ' - ' in time_text:
-                    location = time_text.split(' - ')[0].strip()
+                entry['segment'] = name
+                yield entry
+
+    def find(self, page_url, before=None):
+        """Najnowszy zapis strony `page_url` (opcjonalnie nie późniejszy niż `before`)"""
+        found = None
+        for entry in self.entries():
+            if entry['url'] == page_url and (before is None or entry['ts'] <= before):
+                found = entry
+        return found
+
+    def read(self, entry):
+        return read_archived_page(self.segment_path(entry), entry['offset'], entry['length'])
+
+    def segment_path(self, entry):
+        return os.path.join(self.path, entry['segment'] + '.bin')
+
+page_archive = PageArchive(PAGE_ARCHIVE_DIR, PAGE_ARCHIVE_MAX_MB * 1024 * 1024, PAGE_ARCHIVE_SEGMENT_MB * 1024 * 1024,
+                           PAGE_ARCHIVE_QUEUE_SIZE)
+
+# ========== KONTROLA ZAPYTAŃ OLX ==========
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Bezpiecznik otwarty - zapytanie do OLX nie zostało wysłane"""
+
+def retry_after_seconds(response):
+    """Nagłówek Retry-After (sekundy albo data HTTP) w sekundach; None, gdy go brak lub jest nieczytelny"""
+    value = response.headers.get('Retry-After') if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+class FetchController:
+    """Wspólne tempo zapytań do OLX: adaptacyjny kubełek tokenów, przerwy po błędach i bezpiecznik"""
+    def __init__(self, max_rate, min_rate, burst, slow_seconds, backoff_base, backoff_max,
+                 failure_threshold, cooldown, max_cooldown):
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, max_rate) if max_rate > 0 else 0.0
+        self.rate = max_rate
+        self.bucket = TokenBucket(max_rate, burst) if max_rate > 0 else None  # 0 = bez limitu (tylko przerwy)
+        self.slow_seconds = slow_seconds
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.state = 'closed'  # closed -> open -> half-open -> closed/open
+        self.failures = 0  # błędy z rzędu
+        self.open_until = 0.0
+        self.paused_until = 0.0
+        self.probe_in_flight = False
+        self.lock = Lock()
+        self.stats = {'requests': 0, 'failures': 0, 'throttled': 0, 'backoffs': 0, 'trips': 0, 'rejected': 0,
+                      'last_status': None, 'last_retry_after': None}
+
+    @staticmethod
+    def is_failure(status):
+        """Odpowiedź świadcząca o blokadzie lub przeciążeniu (None = błąd sieci)"""
+        return status is None or status in (403, 429) or status >= 500
+
+    @staticmethod
+    def is_transient(status):
+        """Błąd, który ma sens ponowić po przerwie (403 to blokada - nie ponawiamy)"""
+        return status is None or status == 429 or status >= 500
+
+    def ready(self):
+        return self.state != 'open' or time.monotonic() >= self.open_until
+
+    def seconds_until_probe(self):
+        return max(0.0, self.open_until - time.monotonic()) if self.state == 'open' else 0.0
+
+    def acquire(self):
+        """Czeka na przerwę i token; przy otwartym bezpieczniku od razu rzuca CircuitOpenError.
+        Zwraca True dla zapytania próbnego - ten znacznik trzeba przekazać do record()"""
+        with self.lock:
+            now = time.monotonic()
+            if self.state == 'open' and now >= self.open_until:
+                self.state = 'half-open'
+                self.probe_in_flight = False
+                logging.info("🚦 Bezpiecznik OLX: zapytanie próbne")
+            if self.state == 'open' or (self.state == 'half-open' and self.probe_in_flight):
+                self._reject()
+            probe = self.state == 'half-open'
+            self.probe_in_flight = self.probe_in_flight or probe
+            wait = self.paused_until - now
+        if wait > 0:
+            time.sleep(wait)
+        if self.bucket is not None:
+            self.bucket.acquire()
+        if not probe and self.state != 'closed':
+            with self.lock:
+                self._reject()  # bezpiecznik zadziałał, gdy to zapytanie czekało na swoją kolej
+        return probe
+
+    def _reject(self):
+        self.stats['rejected'] += 1
+        if self.state == 'half-open':
+            raise CircuitOpenError("Bezpiecznik OLX: trwa zapytanie próbne")
+        raise CircuitOpenError(f"Bezpiecznik OLX otwarty (próba za {self.seconds_until_probe():.0f}s)")
+
+    def record(self, status, latency, retry_after=None, probe=False):
+        """Wynik zapytania (status None = błąd sieci): dostosowuje tempo, przerwy i stan bezpiecznika.
+        `probe` - znacznik z acquire(); tylko zapytanie próbne zmienia stan otwartego bezpiecznika"""
+        with self.lock:
+            self.stats['requests'] += 1
+            self.stats['last_status'] = status
+            if not self.is_failure(status):
+                if probe:
+                    logging.info("✅ Bezpiecznik OLX zamknięty - wznawiam skan")
+                elif self.state != 'closed':
+                    return  # spóźniona odpowiedź sprzed zadziałania nie skraca schłodzenia ani nie zastępuje próby
+                self.state = 'closed'
+                self.probe_in_flight = False
+                self.failures = 0
+                self.cooldown = self.base_cooldown
+                if latency > self.slow_seconds:
+                    self._set_rate(self.rate * 0.8)
                 else:
-                    # spróbuj znaleźć krótszy tekst w rodzicu, który nie jest ceną
-                    parent = anchor.parent
-                    found_loc = None
-                    if parent:
-                        for txt in parent.find_all(text=True, limit=20):
-                            s = str(txt).strip()
-                            if s and len(s) < 60 and not re.search(r'\d+\s*zł|pln|godz|min|teraz|wczoraj|dzisiaj', s, re.IGNORECASE):
-                                found_loc = s
-                                break
-                        if found_loc:
-                            location = found_loc
-                # obrazek
-                img_url = ""
-                img = anchor.find('img')
-                if img:
-                    img_url = img.get('data-src') or img.get('src') or ''
-                    if img_url.startswith('//'):
-                        img_url = 'https:' + img_url
-                # buduj obiekt ogłoszenia
-                ad_data = {
-                    'url': link,
-                    'title': title,
-                    'price': f"{int(price)} zł" if isinstance(price, (int, float)) else str(price),
-                    'location': location,
-                    'time': time_text or '',
-                    'time_ago': time_text or '',
-                    'image': img_url,
-                    'model': model,
-                    'price_range': IPHONE_PRICE_RANGES.get(model, {"min": 0, "max": 0})
-                }
-                # oznacz jako widziane i dodaj
-                with monitor_state.lock:
-                    seen_ads.add(link)
-                new_ads.append(ad_data)
-                logging.info(f"✅ Znaleziono: {model} | {price} zł | {title[:50]}")
-            except Exception as e:
-                logging.debug(f"❌ Błąd przetwarzania kandydatu: {e}")
+                    self._set_rate(self.rate + self.max_rate * 0.05)
+                return
+            self.failures += 1
+            self.stats['failures'] += 1
+            if status in (403, 429):
+                self.stats['throttled'] += 1
+            self._set_rate(self.rate / 2)
+            if retry_after is not None:
+                self.stats['last_retry_after'] = round(retry_after, 1)
+                delay = min(retry_after, self.max_cooldown)
+            else:
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (self.failures - 1))
+            now = time.monotonic()
+            self.paused_until = max(self.paused_until, now + delay)
+            self.stats['backoffs'] += 1
+            # odpowiedzi zapytań wysłanych przed zadziałaniem nie przedłużają już otwartego bezpiecznika
+            if probe or (self.state == 'closed' and self.failures >= self.failure_threshold):
+                self.state = 'open'
+                self.probe_in_flight = False
+                self.open_until = now + max(self.cooldown, delay)
+                self.stats['trips'] += 1
+                logging.warning(f"⛔ Bezpiecznik OLX otwarty po {self.failures} błędach z rzędu (ostatni: {status or 'sieć'}) "
+                                f"- przerwa {self.open_until - now:.0f}s")
+                self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+        if self.bucket is not None:
+            self.bucket.pause_until(now + delay)
+
+    def _set_rate(self, rate):
+        if self.bucket is None:
+            return
+        self.rate = max(self.min_rate, min(self.max_rate, rate))
+        self.bucket.set_rate(self.rate)
+
+    def status(self):
+        with self.lock:
+            return dict(self.stats, state=self.state, rate=round(self.rate, 2) if self.bucket else None,
+                        max_rate=self.max_rate, failures_in_row=self.failures,
+                        open_for=round(self.seconds_until_probe()), next_cooldown=round(self.cooldown))
+
+fetch_controller = FetchController(MAX_REQUESTS_PER_SECOND, MIN_REQUESTS_PER_SECOND, FETCH_BURST, FETCH_SLOW_SECONDS,
+                                   FETCH_BACKOFF_BASE, FETCH_BACKOFF_MAX, BREAKER_FAILURES, BREAKER_COOLDOWN,
+                                   BREAKER_MAX_COOLDOWN)
+metrics.add_gauge('olx_fetch_rate_per_second', 'Bieżące (adaptacyjne) tempo zapytań do OLX',
+                  lambda: fetch_controller.rate if fetch_controller.bucket else 0)
+metrics.add_gauge('olx_circuit_open', 'Stan bezpiecznika OLX (0 zamknięty, 0.5 próba, 1 otwarty)',
+                  lambda: {'closed': 0, 'half-open': 0.5, 'open': 1}[fetch_controller.state])
+
+# ========== PAMIĘĆ STRON WYNIKÓW ==========
+STATE_ADS_RE = re.compile(r'\\?"ads\\?"\s*:')
+LISTING_CARD_MARKER = 'data-cy="l-card"'
+PAGINATION_MARKER_RE = re.compile(r'data-(?:testid|cy)="pagination')
+DIV_TAG_RE = re.compile(r'<(/?)div\b', re.IGNORECASE)
+
+def element_end(html, start):
+    """Koniec elementu <div> zaczynającego się w `start` (zliczanie zagnieżdżeń); -1, gdy niedomknięty"""
+    depth = 0
+    for match in DIV_TAG_RE.finditer(html, start):
+        depth += -1 if match.group(1) else 1
+        if depth == 0:
+            return html.find('>', match.end()) + 1
+    return -1
+
+def listing_region(html):
+    """Fragment strony z listą ofert: tablica ofert z JSON-a stanu albo karty DOM (od pierwszej do końca
+    ostatniej). Nagłówek, stopka i skrypty śledzące potrafią się zmieniać przy każdym pobraniu."""
+    pos = html.find(PRERENDERED_STATE_MARKER)
+    if pos >= 0:
+        match = STATE_ADS_RE.search(html, pos)
+        if match:
+            end = html.find('</script>', match.start())
+            return html[match.start():end if end >= 0 else len(html)]
+    pos = html.find(LISTING_CARD_MARKER)
+    if pos < 0:
+        return html
+    end = element_end(html, html.rfind('<', 0, html.rfind(LISTING_CARD_MARKER)))
+    if end <= 0:
+        pagination = PAGINATION_MARKER_RE.search(html, pos)
+        end = pagination.start() if pagination else len(html)
+    return html[pos:end]
+
+def listing_digest(html):
+    return hashlib.blake2b(listing_region(html).encode('utf-8'), digest_size=16).digest()
+
+class PageCache:
+    """Walidatory HTTP, skrót regionu ofert i ID ofert stron wyników z poprzedniego skanu"""
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # url -> {'plan', 'digest', 'links', 'etag', 'last_modified', 'pending'}
+        self.lock = Lock()
+        self.cycle = self.new_stats()
+        self.last_cycle = None
+        self.totals = self.new_stats()
+
+    @staticmethod
+    def new_stats():
+        return {'pages': 0, 'wire_bytes': 0, 'body_bytes': 0, 'not_modified': 0, 'hash_skips': 0}
+
+    def count(self, **amounts):
+        with self.lock:
+            for key, amount in amounts.items():
+                self.cycle[key] += amount
+                self.totals[key] += amount
+
+    def end_cycle(self):
+        with self.lock:
+            self.last_cycle, self.cycle = self.cycle, self.new_stats()
+            return self.last_cycle
+
+    def conditional_headers(self, page_url, plan):
+        """Nagłówki warunkowego GET - tylko gdy mamy wynik tej strony dla bieżącego planu filtrów"""
+        with self.lock:
+            entry = self.entries.get(page_url)
+            if entry is None or entry['plan'] is not plan:
+                return None
+            headers = {}
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+            return headers or None
+
+    def note_response(self, page_url, etag, last_modified):
+        """Walidatory świeżo pobranej strony - zatwierdzane w store, więc 304 nie potwierdzi nieprzetworzonej treści"""
+        with self.lock:
+            entry = self.entries.get(page_url)
+            if entry is not None:
+                entry['pending'] = (etag, last_modified)
+            else:
+                self.entries[page_url] = {'plan': None, 'digest': None, 'links': (), 'etag': None,
+                                          'last_modified': None, 'pending': (etag, last_modified)}
+                self._trim()
+
+    def cached_result(self, page_url, plan, digest=None):
+        """Wynik niezmienionej strony (bez nowych ofert, z ID ofert z poprzedniego skanu) albo None"""
+        with self.lock:
+            entry = self.entries.get(page_url)
+            if entry is None or entry['plan'] is not plan or (digest is not None and entry['digest'] != digest):
+                return None
+            self.entries.move_to_end(page_url)
+            links = list(entry['links'])
+        return {'url': page_url, 'ads': [], 'links': links, 'parse_ms': 0.0, 'source': 'cache'}
+
+    def store(self, page_url, plan, digest, links):
+        with self.lock:
+            entry = self.entries.pop(page_url, None) or {'etag': None, 'last_modified': None, 'pending': None}
+            if entry['pending'] is not None:
+                entry['etag'], entry['last_modified'] = entry['pending']
+            entry.update(plan=plan, digest=digest, links=tuple(links), pending=None)
+            self.entries[page_url] = entry
+            self._trim()
+
+    def _trim(self):
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def status(self):
+        with self.lock:
+            return {'last': dict(self.last_cycle or self.cycle), 'totals': dict(self.totals), 'pages_cached': len(self.entries)}
+
+page_cache = PageCache()
+
+def response_wire_bytes(resp):
+    """Bajty odpowiedzi przesłane siecią (przed rozpakowaniem gzip/br), gdy urllib3 je zna"""
+    try:
+        return int(resp.raw.tell()) or len(resp.content)
+    except (AttributeError, TypeError, ValueError):
+        return len(resp.content)
+
+def process_page(html, page_url, plan):
+    """Parsuje stronę wyników, chyba że nie zmieniła się od poprzedniego skanu
+    (html None = 304 Not Modified, albo ten sam skrót regionu ofert)"""
+    if html is None:
+        result = page_cache.cached_result(page_url, plan)
+        if result is None:
+            raise ValueError("304 Not Modified bez zapamiętanej strony")
+        page_cache.count(not_modified=1)
+        metrics.unchanged_pages.inc(1, 'not_modified')
+        logging.info(f"⏭️ Strona bez zmian (304): {page_url}")
+        return result
+    digest = listing_digest(html)
+    result = page_cache.cached_result(page_url, plan, digest)
+    if result is not None:
+        page_cache.count(hash_skips=1)
+        metrics.unchanged_pages.inc(1, 'hash')
+        logging.info(f"⏭️ Strona bez zmian (skrót ofert): {page_url}")
+    else:
+        result = parse_olx_page(html, page_url, plan)
+    page_cache.store(page_url, plan, digest, result['links'])
+    return result
+
+# ========== MONITOROWANIE OLX ==========
+def fetch_page(page_url, headers=None):
+    """Pobiera stronę przez wspólną sesję; tempo, przerwy i bezpiecznik - fetch_controller.
+    Błędy przejściowe (sieć, 429, 5xx) są ponawiane do FETCH_RETRIES razy, po przerwie.
+    `headers` - nagłówki warunkowego GET; przy 304 Not Modified zwraca None."""
+    attempt = 0
+    while True:
+        probe = fetch_controller.acquire()
+        logging.info(f"🌐 Pobieram stronę: {page_url}")
+        started = time.perf_counter()
+        resp = error = None
+        try:
+            resp = http_session.get(page_url, headers=headers, timeout=30)
+        except requests.exceptions.RequestException as e:
+            error = e
+        elapsed = time.perf_counter() - started
+        metrics.fetch_seconds.observe(elapsed)
+        cycle_profiler.span('fetch', page_url, started, elapsed)
+        status = resp.status_code if resp is not None else None
+        if resp is None:
+            metrics.http_errors.inc(1, 'network')
+        elif status >= 400:
+            metrics.http_errors.inc(1, str(status))
+        fetch_controller.record(status, elapsed, retry_after_seconds(resp), probe)
+        if attempt < FETCH_RETRIES and FetchController.is_transient(status) and fetch_controller.state == 'closed':
+            attempt += 1
+            logging.warning(f"🔁 Ponawiam stronę {page_url} ({attempt}/{FETCH_RETRIES}) po błędzie: {status or error}")
+            continue
+        break
+    if error is not None:
+        raise error
+    resp.raise_for_status()
+    wire_bytes = response_wire_bytes(resp)
+    metrics.downloaded_bytes.inc(wire_bytes)
+    if resp.status_code == 304:
+        page_cache.count(pages=1, wire_bytes=wire_bytes)
+        return None
+    html = resp.text
+    page_cache.count(pages=1, wire_bytes=wire_bytes, body_bytes=len(resp.content))
+    page_cache.note_response(page_url, resp.headers.get('ETag'), resp.headers.get('Last-Modified'))
+    page_archive.submit(page_url, html)
+    return html
+
+def is_promoted_link(href):
+    """Wyróżnione/sponsorowane ogłoszenia OLX mają znacznik 'promoted' w parametrach linku"""
+    return 'promoted' in href.lower()
+
+def remember_crawled_links(known, keys):
+    """Dodaje ID ofert do ograniczonego indeksu crawlowania profilu (najstarsze są usuwane).
+    Indeks profilu zmienia tylko wątek skanujący ten profil, więc nie wymaga blokady."""
+    for key in keys:
+        known.pop(key, None)
+        known[key] = None
+    overflow = len(known) - CRAWL_INDEX_SIZE
+    if overflow > 0:
+        for key in list(islice(known, overflow)):
+            del known[key]
+
+def extract_page_cards(html):
+    """Karty strony wyników: JSON stanu, a gdy go brak - heurystyka DOM. Zwraca (karty, źródło)."""
+    cards = None
+    try:
+        cards = extract_state_cards(html)
+    except (ValueError, AttributeError, TypeError) as e:
+        logging.warning(f"⚠️ Nieczytelny JSON stanu strony, używam heurystyki DOM: {e}")
+    if cards is not None:
+        return cards, 'json'
+    # fallback: heurystyczny parser DOM
+    return extract_listing_cards(BeautifulSoup(html, HTML_PARSER)), 'dom'
+
+def match_cards(cards, keys, models, plan, skip=()):
+    """Bezstanowy etap filtrów (używany też przez replay.py): tytuł, cena, model, wiek i check_filters.
+    Karty z kluczem w `skip` są pomijane. Zwraca ([(ad_key, cena, ad_data)], czas filtrów w s)."""
+    matched = []
+    filter_time = 0.0
+    for card, model, ad_key in zip(cards, models, keys):
+        try:
+            # czy już widziany
+            if ad_key in skip:
                 continue
-        return new_ads
-    except requests.exceptions.RequestException as e:
-        logging.error(f"❌ Błąd sieci (strona {page_url}): {e}")
-        return []
-    except Exception as e:
-        logging.error(f"❌ Błąd parsowania strony (strona {page_url}): {e}")
-        return []
+            title = card['title']
+            if not title or len(title) < 3:
+                continue
+            # jeśli brak ceny, ignoruj (opcjonalnie można wysyłać oferty bez ceny)
+            price = card['price']
+            if price is None:
+                continue
+            if not model:
+                continue
+            time_text = card['time_text']
+            ad_time = card.get('ad_time') or (parse_olx_time(time_text) if time_text else None)
+            if not plan.within_time_limit(ad_time):
+                # jeśli ograniczenie czasu włączone i nie mieści się -> pomin
+                continue
+            # filtry (model/price/keywords/blocked)
+            filter_started = time.perf_counter()
+            passed = check_filters(title, price, model, plan)
+            filter_time += time.perf_counter() - filter_started
+            if not passed:
+                continue
+            ad_data = {
+                'url': card['link'],
+                'title': title,
+                'price': f"{int(price)} zł" if isinstance(price, (int, float)) else str(price),
+                'location': card['location'],
+                'time': time_text or '',
+                'time_ago': time_text or '',
+                'image': card['image'],
+                'seller_id': card['seller_id'],  # tylko z JSON-a stanu (karty DOM go nie mają)
+                'model': model,
+                'price_range': {"min": int(plan.price_bounds[model][0]), "max": int(plan.price_bounds[model][1])}
+            }
+            matched.append((ad_key, price, ad_data))
+        except Exception as e:
+            logging.debug(f"❌ Błąd przetwarzania kandydatu: {e}")
+            continue
+    return matched, filter_time
+
+def parse_olx_page(html, page_url='', plan=None):
+    """Parsuje HTML strony wyników: wyodrębnia karty, pomija widziane, filtruje i oznacza nowe jako widziane"""
+    started = time.perf_counter()
+    plan = plan or filter_plan  # jeden spójny plan dla całej strony
+    result = {'url': page_url, 'ads': [], 'links': [], 'parse_ms': 0.0}
+    new_ads = result['ads']
+    cards, source = extract_page_cards(html)
+    result['source'] = source
+    logging.info(f"📄 Znaleziono {len(cards)} kart ofert ({source})")
+    models = model_classifier.classify_many([card['title'] for card in cards])
+    keys = [canonical_ad_id(card['link']) for card in cards]
+    known = seen_ads.known_keys(keys)  # cała strona jednym zapytaniem
+    listings = []  # wszystkie oferty z modelem i ceną - do historii cen
+    for card, model, ad_key in zip(cards, models, keys):
+        if not card['promoted']:
+            result['links'].append(ad_key)
+        if model and card['price'] is not None:
+            damaged = plan.damaged_re is not None and plan.damaged_re.search(card['title'].lower()) is not None
+            listings.append((ad_key, model, card['price'], damaged))
+    duplicates = sum(1 for ad_key in keys if ad_key in known)
+    matched, filter_time = match_cards(cards, keys, models, plan, skip=known)
+    # każda oferta raz zasila historię i bieżącą medianę, potem wynik okazji dla dopasowanych
+    deal_scorer.observe(price_history.record(listings))
+    scored = []
+    for ad_key, price, ad_data in matched:
+        score, median = deal_scorer.score(ad_data['model'], price)
+        if plan.min_deal_score is not None and score is not None and score < plan.min_deal_score:
+            continue
+        ad_data['deal_score'] = score
+        ad_data['market_median'] = median
+        ad_data['price_value'] = price
+        scored.append((ad_key, ad_data))
+    # oznacz jako widziane (atomowo, jedną operacją - inne profile mogły dodać w międzyczasie)
+    added = seen_ads.add_new_many([ad_key for ad_key, _ in scored]) if scored else set()
+    for ad_key, ad_data in scored:
+        # ta sama oferta bywa na stronie dwa razy (wyróżniona na górze + na liście) - alert tylko raz
+        if ad_key not in added:
+            continue
+        added.discard(ad_key)
+        # nowy URL, ale ta sama oferta wystawiona ponownie?
+        repost = repost_index.check_and_add(ad_key, ad_data) if plan.repost_mode != 'off' else None
+        if repost is not None:
+            if plan.repost_mode == 'suppress':
+                logging.info(f"♻️ Pominięto repost: {ad_data['title'][:50]} (poprzednio {repost['url']})")
+                continue
+            ad_data['repost_of'] = repost
+        new_ads.append(ad_data)
+        logging.info(f"✅ Znaleziono: {ad_data['model']} | {ad_data['price']} | {ad_data['title'][:50]}")
+    parse_seconds = time.perf_counter() - started
+    result['parse_ms'] = parse_seconds * 1000
+    metrics.parse_seconds.observe(parse_seconds)
+    cycle_profiler.span('parse', page_url, started, parse_seconds)
+    metrics.filter_seconds.observe(filter_time)
+    metrics.pages.inc()
+    metrics.candidates.inc(len(cards))
+    metrics.duplicates.inc(duplicates)
+    metrics.matches.inc(len(new_ads))
+    logging.info(f"⏱️ Parsowanie strony: {result['parse_ms']:.1f} ms ({len(cards)} kart, {source})")
+    return result
+
+def build_page_url(base_url, page):
+    """Buduje adres kolejnej strony wyników"""
+    if page == 1:
+        return base_url
+    # dodawanie parametru page (bez komplikacji)
+    if '?' in base_url:
+        return f"{base_url}&page={page}"
+    return f"{base_url}?page={page}"
+
+def iter_pages_in_order(page_urls, workers=None, stop_event=None, plan=None):
+    """Potok: pula wątków pobiera strony (okno `workers` stron naraz), a ten wątek parsuje je
+    w kolejności stron, gdy kolejne są jeszcze pobierane. Po ustawieniu `stop_event` nie zleca
+    kolejnych stron, ale oddaje wyniki już pobieranych."""
+    workers = workers or FETCH_WORKERS
+    plan = plan or filter_plan  # ten sam plan do warunkowych GET-ów i parsowania
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='olx-fetch')
+    pending = deque()
+    urls = iter(page_urls)
+    try:
+        for _ in range(workers):
+            url = next(urls, None)
+            if url is None:
+                break
+            pending.append((url, executor.submit(fetch_page, url, page_cache.conditional_headers(url, plan))))
+        while pending:
+            page_url, future = pending.popleft()
+            url = next(urls, None) if not (stop_event and stop_event.is_set()) else None
+            if url is not None:
+                pending.append((url, executor.submit(fetch_page, url, page_cache.conditional_headers(url, plan))))
+            try:
+                yield process_page(future.result(), page_url, plan)
+            except CircuitOpenError as e:
+                # blokada/przeciążenie OLX - nie zlecaj kolejnych stron, dokończ już pobrane
+                if stop_event is not None and not stop_event.is_set():
+                    logging.warning(f"⛔ {e} - przerywam skan")
+                    stop_event.set()
+                yield {'url': page_url, 'ads': [], 'links': [], 'parse_ms': 0.0}
+            except requests.exceptions.RequestException as e:
+                logging.error(f"❌ Błąd sieci (strona {page_url}): {e}")
+                yield {'url': page_url, 'ads': [], 'links': [], 'parse_ms': 0.0}
+            except Exception as e:
+                logging.error(f"❌ Błąd parsowania strony (strona {page_url}): {e}")
+                yield {'url': page_url, 'ads': [], 'links': [], 'parse_ms': 0.0}
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def iter_new_ads(profile=None, cycle_stats=None):
+    """Przechodzi przez kolejne strony profilu (równolegle) i oddaje nowe ogłoszenia, gdy tylko strona zostanie sprawdzona"""
+    profile = profile or search_profiles[0]
+    if not profile.active:
+        logging.info(f"⏸️ Monitoring nieaktywny ({profile.name})")
+        return
+    page_urls = [build_page_url(profile.url, page) for page in range(1, profile.max_pages + 1)]
+    # tryb przyrostowy: kończ po N stronach bez nowych linków, pełny przegląd co K cykli
+    cycle = monitor_state.update_profile(profile.name, add={'cycles': 1})['cycles'] - 1
+    known = crawled_links.setdefault(profile.name, {})
+    crawled_at = crawled_pages.setdefault(profile.name, {})
+    incremental = profile.incremental and cycle % profile.deep_every != 0
+    stop_event = Event()
+    cycle_links = set()
+    stale_pages = 0
+    pages_done = 0
+    ads_found = 0
+    fresh_rate = None  # nowe linki/min; każda strona dzielona przez czas od jej poprzedniego przejrzenia
+    candidates = 0
+    started = time.monotonic()
+    for page, page_result in enumerate(iter_pages_in_order(page_urls, stop_event=stop_event, plan=profile.plan), start=1):
+        pages_done = page
+        ads_found += len(page_result['ads'])
+        candidates += len(page_result['links'])
+        for ad in page_result['ads']:
+            ad['profile'] = profile.name
+        yield from page_result['ads']
+        # linki powtarzające się na kolejnych stronach (np. wyróżnione) nie liczą się jako nowe
+        fresh = [k for k in page_result['links'] if k not in cycle_links and k not in known]
+        # skan przyrostowy pomija dalsze strony - pełny przegląd znajduje na nich linki z kilku cykli
+        now = time.time()
+        previous = crawled_at.get(page)
+        crawled_at[page] = now
+        if previous is not None:
+            fresh_rate = (fresh_rate or 0.0) + len(fresh) / max((now - previous) / 60, 0.5)
+        cycle_links.update(page_result['links'])
+        remember_crawled_links(known, page_result['links'])
+        logging.info(f"🔍 [{profile.name}] Sprawdzono stronę {page}/{profile.max_pages}: {len(page_result['ads'])} nowych, {len(fresh)} nieznanych linków")
+        if not incremental or stop_event.is_set():
+            continue
+        stale_pages = 0 if fresh else stale_pages + 1
+        if stale_pages >= profile.stop_after:
+            logging.info(f"⏹️ [{profile.name}] {stale_pages} stron(y) bez nowych ofert - kończę skan przyrostowy na stronie {page}")
+            stop_event.set()
+    elapsed = time.monotonic() - started
+    monitor_state.update_profile(profile.name, add={'pages': pages_done, 'candidates': candidates, 'matches': ads_found},
+                                 last_run=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                                 last_duration=round(elapsed, 1), last_pages=pages_done)
+    if cycle_stats is not None:
+        cycle_stats[profile.name] = (pages_done, fresh_rate)  # każdy profil pisze tylko swój klucz
+    mode = "przyrostowy" if incremental else "pełny"
+    logging.info(f"📊 [{profile.name}] Podsumowanie ({mode}): {ads_found} nowych ogłoszeń z {pages_done} stron w {elapsed:.1f}s")
 
-def check_olx():
-    """Przechodzi przez kolejne strony i zbiera nowe ogłoszenia"""
+def new_profile_stats():
+    return {'cycles': 0, 'pages': 0, 'candidates': 0, 'matches': 0, 'last_run': '-', 'last_duration': 0.0, 'last_pages': 0}
+
+def active_profiles():
+    """Profile do skanowania w tym cyklu (migawka - panel podmienia całą krotkę)"""
     if not CONFIG.get('active', True):
-        logging.info("⏸️ Monitoring nieaktywny")
-        return []
-    all_new_ads = []
-    max_pages = max(1, min(int(CONFIG.get('max_pages', 50)), 100)) # ograniczenie do 100
-    for page in range(1, max_pages + 1):
-        if page == 1:
-            page_url = CONFIG['url']
-        else:
-            # dodawanie parametru page (bez komplikacji)
-            if '?' in CONFIG['url']:
-                page_url = f"{CONFIG['url']}&page={page}"
-            else:
-                page_url = f"{CONFIG['url']}?page={page}"
-        logging.info(f"🔍 Sprawdzam stronę {page}/{max_pages}: {page_url}")
-        page_ads = check_olx_page(page_url)
-        all_new_ads.extend(page_ads)
-        # krótka przerwa między pobraniami stron
-        if page < max_pages:
-            time.sleep(1.5)
-    logging.info(f"📊 Podsumowanie: {len(all_new_ads)} nowych ogłoszeń z {max_pages} stron")
-    return all_new_ads
+        return ()
+    return tuple(p for p in search_profiles if p.active)
+
+# ========== SZCZEGÓŁY OGŁOSZEŃ ==========
+DETAIL_STORAGE_RE = re.compile(r'\b(\d{2,4})\s*(GB|TB)\b', re.IGNORECASE)
+DETAIL_BATTERY_RE = re.compile(r'(?:bateri|kondycj)\w*\D{0,25}?(\d{2,3})\s*%', re.IGNORECASE)
+DETAIL_SELLER_RE = re.compile(r'\b(Firmowe|Prywatne)\b')
+
+def parse_detail_page(html):
+    """Wyciąga ze strony /oferta/ pamięć, kondycję baterii i typ sprzedawcy (JSON stanu, awaryjnie tekst strony)"""
+    details = {}
+    try:
+        state = read_prerendered_state(html)
+    except (ValueError, AttributeError, TypeError):
+        state = None
+    ad = ((state or {}).get('ad') or {}).get('ad') or {}
+    for param in ad.get('params') or []:
+        name = f"{param.get('key', '')} {param.get('name', '')}".lower()
+        value = param.get('value') or param.get('normalizedValue')
+        if isinstance(value, dict):
+            value = value.get('label') or value.get('key')
+        if not value:
+            continue
+        if 'pamięć' in name or 'memory' in name:
+            details['storage'] = str(value)
+        elif 'bateri' in name or 'battery' in name:
+            details['battery'] = str(value) if '%' in str(value) else f"{value}%"
+    if 'isBusiness' in ad:
+        details['seller'] = 'firma' if ad['isBusiness'] else 'prywatny'
+    text = ad.get('description') or ''
+    if not ad:
+        text = BeautifulSoup(html, HTML_PARSER).get_text(' ')
+    if 'storage' not in details:
+        match = DETAIL_STORAGE_RE.search(text) or DETAIL_STORAGE_RE.search(ad.get('title') or '')
+        if match:
+            details['storage'] = f"{match.group(1)} {match.group(2).upper()}"
+    if 'battery' not in details:
+        match = DETAIL_BATTERY_RE.search(text)
+        if match and int(match.group(1)) <= 100:
+            details['battery'] = f"{match.group(1)}%"
+    if 'seller' not in details:
+        match = DETAIL_SELLER_RE.search(text)
+        if match:
+            details['seller'] = 'firma' if match.group(1) == 'Firmowe' else 'prywatny'
+    return details
+
+class DetailCache:
+    """Dyskowy cache stron /oferta/ kluczowany ID oferty: walidatory HTTP (ETag/Last-Modified) + wyciągnięte szczegóły"""
+    def __init__(self, path):
+        self.path = path
+
+    def _file(self, ad_id):
+        return os.path.join(self.path, f"{ad_id % 256:02x}", f"{ad_id}.json")
+
+    def get(self, ad_id):
+        try:
+            with open(self._file(ad_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, ad_id, entry):
+        path = self._file(ad_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+
+class DetailEnricher:
+    """Opcjonalne wzbogacanie wysłanych alertów danymi ze strony /oferta/ (w tle, przez fetch_controller)"""
+    def __init__(self, cache, workers, max_per_second, max_pending, fresh_seconds):
+        self.cache = cache
+        self.workers = workers
+        self.limiter = PolitenessLimiter(max_per_second)
+        self.slots = BoundedSemaphore(max_pending)
+        self.fresh_seconds = fresh_seconds
+        self.executor = None
+        self.lock = Lock()
+        self.stats = {'fetched': 0, 'revalidated': 0, 'cache_hits': 0, 'updated': 0, 'skipped': 0, 'failed': 0}
+
+    def _count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def submit(self, ad):
+        """Zleca wzbogacenie; przy pełnej kolejce albo blokadzie OLX pomija (alert już poszedł, szczegóły są dodatkiem)"""
+        if fetch_controller.state != 'closed' or not self.slots.acquire(blocking=False):
+            self._count('skipped')
+            return False
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='olx-detail')
+        self.executor.submit(self._run, ad)
+        return True
+
+    def _run(self, ad):
+        try:
+            details = self.fetch_details(ad['url'])
+            if details:
+                ad['details'] = details
+                if discord_dispatcher.update_ad(ad):
+                    self._count('updated')
+        except CircuitOpenError:
+            self._count('skipped')
+        except Exception as e:
+            self._count('failed')
+            logging.warning(f"⚠️ Nie udało się pobrać szczegółów {ad['url']}: {e}")
+        finally:
+            self.slots.release()
+
+    def fetch_details(self, url):
+        """Szczegóły oferty: świeży wpis z cache bez zapytania, starszy - rewalidacja warunkowym GET"""
+        ad_id = canonical_ad_id(url)
+        entry = self.cache.get(ad_id)
+        now = time.time()
+        if entry and now - entry.get('fetched_at', 0) < self.fresh_seconds:
+            self._count('cache_hits')
+            return entry['details']
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        self.limiter.acquire()
+        probe = fetch_controller.acquire()
+        started = time.perf_counter()
+        try:
+            response = http_session.get(url, headers=headers, timeout=30)
+        except requests.exceptions.RequestException:
+            fetch_controller.record(None, time.perf_counter() - started, probe=probe)
+            raise
+        fetch_controller.record(response.status_code, time.perf_counter() - started, retry_after_seconds(response), probe)
+        if response.status_code == 304 and entry:
+            self._count('revalidated')
+            entry['fetched_at'] = now
+            self.cache.put(ad_id, entry)
+            return entry['details']
+        response.raise_for_status()
+        self._count('fetched')
+        details = parse_detail_page(response.text)
+        self.cache.put(ad_id, {'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified'),
+                               'fetched_at': now, 'details': details})
+        return details
+
+detail_enricher = DetailEnricher(DetailCache(DETAIL_CACHE_DIR), DETAIL_WORKERS, DETAIL_REQUESTS_PER_SECOND,
+                                 DETAIL_QUEUE_SIZE, DETAIL_CACHE_FRESH_SECONDS)
+
+# ========== POTOK POWIADOMIEŃ ==========
+def run_scan_cycle():
+    """Jeden cykl w potoku: profile skanowane równolegle (wspólna pula połączeń, limit zapytań i seen_ads),
+    pobieranie ‖ parsowanie+filtry ‖ powiadomienia. Zwraca (znalezione, wysłane)."""
+    started = time.monotonic()
+    ads_queue = Queue(maxsize=NOTIFY_QUEUE_SIZE)
+    stats = {'delivered': 0, 'first_alert_s': None}
+    cycle_stats = {}  # profil -> (strony, nowe linki/min albo None)
+    notifier = Thread(target=notify_worker, args=(ads_queue, started, stats), name='discord-notify', daemon=True)
+    notifier.start()
+
+    def enqueue(item):
+        """Pełna kolejka = naturalne hamowanie skanu, gdy Discord nie nadąża; False, gdy wątek powiadomień nie żyje"""
+        while True:
+            try:
+                ads_queue.put(item, timeout=1.0)
+                return True
+            except Full:
+                if not notifier.is_alive():
+                    return False
+
+    def scan_profile(profile):
+        found = 0
+        try:
+            for ad in iter_new_ads(profile, cycle_stats):
+                if not enqueue(ad):
+                    logging.error(f"❌ Wątek powiadomień nie działa - przerywam skan profilu {profile.name}")
+                    break
+                found += 1
+        except Exception as e:
+            logging.error(f"❌ Błąd skanu profilu {profile.name}: {e}")
+        return found
+
+    found = 0
+    try:
+        profiles = active_profiles()
+        with ThreadPoolExecutor(max_workers=max(1, min(len(profiles), MAX_CONCURRENT_PROFILES)), thread_name_prefix='olx-profile') as executor:
+            found = sum(executor.map(scan_profile, profiles))
+    finally:
+        enqueue(None)
+        notifier.join()
+        transfer = page_cache.end_cycle()
+    logging.info(f"📦 Transfer: {transfer['pages']} stron, {transfer['wire_bytes'] / 1024:.0f} KB z sieci "
+                 f"({transfer['body_bytes'] / 1024:.0f} KB po rozpakowaniu), bez parsowania: {transfer['not_modified']} (304) + {transfer['hash_skips']} (skrót)")
+    rates = [rate for _, rate in cycle_stats.values() if rate is not None]
+    changes = {'last_cycle_pages': sum(pages for pages, _ in cycle_stats.values()),
+               'last_cycle_fresh_rate': sum(rates) if rates else None}
+    if stats['first_alert_s'] is not None:
+        changes['last_first_alert_s'] = stats['first_alert_s']
+    monitor_state.update(**changes)
+    return found, stats['delivered']
+
+def notify_worker(ads_queue, started, stats):
+    """Etap powiadomień: zbiera dostępne ogłoszenia w paczki (krótkie czekanie na kolejne) i wysyła"""
+    done = False
+    while not done:
+        ad = ads_queue.get()
+        if ad is None:
+            break
+        batch = [ad]
+        linger_until = time.monotonic() + NOTIFY_LINGER_SECONDS
+        while len(batch) < DISCORD_MAX_EMBEDS:
+            try:
+                ad = ads_queue.get(timeout=max(0.0, linger_until - time.monotonic()))
+            except Empty:
+                break
+            if ad is None:
+                done = True
+                break
+            batch.append(ad)
+        # najlepsze okazje pierwsze (oferty bez wyniku traktowane jak cena rynkowa)
+        batch.sort(key=lambda item: item.get('deal_score') or 0.0, reverse=True)
+        enrich = CONFIG.get('enrich_details', False)
+        # wątek musi przeżyć każdy błąd paczki - inaczej skan zawiśnie na pełnej kolejce
+        try:
+            delivered = discord_dispatcher.send_ads(batch, track=enrich)
+        except Exception as e:
+            logging.error(f"❌ Błąd wysyłki paczki {len(batch)} ogłoszeń: {e}")
+            continue
+        if enrich:
+            try:
+                for ad in batch:
+                    # tylko dostarczone i śledzone - niedostarczonych nie da się edytować, szkoda budżetu zapytań
+                    if discord_dispatcher.is_tracked(ad['url']):
+                        detail_enricher.submit(ad)  # szczegóły dojdą edycją wiadomości, alert już wysłany
+            except Exception as e:
+                logging.error(f"❌ Błąd zlecania szczegółów ofert: {e}")
+        stats['delivered'] += delivered
+        if delivered and stats['first_alert_s'] is None:
+            stats['first_alert_s'] = time.monotonic() - started
+            logging.info(f"⚡ Pierwszy alert po {stats['first_alert_s']:.1f}s od startu cyklu")
 
 # ========== GŁÓWNA PĘTLA MONITORUJĄCA ==========
 def monitoring_loop():
@@ -500,36 +3000,187 @@ def monitoring_loop():
     logging.info(f"📱 Aktywne modele: {len(CONFIG['active_models'])}")
     logging.info(f"🔗 Webhook Discord: {'✅' if DISCORD_WEBHOOK else '❌'}")
     load_seen_ads()
+    load_repost_index()
     while True:
         try:
             if CONFIG.get('active', True) and DISCORD_WEBHOOK:
-                ads = check_olx()
-                if ads:
-                    success_count = 0
-                    for ad in ads:
-                        if send_discord_notification(ad):
-                            success_count += 1
-                    with monitor_state.lock:
-                        monitor_state.last_found_time = datetime.now()
-                        monitor_state.consecutive_zero_count = 0
+                if not fetch_controller.ready():
+                    wait = fetch_controller.seconds_until_probe()
+                    logging.warning(f"⛔ Bezpiecznik OLX otwarty - skan wstrzymany, próba za {wait:.0f}s")
+                    time.sleep(wait)
+                    continue
+                cycle_profiler.start_cycle()
+                try:
+                    found, success_count = run_scan_cycle()
+                finally:
+                    cycle_profiler.end_cycle()
+                if found:
+                    snapshot = monitor_state.update(last_found_time=datetime.now(), consecutive_zero_count=0)
                     save_seen_ads()
-                    logging.info(f"📨 Wysłano {success_count}/{len(ads)} ogłoszeń na Discord")
+                    save_repost_index()
+                    logging.info(f"📨 Wysłano {success_count}/{found} ogłoszeń na Discord")
                 else:
-                    with monitor_state.lock:
-                        monitor_state.consecutive_zero_count += 1
-                    logging.info(f"🔍 Brak nowych ogłoszeń (seria: {monitor_state.consecutive_zero_count})")
+                    # tylko ta pętla zmienia licznik serii, więc odczyt migawki + update nie gubi zmian
+                    snapshot = monitor_state.update(consecutive_zero_count=monitor_state.snapshot.consecutive_zero_count + 1)
+                    logging.info(f"🔍 Brak nowych ogłoszeń (seria: {snapshot.consecutive_zero_count})")
+                scan_scheduler.record_cycle(snapshot.last_cycle_fresh_rate, snapshot.last_cycle_pages)
+                update_market_index()
                 check_8_hours_alert()
                 check_hourly_status()
-                # LOSOWE OPÓŹNIENIE 2-7 min
-                delay = get_random_delay()
+                # ADAPTACYJNE OPÓŹNIENIE (tempo ofert o tej porze + budżet zapytań)
+                delay, reason = scan_scheduler.next_delay()
                 minutes = delay // 60
                 seconds = delay % 60
-                logging.info(f"⏰ Następne skanowanie za {minutes}min {seconds}s...")
+                logging.info(f"⏰ Następne skanowanie za {minutes}min {seconds}s ({reason})...")
                 time.sleep(delay)
+            else:
+                # monitoring wyłączony albo brak webhooka - nie kręć pętli na pusto
+                time.sleep(BASE_CHECK_INTERVAL)
         except Exception as e:
             logging.error(f"❌ Błąd pętli: {e}")
             time.sleep(60)
 
+# ========== TRYB WIELU PROCESÓW (LIDER) ==========
+class SharedState:
+    """Wspólny magazyn klucz-wartość (SQLite, WAL) dla procesów serwera web"""
+    def __init__(self, path):
+        self.path = path
+        self.conn = None
+        self.pid = None
+        self.lock = Lock()
+
+    def _connection(self):
+        if self.conn is None or self.pid != os.getpid():  # ponownie po fork() - workery gunicorna dziedziczą moduł
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS shared_state (key TEXT PRIMARY KEY, value TEXT NOT NULL, updated_at REAL NOT NULL)")
+            self.conn, self.pid = conn, os.getpid()
+        return self.conn
+
+    def put(self, key, value):
+        with self.lock:
+            self._connection().execute("INSERT OR REPLACE INTO shared_state (key, value, updated_at) VALUES (?, ?, ?)",
+                                       (key, json.dumps(value, ensure_ascii=False), time.time()))
+
+    def get(self, key):
+        """Zwraca (wartość, czas_zapisu) albo (None, 0)"""
+        with self.lock:
+            row = self._connection().execute("SELECT value, updated_at FROM shared_state WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None, 0.0
+        return json.loads(row[0]), row[1]
+
+class LeaderLock:
+    """Wyłączna blokada pliku (flock) - skanuje dokładnie jeden proces"""
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+
+    def try_acquire(self):
+        if self.fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self.fd = fd
+        return True
+
+    @property
+    def held(self):
+        return self.fd is not None
+
+shared_state = SharedState(SHARED_STATE_DB) if SCANNER_MODE == 'leader' and fcntl is not None else None
+leader_lock = LeaderLock(LEADER_LOCK_FILE)
+config_version = 0.0  # czas zapisu konfiguracji wczytanej z magazynu
+
+def sync_shared_config():
+    """Wczytuje konfigurację z magazynu, jeśli inny proces zapisał nowszą"""
+    global config_version
+    if shared_state is None:
+        return
+    config, updated_at = shared_state.get('config')
+    if config is not None and updated_at > config_version:
+        with config_lock:
+            apply_config(config)
+            config_version = updated_at
+
+def publish_config():
+    """Zapisuje bieżącą konfigurację dla pozostałych procesów (wołane pod config_lock)"""
+    global config_version
+    if shared_state is None:
+        return
+    shared_state.put('config', CONFIG)
+    _, config_version = shared_state.get('config')
+
+def collect_status():
+    """Migawka stanu skanera (to, co pokazuje panel) jako zwykłe, serializowalne dane - bez blokady stanu"""
+    snapshot = monitor_state.snapshot
+    return {
+        'last_found_time': snapshot.last_found_time.strftime('%Y-%m-%d %H:%M:%S'),
+        'first_alert_s': snapshot.last_first_alert_s,
+        'profile_stats': {name: dict(stats) for name, stats in snapshot.profile_stats.items()},
+        'seen_ads_count': len(seen_ads),
+        'seen_stats': seen_ads.stats(),
+        'discord_stats': dict(discord_dispatcher.stats),
+        'enrich_stats': dict(detail_enricher.stats),
+        'repost_stats': dict(repost_index.stats, entries=len(repost_index.entries)),
+        'fetch_control': fetch_controller.status(),
+        'transfer': page_cache.status(),
+        'archive_stats': dict(page_archive.stats, enabled=page_archive.enabled),
+        'scheduler': {'last_delay': scan_scheduler.last_delay, 'last_reason': scan_scheduler.last_reason,
+                      'min_interval': scan_scheduler.min_interval, 'max_interval': scan_scheduler.max_interval,
+                      'budget_per_hour': scan_scheduler.budget_per_hour},
+        'profiler': {'remaining': cycle_profiler.remaining, 'active': cycle_profiler.active,
+                     'last_report': cycle_profiler.last_report},
+        'market': market_index.stats,
+        'deals': deal_scorer.snapshot(),
+        'market_info': {'rows': price_history.rows, 'window_days': market_index.window_days,
+                        'update_ms': market_index.last_update_ms},
+        'leader': {'pid': os.getpid(), 'mode': SCANNER_MODE},
+    }
+
+def current_status():
+    """Status dla panelu: lokalny, gdy ten proces skanuje, w przeciwnym razie ostatnia migawka lidera"""
+    if shared_state is None or leader_lock.held:
+        return collect_status()
+    status, updated_at = shared_state.get('status')
+    if status is None:
+        status = dict(collect_status(), leader={'pid': None, 'mode': SCANNER_MODE})
+        return status
+    status['leader']['age_s'] = round(time.time() - updated_at, 1)
+    return status
+
+def leader_loop():
+    """Wybory lidera: co LEADER_HEARTBEAT_SECONDS próbuje przejąć blokadę; lider uruchamia skaner,
+    publikuje status i metryki oraz wykonuje polecenia zapisane przez inne procesy."""
+    profile_request_seen = price_request_seen = time.time()
+    while True:
+        try:
+            if not leader_lock.held and leader_lock.try_acquire():
+                logging.info(f"👑 Proces {os.getpid()} przejął rolę skanera")
+                sync_shared_config()
+                Thread(target=monitoring_loop, name='monitoring', daemon=True).start()
+            if leader_lock.held:
+                sync_shared_config()
+                request_value, requested_at = shared_state.get('profile_request')
+                if request_value and requested_at > profile_request_seen:
+                    profile_request_seen = requested_at
+                    cycle_profiler.arm(request_value['cycles'])
+                _, requested_at = shared_state.get('price_request')
+                if requested_at > price_request_seen:
+                    price_request_seen = requested_at
+                    apply_price_suggestions()
+                shared_state.put('status', collect_status())
+                shared_state.put('metrics', metrics.render())
+        except Exception as e:
+            logging.error(f"❌ Błąd pętli lidera: {e}")
+        time.sleep(LEADER_HEARTBEAT_SECONDS)
+
 # ========== PANEL WEB ==========
 HTML_TEMPLATE = """
 <!DOCTYPE html>
@@ -557,7 +3208,7 @@ HTML_TEMPLATE = """
     {% endif %}
     <div class="status info">
         <strong>🎯 Bot monitorujący OLX</strong><br>
-        Losowe opóźnienia 2-7min • Alerty 8h • Status co 1h
+        Adaptacyjny interwał skanów • Alerty 8h • Status co 1h
     </div>
     <form method="POST" action="/config">
         <div class="form-group">
@@ -585,6 +3236,16 @@ HTML_TEMPLATE = """
             <label>Maksymalna liczba stron OLX do sprawdzenia:</label>
             <input type="number" name="max_pages" value="{{ config.max_pages }}" min="1" max="100">
         </div>
+        <div class="form-group">
+            <label>
+                <input type="checkbox" name="incremental_crawl" {% if config.incremental_crawl %}checked{% endif %}>
+                ⏩ Skan przyrostowy (przerwij po stronach z samymi znanymi ofertami)
+            </label>
+            <label>Przerwij po tylu stronach bez nowych ofert:</label>
+            <input type="number" name="stop_after_seen_pages" value="{{ config.stop_after_seen_pages }}" min="1" max="100">
+            <label>Pełny skan wszystkich stron co tyle cykli:</label>
+            <input type="number" name="deep_scan_every" value="{{ config.deep_scan_every }}" min="1" max="1000">
+        </div>
         <div class="form-group">
             <label>
                 <input type="checkbox" name="include_damaged" {% if config.include_damaged %}checked{% endif %}>
@@ -597,6 +3258,30 @@ HTML_TEMPLATE = """
                 🕰️ Pominąć limit wieku ogłoszeń (wysyłaj też stare)
             </label>
         </div>
+        <div class="form-group">
+            <label>
+                <input type="checkbox" name="auto_price_ranges" {% if config.auto_price_ranges %}checked{% endif %}>
+                📈 Automatycznie stosuj zakresy cen z indeksu rynkowego
+            </label>
+        </div>
+        <div class="form-group">
+            <label>
+                <input type="checkbox" name="enrich_details" {% if config.enrich_details %}checked{% endif %}>
+                🔎 Uzupełniaj alerty danymi ze strony oferty (pamięć, bateria, sprzedawca)
+            </label>
+        </div>
+        <div class="form-group">
+            <label>♻️ Ponownie wystawione oferty (nowy URL, ta sama oferta):</label>
+            <select name="repost_mode">
+                <option value="tag" {% if config.repost_mode == 'tag' %}selected{% endif %}>Oznacz w alercie</option>
+                <option value="suppress" {% if config.repost_mode == 'suppress' %}selected{% endif %}>Nie wysyłaj</option>
+                <option value="off" {% if config.repost_mode == 'off' %}selected{% endif %}>Wyłączone</option>
+            </select>
+        </div>
+        <div class="form-group">
+            <label>🔥 Minimalny wynik okazji (puste = wysyłaj wszystkie; 0 = nie drożej niż mediana, 1-2 = wyraźnie taniej):</label>
+            <input type="number" name="min_deal_score" step="0.1" value="{{ config.min_deal_score if config.min_deal_score is not none else '' }}">
+        </div>
         <div class="form-group">
             <label>
                 <input type="checkbox" name="active" {% if config.active %}checked{% endif %}>
@@ -605,69 +3290,298 @@ HTML_TEMPLATE = """
         </div>
         <button type="submit">💾 Zapisz konfigurację</button>
     </form>
+    <div style="margin-top: 30px; padding: 20px; background: #f8f9fa; border-radius: 5px;">
+        <h3>🔎 Profile wyszukiwania:</h3>
+        <table style="width: 100%; font-size: 14px;">
+            <tr><th align="left">Profil</th><th>Strony</th><th>Aktywny</th><th>Cykle</th><th>Pobrane strony</th><th>Kandydaci</th><th>Dopasowania</th><th>Ostatni skan</th><th></th></tr>
+            {% for p in profiles %}
+            {% set st = profile_stats.get(p.name, {}) %}
+            <tr>
+                <td><strong>{{ p.name }}</strong><br><small>{{ p.url }}</small></td>
+                <td align="center">{{ p.max_pages }}</td>
+                <td align="center">{% if p.active %}✅{% else %}⏸️{% endif %}</td>
+                <td align="center">{{ st.cycles or 0 }}</td>
+                <td align="center">{{ st.pages or 0 }}</td>
+                <td align="center">{{ st.candidates or 0 }}</td>
+                <td align="center">{{ st.matches or 0 }}</td>
+                <td align="center">{{ st.last_run or '-' }}{% if st.last_run %} ({{ st.last_duration }}s, {{ st.last_pages }} str.){% endif %}</td>
+                <td>{% if p.name != main_profile %}
+                    <form method="POST" action="/profiles"><input type="hidden" name="name" value="{{ p.name }}"><input type="hidden" name="action" value="delete"><button type="submit">🗑️</button></form>
+                {% endif %}</td>
+            </tr>
+            {% endfor %}
+        </table>
+        <form method="POST" action="/profiles">
+            <h4>➕ Dodaj / nadpisz profil (puste pola = ustawienia główne):</h4>
+            <input type="text" name="name" placeholder="Nazwa, np. Warszawa 15 Pro">
+            <input type="text" name="url" placeholder="https://www.olx.pl/elektronika/telefony/smartfony-telefony-komorkowe/iphone/warszawa/">
+            <input type="number" name="max_pages" placeholder="Liczba stron" min="1" max="100">
+            <input type="text" name="active_models" placeholder="Modele (oddziel przecinkiem), np. 15 Pro, 15 Pro Max">
+            <input type="text" name="keywords" placeholder="Wymagane słowa (oddziel przecinkiem)">
+            <input type="text" name="blocked_keywords" placeholder="Zablokowane słowa (oddziel przecinkiem)">
+            <label><input type="checkbox" name="active" checked> 🟢 Aktywny</label>
+            <button type="submit">💾 Zapisz profil</button>
+        </form>
+    </div>
     <div style="margin-top: 30px; padding: 20px; background: #f8f9fa; border-radius: 5px;">
         <h3>📊 Status systemu:</h3>
         <p>🟢 <strong>Aktywny:</strong> {% if config.active %}TAK{% else %}NIE{% endif %}</p>
-        <p>⏰ <strong>Interwał skanów:</strong> 2-7 minut (losowy)</p>
+        {% if leader.mode == 'leader' %}<p>👑 <strong>Skaner:</strong> {% if leader.pid %}proces {{ leader.pid }}{% if leader.age_s is defined %} (status sprzed {{ leader.age_s }}s){% else %} (ten proces){% endif %}{% else %}brak lidera{% endif %}</p>{% endif %}
+        <p>⏰ <strong>Interwał skanów:</strong> {% if scheduler.last_delay is not none %}{{ scheduler.last_delay // 60 }}min {{ scheduler.last_delay % 60 }}s{% else %}-{% endif %}
+            ({{ scheduler.last_reason }}; zakres {{ scheduler.min_interval }}-{{ scheduler.max_interval }}s, budżet {{ scheduler.budget_per_hour }} zapytań/h)</p>
+        <p>🚦 <strong>Zapytania OLX:</strong> {% if fetch_control.state == 'closed' %}✅ normalnie{% elif fetch_control.state == 'open' %}⛔ bezpiecznik otwarty (próba za {{ fetch_control.open_for }}s){% else %}🟡 zapytanie próbne{% endif %},
+            tempo {% if fetch_control.rate is not none %}{{ fetch_control.rate }}/{{ fetch_control.max_rate }} zapytań/s{% else %}bez limitu{% endif %},
+            błędy z rzędu {{ fetch_control.failures_in_row }}, blokady 403/429 {{ fetch_control.throttled }}, przerwy {{ fetch_control.backoffs }}, zadziałania bezpiecznika {{ fetch_control.trips }}, wstrzymane zapytania {{ fetch_control.rejected }}{% if fetch_control.last_retry_after is not none %}, ostatni Retry-After {{ fetch_control.last_retry_after }}s{% endif %}</p>
+        <p>📦 <strong>Transfer (ostatni cykl):</strong> {{ transfer.last.pages }} stron, {{ (transfer.last.wire_bytes / 1024)|round(1) }} KB z sieci ({{ (transfer.last.body_bytes / 1024)|round(1) }} KB po rozpakowaniu),
+            bez parsowania {{ transfer.last.not_modified }} (304) + {{ transfer.last.hash_skips }} (skrót ofert); łącznie {{ (transfer.totals.wire_bytes / 1048576)|round(1) }} MiB, pominięte {{ transfer.totals.not_modified + transfer.totals.hash_skips }}/{{ transfer.totals.pages }} stron</p>
         <p>📨 <strong>Webhook Discord:</strong> {% if DISCORD_WEBHOOK %}✅ Skonfigurowany{% else %}❌ Brak{% endif %}</p>
         <p>👀 <strong>Śledzone ogłoszenia:</strong> {{ seen_ads_count }}</p>
+        <p>📨 <strong>Discord:</strong> dostarczone {{ discord_stats.delivered }}, porzucone {{ discord_stats.dropped }}, wiadomości {{ discord_stats.messages }}, ponowienia {{ discord_stats.retries }}, edycje {{ discord_stats.edited }}, limity 429: {{ discord_stats.rate_limited }}</p>
+        <p>🔎 <strong>Szczegóły ofert:</strong> {% if config.enrich_details %}pobrane {{ enrich_stats.fetched }}, z cache {{ enrich_stats.cache_hits }}, zrewalidowane (304) {{ enrich_stats.revalidated }}, zaktualizowane alerty {{ enrich_stats.updated }}, pominięte {{ enrich_stats.skipped }}, błędy {{ enrich_stats.failed }}{% else %}wyłączone{% endif %}</p>
+        <p>♻️ <strong>Reposty:</strong> sprawdzone {{ repost_stats.checked }}, wykryte {{ repost_stats.reposts }}, w indeksie {{ repost_stats.entries }}</p>
+        <p>🗄️ <strong>Archiwum stron:</strong> {% if archive_stats.enabled %}zapisane {{ archive_stats.archived }} ({{ (archive_stats.stored_bytes / 1048576)|round(1) }} MiB z {{ (archive_stats.raw_bytes / 1048576)|round(1) }} MiB), pominięte {{ archive_stats.dropped }}, usunięte segmenty {{ archive_stats.evicted }}, błędy {{ archive_stats.failed }}{% else %}wyłączone (PAGE_ARCHIVE_DIR){% endif %}</p>
+        <p>🧠 <strong>Indeks widzianych:</strong> cache {{ seen_stats.cache_entries }} ID (~{{ (seen_stats.cache_bytes / 1024)|round(1) }} KB),
+            {% if seen_stats.bloom %}Bloom {{ (seen_stats.bloom.bytes / 1024)|round(1) }} KB / k={{ seen_stats.bloom.hashes }} / FP≈{{ '%.4f'|format(seen_stats.bloom.est_fp_rate) }},{% else %}bez filtra Blooma,{% endif %}
+            zapytania do bazy {{ seen_stats.db_lookups }}, pominięte dzięki Bloomowi {{ seen_stats.bloom_skips }}</p>
         <p>📄 <strong>Sprawdzane strony OLX:</strong> {{ config.max_pages }}</p>
+        <p>⏩ <strong>Skan przyrostowy:</strong> {% if config.incremental_crawl %}TAK (stop po {{ config.stop_after_seen_pages }} str., pełny co {{ config.deep_scan_every }} cykli){% else %}NIE{% endif %}</p>
         <p>📱 <strong>Aktywne modele:</strong> {{ config.active_models|length }}/{{ price_ranges|length }}</p>
         <p>🕒 <strong>Ostatnie znalezione:</strong> {{ last_found_time }}</p>
+        <p>⚡ <strong>Czas do pierwszego alertu (ostatni cykl):</strong> {% if first_alert_s is not none %}{{ '%.1f'|format(first_alert_s) }}s{% else %}-{% endif %}</p>
         <p>🔧 <strong>Pokazuj uszkodzone:</strong> {% if config.include_damaged %}TAK{% else %}NIE{% endif %}</p>
         <p>🕰️ <strong>Pomiń limit wieku:</strong> {% if config.ignore_age_limit %}TAK{% else %}NIE{% endif %}</p>
     </div>
+    <div style="margin-top: 30px; padding: 20px; background: #f8f9fa; border-radius: 5px;">
+        <h3>📈 Indeks cen rynkowych ({{ market_info.window_days }} dni, historia {{ market_info.rows }} ofert, przeliczenie {{ market_info.update_ms|round(1) }} ms):</h3>
+        {% if market %}
+        <table style="width: 100%; font-size: 13px;">
+            <tr><th align="left">Model</th><th>Oferty</th><th>p10</th><th>p25</th><th>Mediana</th><th>p75</th><th>p90</th><th>Bieżąca mediana</th><th>Zakres</th><th>Sugerowany</th></tr>
+            {% for model, prices in price_ranges.items() if model in market %}
+            {% set m = market[model] %}
+            <tr>
+                <td><strong>{{ model }}</strong></td><td align="center">{{ m.samples }}</td>
+                <td align="center">{{ m.p10 }}</td><td align="center">{{ m.p25 }}</td><td align="center"><strong>{{ m.p50 }}</strong></td>
+                <td align="center">{{ m.p75 }}</td><td align="center">{{ m.p90 }}</td>
+                <td align="center">{% if model in deals %}{{ deals[model].median }} ±{{ deals[model].spread }}{% else %}-{% endif %}</td>
+                <td align="center">{{ prices.min }}-{{ prices.max }}</td>
+                <td align="center">{% if m.suggested %}{{ m.suggested.min }}-{{ m.suggested.max }}{% else %}-{% endif %}</td>
+            </tr>
+            {% endfor %}
+        </table>
+        <form method="POST" action="/prices" style="display: inline;"><input type="hidden" name="action" value="apply"><button type="submit">🎯 Zastosuj sugerowane zakresy</button></form>
+        {% else %}
+        <p>Brak danych - indeks uzupełnia się po każdym cyklu skanu.</p>
+        {% endif %}
+        {% if config.price_overrides %}
+        <form method="POST" action="/prices" style="display: inline;"><input type="hidden" name="action" value="reset"><button type="submit">↩️ Przywróć cennik bazowy</button></form>
+        {% endif %}
+    </div>
+    <div style="margin-top: 30px; padding: 20px; background: #f8f9fa; border-radius: 5px;">
+        <h3>🔬 Profilowanie cykli:</h3>
+        <form method="POST" action="/profile">
+            <input type="number" name="cycles" value="1" min="1" max="20">
+            <button type="submit">🔬 Profiluj kolejne cykle</button>
+        </form>
+        {% if profiler.remaining %}<p>⏳ Pozostało cykli do sprofilowania: {{ profiler.remaining }}{% if profiler.active %} (trwa){% endif %}</p>{% endif %}
+        {% set report = profiler.last_report %}
+        {% if report %}
+            <p>📄 <strong>Ostatni raport:</strong> {{ report.finished_at }} • cykle {{ report.cycle_seconds|join('s, ') }}s • {{ report.samples }} próbek co {{ report.interval_ms }} ms
+            {% if report.files %}• <a href="/profile/download/{{ report.files.report }}">raport JSON</a> • <a href="/profile/download/{{ report.files.folded }}">stosy (folded)</a>{% endif %}</p>
+            <p>{% for kind, span in report.spans.items() %}⏱️ <strong>{{ kind }}:</strong> {{ span.count }} str., łącznie {{ span.total_s }}s, max {{ span.max_s }}s &nbsp; {% endfor %}</p>
+            <table style="width: 100%; font-size: 13px;">
+                <tr><th align="left">Funkcja</th><th>Własny %</th><th>Łączny %</th></tr>
+                {% for row in report.top %}
+                <tr><td><code>{{ row.function }}</code></td><td align="center">{{ row.self_pct }}</td><td align="center">{{ row.total_pct }}</td></tr>
+                {% endfor %}
+            </table>
+        {% endif %}
+    </div>
 </body>
 </html>
 """
 
+def render_dashboard(message=None):
+    """Renderuje panel z bieżącym stanem (w trybie lidera - z migawki skanera)"""
+    sync_shared_config()
+    status = current_status()
+    return render_template_string(HTML_TEMPLATE, config=CONFIG, price_ranges=effective_price_ranges(CONFIG), message=message,
+                                  profiles=search_profiles, main_profile=MAIN_PROFILE_NAME, DISCORD_WEBHOOK=DISCORD_WEBHOOK,
+                                  **status)
+
 @app.route('/')
 def dashboard():
-    with monitor_state.lock:
-        last_found = monitor_state.last_found_time.strftime('%Y-%m-%d %H:%M:%S')
-        seen_ads_count = len(seen_ads)
-    return render_template_string(HTML_TEMPLATE, config=CONFIG, price_ranges=IPHONE_PRICE_RANGES, seen_ads_count=seen_ads_count, last_found_time=last_found, DISCORD_WEBHOOK=DISCORD_WEBHOOK)
+    return render_dashboard()
 
 @app.route('/config', methods=['POST'])
 def update_config():
     """Aktualizuje konfigurację przez formularz web"""
-    global CONFIG
+    warnings = []
     try:
+        sync_shared_config()
         with config_lock:
-            CONFIG['active_models'] = request.form.getlist('active_models') or []
+            config = dict(CONFIG)
+            config['active_models'] = request.form.getlist('active_models') or []
             keywords = request.form.get('keywords', '')
-            CONFIG['keywords'] = [k.strip() for k in keywords.split(',') if k.strip()]
+            config['keywords'] = [k.strip() for k in keywords.split(',') if k.strip()]
             blocked = request.form.get('blocked_keywords', '')
-            CONFIG['blocked_keywords'] = [k.strip() for k in blocked.split(',') if k.strip()]
+            config['blocked_keywords'] = [k.strip() for k in blocked.split(',') if k.strip()]
             # max_pages z walidacją
             try:
-                mp = int(request.form.get('max_pages', CONFIG.get('max_pages', 50)))
-                CONFIG['max_pages'] = max(1, min(mp, 100))
+                mp = int(request.form.get('max_pages', config.get('max_pages', 50)))
+                config['max_pages'] = max(1, min(mp, 100))
+            except ValueError:
+                config['max_pages'] = config.get('max_pages', 50)
+            config['incremental_crawl'] = 'incremental_crawl' in request.form
+            try:
+                config['stop_after_seen_pages'] = max(1, min(int(request.form.get('stop_after_seen_pages', config.get('stop_after_seen_pages', 2))), 100))
+                config['deep_scan_every'] = max(1, min(int(request.form.get('deep_scan_every', config.get('deep_scan_every', 10))), 1000))
+            except ValueError:
+                pass
+            config['include_damaged'] = 'include_damaged' in request.form
+            config['ignore_age_limit'] = 'ignore_age_limit' in request.form
+            config['auto_price_ranges'] = 'auto_price_ranges' in request.form
+            config['enrich_details'] = 'enrich_details' in request.form
+            if request.form.get('repost_mode') in ('tag', 'suppress', 'off'):
+                config['repost_mode'] = request.form['repost_mode']
+            # min_deal_score z walidacją - błędna wartość nie odrzuca reszty formularza
+            min_score = request.form.get('min_deal_score', '').strip().replace(',', '.')
+            try:
+                score = float(min_score) if min_score else None
+                if score is not None and not math.isfinite(score):
+                    raise ValueError(min_score)
+                config['min_deal_score'] = score
             except ValueError:
-                CONFIG['max_pages'] = CONFIG.get('max_pages', 50)
-            CONFIG['include_damaged'] = 'include_damaged' in request.form
-            CONFIG['ignore_age_limit'] = 'ignore_age_limit' in request.form
-            CONFIG['active'] = 'active' in request.form
-        message = "✅ Konfiguracja zapisana!"
+                warnings.append(f"⚠️ Minimalny wynik okazji „{min_score}” nie jest liczbą - pozostawiono {config.get('min_deal_score')}")
+            config['active'] = 'active' in request.form
+            apply_config(config)
+            publish_config()
+        message = " ".join(["✅ Konfiguracja zapisana!"] + warnings)
         logging.info(f"🔧 Zaktualizowano konfigurację - modele: {len(CONFIG['active_models'])}")
     except Exception as e:
         message = f"❌ Błąd: {e}"
         logging.error(message)
-    with monitor_state.lock:
-        last_found = monitor_state.last_found_time.strftime('%Y-%m-%d %H:%M:%S')
-        seen_ads_count = len(seen_ads)
-    return render_template_string(HTML_TEMPLATE, config=CONFIG, price_ranges=IPHONE_PRICE_RANGES, message=message, seen_ads_count=seen_ads_count, last_found_time=last_found, DISCORD_WEBHOOK=DISCORD_WEBHOOK)
+    return render_dashboard(message)
+
+@app.route('/profiles', methods=['POST'])
+def update_profiles():
+    """Dodaje, nadpisuje (po nazwie) lub usuwa profil wyszukiwania"""
+    try:
+        name = request.form.get('name', '').strip()
+        if not name or name == MAIN_PROFILE_NAME:
+            raise ValueError("podaj unikalną nazwę profilu")
+        sync_shared_config()
+        with config_lock:
+            config = dict(CONFIG)
+            profiles = [p for p in config.get('profiles', []) if p.get('name') != name]
+            if request.form.get('action') == 'delete':
+                message = f"🗑️ Usunięto profil {name}"
+            else:
+                url = request.form.get('url', '').strip()
+                if not url.startswith('http'):
+                    raise ValueError("podaj pełny adres wyszukiwania OLX")
+                profile = {
+                    'name': name,
+                    'url': url,
+                    'max_pages': max(1, min(int(request.form.get('max_pages') or config.get('max_pages', 50)), 100)),
+                    'active': 'active' in request.form,
+                    'active_models': [m.strip() for m in request.form.get('active_models', '').split(',') if m.strip() in IPHONE_PRICE_RANGES],
+                    'keywords': [k.strip() for k in request.form.get('keywords', '').split(',') if k.strip()],
+                    'blocked_keywords': [k.strip() for k in request.form.get('blocked_keywords', '').split(',') if k.strip()],
+                }
+                profiles.append(profile)
+                message = f"✅ Zapisano profil {name}"
+            config['profiles'] = profiles
+            apply_config(config)
+            publish_config()
+        logging.info(f"🔧 Profile wyszukiwania: {len(search_profiles)} ({message})")
+    except Exception as e:
+        message = f"❌ Błąd: {e}"
+        logging.error(message)
+    return render_dashboard(message)
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Metryki w formacie tekstowym Prometheusa (w trybie lidera - opublikowane przez skaner)"""
+    text = metrics.render()
+    if shared_state is not None and not leader_lock.held:
+        text = shared_state.get('metrics')[0] or text
+    return Response(text, mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/prices', methods=['POST'])
+def update_prices():
+    """Stosuje zakresy z indeksu rynkowego albo przywraca cennik bazowy"""
+    try:
+        if request.form.get('action') == 'reset':
+            sync_shared_config()
+            with config_lock:
+                apply_config(dict(CONFIG, price_overrides={}))
+                publish_config()
+            message = "↩️ Przywrócono cennik bazowy"
+        elif shared_state is not None and not leader_lock.held:
+            shared_state.put('price_request', {'action': 'apply'})  # indeks ma tylko lider
+            message = "🎯 Zlecono zastosowanie zakresów skanerowi"
+        else:
+            message = f"🎯 Zaktualizowano zakresy dla {apply_price_suggestions()} modeli"
+    except Exception as e:
+        message = f"❌ Błąd: {e}"
+        logging.error(message)
+    return render_dashboard(message)
+
+@app.route('/profile', methods=['POST'])
+def start_profiling():
+    """Włącza profiler na kolejne N cykli skanu"""
+    try:
+        cycles = max(1, min(int(request.form.get('cycles', 1)), 20))
+        if shared_state is not None and not leader_lock.held:
+            shared_state.put('profile_request', {'cycles': cycles})  # wykona lider przy najbliższym odświeżeniu
+        else:
+            cycle_profiler.arm(cycles)
+        message = f"🔬 Profilowanie kolejnych {cycles} cykli włączone"
+    except ValueError:
+        message = "❌ Błąd: podaj liczbę cykli"
+    return render_dashboard(message)
+
+@app.route('/profile/download/<name>')
+def download_profile(name):
+    """Pobranie pliku raportu profilowania"""
+    if not re.fullmatch(r'profile_\d{8}_\d{6}\.(json|folded)', name):
+        abort(404)
+    return send_from_directory(os.path.abspath(PROFILE_DIR), name, as_attachment=True)
+
+@app.route('/archive/page')
+def archived_page():
+    """Surowy HTML zarchiwizowanej strony: ?url=<adres strony wyników>[&before=<unix ts>] (najnowszy zapis)"""
+    if not page_archive.enabled:
+        abort(404)
+    try:
+        before = float(request.args['before']) if request.args.get('before') else None
+    except ValueError:
+        abort(400)
+    entry = page_archive.find(request.args.get('url', ''), before)
+    if entry is None:
+        abort(404)
+    # text/plain - podgląd źródła bez wykonywania skryptów OLX
+    return Response(page_archive.read(entry), mimetype='text/plain; charset=utf-8',
+                    headers={'X-Archived-At': datetime.fromtimestamp(entry['ts']).strftime('%Y-%m-%d %H:%M:%S')})
 
 # ========== URUCHOMIENIE ==========
 def start_monitoring():
-    """Uruchamia wątek monitorujący"""
+    """Uruchamia wątek monitorujący (w trybie lidera - wybory, skanuje tylko jeden proces)"""
+    if SCANNER_MODE == 'leader':
+        if shared_state is None:
+            logging.error("❌ Tryb lidera wymaga fcntl (POSIX) - uruchamiam pojedynczy skaner")
+        else:
+            Thread(target=leader_loop, name='leader', daemon=True).start()
+            logging.info(f"🗳️ Proces {os.getpid()} dołączył do wyborów skanera")
+            return
     monitor_thread = Thread(target=monitoring_loop)
     monitor_thread.daemon = True
     monitor_thread.start()
     logging.info("🟢 Wątek monitorowania uruchomiony")
 
 if __name__ == '__main__':
-    load_seen_ads()
+    if SCANNER_MODE != 'leader':
+        load_seen_ads()
     start_monitoring()
     port = int(os.getenv('PORT', 10000))
     logging.info(f"🌐 Serwer web uruchomiony na porcie {port}")
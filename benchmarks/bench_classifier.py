@@ -0,0 +1,91 @@
+"""Mikro-benchmark: ModelClassifier vs. dawna kaskada regexów w extract_model_and_variant.
+
+Uruchomienie (z katalogu repozytorium):
+    python benchmarks/bench_classifier.py
+"""
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+TITLES = [
+    "iPhone 13 Pro Max 256GB stan idealny",
+    "IPHONE15PROMAX 512",
+    "Apple iPhone 11, 64GB, czarny",
+    "iPhone 12 mini - bateria 88%",
+    "iPhone 14 Plus 128 GB",
+    "iPhone 16e nowy",
+    "iPhone SE 2022 64GB",
+    "iPhone 17 Air 256",
+    "Etui na iPhone",
+    "iphone 15 ProMax tytan",
+    "Samsung Galaxy S23",
+    "iPhone 13 Promocja!",
+]
+
+
+def legacy_extract_model_and_variant(title):
+    """Kopia kaskady regexów sprzed ModelClassifier (punkt odniesienia)."""
+    if not title:
+        return None
+    norm = re.sub(r'[^A-Za-z0-9\s]', ' ', title).lower()
+    norm = re.sub(r'\s+', ' ', norm).strip()
+    m = re.search(r'iphone\s*(\d+)\s*(pro\s*max|promax|promax|pro max)\b', norm)
+    if m:
+        candidate = f"{m.group(1)} pro max"
+    else:
+        m = re.search(r'iphone\s*(\d+)\s*(pro)\b', norm)
+        if m:
+            candidate = f"{m.group(1)} pro"
+        else:
+            m = re.search(r'iphone\s*(\d+)\s*(mini)\b', norm)
+            if m:
+                candidate = f"{m.group(1)} mini"
+            else:
+                m = re.search(r'iphone\s*(\d+)\s*(plus)\b', norm)
+                if m:
+                    candidate = f"{m.group(1)} plus"
+                else:
+                    m = re.search(r'iphone\s*(\d+)\b', norm)
+                    if m:
+                        candidate = f"{m.group(1)}"
+                    else:
+                        return None
+    candidate = candidate.strip()
+    for key in app.IPHONE_PRICE_RANGES.keys():
+        if key.lower() == candidate:
+            return key
+    for key in app.IPHONE_PRICE_RANGES.keys():
+        if key.lower().startswith(candidate):
+            return key
+    return None
+
+
+def main(number=2000):
+    titles = TITLES * 4  # ~strona wyników, tytuły się powtarzają
+    uncached = app.ModelClassifier(app.IPHONE_PRICE_RANGES, cache_size=0)
+    cached = app.ModelClassifier(app.IPHONE_PRICE_RANGES)
+    results = {
+        "legacy (kaskada)": timeit.timeit(lambda: [legacy_extract_model_and_variant(t) for t in titles], number=number),
+        "classifier bez cache": timeit.timeit(lambda: [uncached.classify(t) for t in titles], number=number),
+        "classifier + LRU": timeit.timeit(lambda: [cached.classify(t) for t in titles], number=number),
+        "classify_many + LRU": timeit.timeit(lambda: cached.classify_many(titles), number=number),
+    }
+    base = results["legacy (kaskada)"]
+    per_call = number * len(titles)
+    print(f"{'wariant':<24}{'µs/tytuł':>10}{'przyspieszenie':>16}")
+    for name, total in results.items():
+        print(f"{name:<24}{total / per_call * 1e6:>10.2f}{base / total:>15.1f}x")
+    print("\nRóżnice w klasyfikacji (legacy -> classifier):")
+    for t in TITLES:
+        old, new = legacy_extract_model_and_variant(t), cached.classify(t)
+        if old != new:
+            print(f"  {t!r}: {old} -> {new}")
+
+
+if __name__ == '__main__':
+    main()
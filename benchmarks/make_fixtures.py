@@ -0,0 +1,126 @@
+"""Generuje syntetyczne strony wyników OLX do benchmarków (deterministycznie, bez sieci).
+
+Służą tylko do skalowania liczby stron w skanie end-to-end - parser, regexy cen i skrót regionu ofert
+mierzone są na zapisanych stronach OLX w `fixtures/saved/` (zob. benchmarks/README.md).
+Strony odwzorowują układ listy OLX: karty `data-cy="l-card"` z ceną (`data-testid="ad-price"`),
+lokalizacją/datą (`data-testid="location-date"`), wyróżnionymi ofertami oraz osadzonym
+stanem `window.__PRERENDERED_STATE__`. Warianty `*_dom.html` nie mają stanu JSON
+(ścieżka heurystyczna), `empty.html` to pusta lista.
+
+Uruchomienie:
+    python benchmarks/make_fixtures.py
+"""
+import json
+import os
+import random
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+ADS_PER_PAGE = 40
+PAGES = 4
+TITLES = [
+    "iPhone {m} 128GB stan bardzo dobry",
+    "Apple iPhone {m} 256 GB, bateria 89%",
+    "IPHONE {m} - zadbany, komplet",
+    "iPhone {m} 64GB uszkodzony ekran",
+    "Sprzedam iPhone {m} / zamiana",
+    "Etui + szkło do iPhone {m}",
+]
+MODELS = ["11", "11 Pro", "12", "12 mini", "13", "13 Pro", "13 Pro Max", "14", "14 Plus", "14 Pro Max",
+          "15", "15 Pro", "15 Pro Max", "16", "16 Pro", "16e", "SE", "17 Air", "15promax"]
+CITIES = [("Warszawa", "Mokotów"), ("Kraków", "Podgórze"), ("Gdańsk", ""), ("Poznań", "Jeżyce"), ("Wrocław", "")]
+TIMES = ["Dzisiaj o 12:{m:02d}", "Wczoraj o 18:{m:02d}", "{d} października 2026"]
+BASE62 = '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+
+def base62(n):
+    out = ''
+    while n:
+        n, r = divmod(n, 62)
+        out = BASE62[r] + out
+    return out or '0'
+
+
+def make_ads(page):
+    rnd = random.Random(page)
+    ads = []
+    for i in range(ADS_PER_PAGE):
+        model = rnd.choice(MODELS)
+        ad_id = 880000000 + page * 1000 + i
+        city, district = rnd.choice(CITIES)
+        ads.append({
+            'id': ad_id,
+            'title': rnd.choice(TITLES).format(m=model),
+            'price': rnd.randrange(150, 5200, 10),
+            'slug': f"iphone-{model.replace(' ', '-').lower()}-CID99-ID{base62(ad_id)}.html",
+            'city': city,
+            'district': district,
+            'time': rnd.choice(TIMES).format(m=rnd.randrange(60), d=rnd.randrange(1, 17)),
+            'promoted': i < 3,
+        })
+    return ads
+
+
+def render_card(ad):
+    href = f"/d/oferta/{ad['slug']}"
+    if ad['promoted']:
+        href += "?reason=extended_search_promoted_ads"
+    location = f"{ad['city']}, {ad['district']}" if ad['district'] else ad['city']
+    price = f"{ad['price']:,}".replace(',', ' ')
+    promoted = '<div class="css-1jh69qu"><div class="css-1hkkp5n">Wyróżnione</div></div>' if ad['promoted'] else ''
+    return (
+        f'<div data-cy="l-card" data-testid="l-card" data-visually-ready-trigger-element="true" id="{ad["id"]}" class="css-1sw7q4x">'
+        f'<div class="css-1apmciz"><div type="list" class="css-1ut25fa">'
+        f'<a class="css-z3gu2d" href="{href}"><div class="css-gl6djm"><div type="list" class="css-1bmvjcs">'
+        f'<img src="https://ireland.apollo.olxcdn.com:443/v1/files/{ad["id"]}-PL/image;s=216x152;q=50" srcset="" alt="{ad["title"]}" class="css-8wsg1m"></div></div></a></div>'
+        f'<div type="list" class="css-u2ayx9"><div data-cy="ad-card-title" class="css-1uwwzvz">'
+        f'<a class="css-z3gu2d" href="{href}"><h6 class="css-1wxaaza">{ad["title"]}</h6></a>'
+        f'<p data-testid="ad-price" class="css-tyui9s">{price} zł<span class="css-1c0ed4l">do negocjacji</span></p></div>'
+        f'<div class="css-odp1qd"><p data-testid="location-date" class="css-1mwdrlh">{location} - {ad["time"]}</p></div></div>'
+        f'{promoted}</div></div>'
+    )
+
+
+def render_state(ads):
+    state = {"listing": {"listing": {"pageNumber": 1, "totalPages": 25, "ads": [{
+        "id": ad['id'],
+        "title": ad['title'],
+        "url": f"https://www.olx.pl/d/oferta/{ad['slug']}",
+        "isPromoted": ad['promoted'],
+        "price": {"regularPrice": {"value": ad['price'], "currencyCode": "PLN", "negotiable": True},
+                  "displayValue": f"{ad['price']} zł"},
+        "createdTime": "2026-10-%02dT%02d:%02d:00+02:00" % (1 + ad['id'] % 16, ad['id'] % 24, ad['id'] % 60),
+        "lastRefreshTime": "2026-10-16T10:00:00+02:00",
+        "location": {"cityName": ad['city'], "districtName": ad['district'] or None, "regionName": "Polska"},
+        "photos": [f"https://ireland.apollo.olxcdn.com:443/v1/files/{ad['id']}-PL/image;s={{width}}x{{height}}"],
+        "params": [{"key": "state", "name": "Stan", "normalizedValue": "used", "value": "Używane"}],
+    } for ad in ads]}}}
+    return json.dumps(json.dumps(state, ensure_ascii=False), ensure_ascii=False)
+
+
+def render_page(ads, with_state=True):
+    cards = ''.join(render_card(ad) for ad in ads)
+    state = f'<script>window.__PRERENDERED_STATE__= {render_state(ads)};\nwindow.__TAURUS__ = {{}};</script>' if with_state else ''
+    return (
+        '<!DOCTYPE html><html lang="pl"><head><meta charset="utf-8"><title>Iphone - Telefony - OLX.pl</title></head><body>'
+        '<header><a href="/mojolx/">Moje OLX</a><a href="/d/nowe-ogloszenie/">Dodaj ogłoszenie</a></header>'
+        '<div data-testid="listing-grid" class="css-j0t2x2">' + cards + '</div>'
+        '<section data-testid="pagination"><a href="?page=2">2</a></section>'
+        + state + '</body></html>'
+    )
+
+
+def main():
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    for page in range(1, PAGES + 1):
+        ads = make_ads(page)
+        with open(os.path.join(FIXTURES_DIR, f'listing_{page:02d}.html'), 'w', encoding='utf-8') as f:
+            f.write(render_page(ads))
+        with open(os.path.join(FIXTURES_DIR, f'listing_{page:02d}_dom.html'), 'w', encoding='utf-8') as f:
+            f.write(render_page(ads, with_state=False))
+    with open(os.path.join(FIXTURES_DIR, 'empty.html'), 'w', encoding='utf-8') as f:
+        f.write(render_page([], with_state=False))
+    print(f"✅ Zapisano {PAGES * 2 + 1} stron w {FIXTURES_DIR}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""Benchmarki offline: mikro-benchmarki funkcji parsujących/filtrujących i skan end-to-end
+na lokalnej atrapie OLX + Discord (benchmarks/stub_server.py). Nie wymaga sieci.
+
+Uruchomienie (z katalogu repozytorium):
+    python benchmarks/run.py               # wszystko
+    python benchmarks/run.py --micro       # tylko mikro-benchmarki
+    python benchmarks/run.py --e2e --pages 30 --latency 0.05
+"""
+import argparse
+import glob
+import logging
+import os
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_server import FIXTURES_DIR, StubServer  # noqa: E402
+
+WORKDIR = tempfile.mkdtemp(prefix='olx-bench-')
+STUB = StubServer(errors={7: 500, 9: 429}, webhook_429_every=7).start()
+# przed importem app: własne pliki stanu, atrapa webhooka, brak limitu tempa (mierzymy kod, nie uprzejmość)
+os.environ.setdefault('SEEN_ADS_DB', os.path.join(WORKDIR, 'seen_ads.db'))
+os.environ.setdefault('SEEN_ADS_FILE', os.path.join(WORKDIR, 'seen_ads.json'))
+os.environ.setdefault('SCHEDULER_FILE', os.path.join(WORKDIR, 'scheduler_stats.json'))
+os.environ['DISCORD_WEBHOOK'] = STUB.webhook_url
+os.environ['SCANNER_MODE'] = 'single'  # wymuszone - benchmark nie może dołączyć do wyborów skanera
+os.environ.setdefault('MAX_REQUESTS_PER_SECOND', '0')
+os.environ.setdefault('FETCH_RETRIES', '0')
+os.environ.setdefault('FETCH_BACKOFF_BASE', '0')  # Retry-After atrapy (1 s) nadal wstrzymuje pobieranie
+
+import app  # noqa: E402
+
+PRICE_SAMPLES = ["1 299 zł", "2\xa0450,50 zł do negocjacji", "850 PLN", "Zamienię", "3.100 zł"]
+TITLE_SAMPLES = ["iPhone 13 Pro Max 256GB stan idealny", "Apple iPhone 11, 64GB", "IPHONE15PROMAX", "Etui iPhone",
+                 "iPhone 16e nowy", "Samsung S23"]
+
+
+def load_fixtures(pattern):
+    return [open(p, encoding='utf-8').read() for p in sorted(glob.glob(os.path.join(FIXTURES_DIR, pattern)))]
+
+
+def run_saved(number):
+    """Zapisane (oczyszczone) strony OLX - prawdziwy układ, którego generator nie odwzorowuje"""
+    listings = load_fixtures('saved/listing_*.html')
+    details = load_fixtures('saved/detail_*.html')
+    if not listings and not details:
+        print("  ⚠️ Brak zapisanych stron w benchmarks/fixtures/saved - wyniki tylko dla stron syntetycznych")
+        return
+
+    def parse_all():
+        app.seen_ads = fresh_seen_store()
+        for html in listings:
+            app.parse_olx_page(html)
+
+    if listings:
+        bench(f"parse_olx_page (zapisane OLX, {len(listings)})", parse_all, max(1, number // 5), len(listings), 'strona')
+        bench("listing_digest (zapisane OLX)", lambda: [app.listing_digest(h) for h in listings], number, len(listings), 'strona')
+    if details:
+        bench(f"parse_detail_page (zapisane OLX, {len(details)})", lambda: [app.parse_detail_page(h) for h in details],
+              max(1, number // 5), len(details), 'strona')
+
+
+def fresh_seen_store():
+    """Pusty, nieotwarty magazyn - każde ogłoszenie jest nowe, bez dysku"""
+    return app.SeenAdsStore(':memory:', app.SEEN_ADS_TTL_DAYS, app.SEEN_ADS_CACHE_SIZE)
+
+
+def bench(name, func, number, per_call_items=1, unit='wywołanie'):
+    total = timeit.timeit(func, number=number)
+    per = total / (number * per_call_items)
+    print(f"  {name:<44}{per * 1e6:>12.1f} µs/{unit}")
+    return per
+
+
+def run_micro(number):
+    print("🔬 Mikro-benchmarki")
+    json_pages = load_fixtures('listing_??.html')
+    dom_pages = load_fixtures('listing_??_dom.html')
+
+    def parse_all(pages):
+        app.seen_ads = fresh_seen_store()
+        for html in pages:
+            app.parse_olx_page(html)
+
+    bench("parse_olx_page (JSON stanu)", lambda: parse_all(json_pages), number, len(json_pages), 'strona')
+    bench("parse_olx_page (heurystyka DOM)", lambda: parse_all(dom_pages), max(1, number // 5), len(dom_pages), 'strona')
+    bench("extract_state_cards", lambda: [app.extract_state_cards(h) for h in json_pages], number, len(json_pages), 'strona')
+    bench("extract_listing_cards (+BeautifulSoup/lxml)",
+          lambda: [app.extract_listing_cards(app.BeautifulSoup(h, app.HTML_PARSER)) for h in dom_pages],
+          max(1, number // 5), len(dom_pages), 'strona')
+    bench("extract_price", lambda: [app.extract_price(p) for p in PRICE_SAMPLES], number * 50, len(PRICE_SAMPLES), 'cena')
+
+    def classify_cold():
+        app.model_classifier.classify.cache_clear()
+        return [app.extract_model_and_variant(t) for t in TITLE_SAMPLES]
+
+    bench("extract_model_and_variant (zimny cache)", classify_cold, number * 50, len(TITLE_SAMPLES), 'tytuł')
+    bench("extract_model_and_variant (ciepły cache)", lambda: [app.extract_model_and_variant(t) for t in TITLE_SAMPLES],
+          number * 50, len(TITLE_SAMPLES), 'tytuł')
+    samples = [(t, 900, app.extract_model_and_variant(t)) for t in TITLE_SAMPLES]
+    bench("check_filters", lambda: [app.check_filters(t, p, m) for t, p, m in samples], number * 50, len(samples), 'ogłoszenie')
+    run_saved(number)
+
+
+def run_e2e(pages, latency, workers):
+    print(f"\n🏁 Skan end-to-end: {pages} stron, opóźnienie atrapy {latency * 1000:.0f} ms, {workers} wątków")
+    STUB.latency = latency
+    app.FETCH_WORKERS = workers
+    app.seen_ads = fresh_seen_store()
+    config = dict(app.CONFIG, url=STUB.listing_url, max_pages=pages, incremental_crawl=False, profiles=[],
+                  active_models=list(app.IPHONE_PRICE_RANGES), include_damaged=True, ignore_age_limit=True, active=True)
+    app.apply_config(config)
+    app.monitor_state = app.MonitorState()
+    app.crawled_links.clear()
+    hits_before = STUB.stats['listing_hits']
+    tracemalloc.start()
+    started = time.perf_counter()
+    found, delivered = app.run_scan_cycle()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    snapshot = app.monitor_state.snapshot
+    stats = snapshot.profile_stats[app.MAIN_PROFILE_NAME]
+    print(f"  czas:                 {elapsed:.2f} s")
+    print(f"  strony/s:             {stats['pages'] / elapsed:.1f} ({STUB.stats['listing_hits'] - hits_before} żądań, błędy: {STUB.stats['errors_served']})")
+    print(f"  ogłoszenia/s:         {stats['candidates'] / elapsed:.1f} (sparsowane karty)")
+    print(f"  dopasowania:          {found}, dostarczone na atrapę Discorda: {delivered} (429: {STUB.stats['webhook_429']})")
+    print(f"  pierwszy alert po:    {snapshot.last_first_alert_s or 0:.2f} s")
+    print(f"  szczyt pamięci:       {peak / 1024 / 1024:.1f} MiB (tracemalloc)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--micro', action='store_true', help='tylko mikro-benchmarki')
+    parser.add_argument('--e2e', action='store_true', help='tylko skan end-to-end')
+    parser.add_argument('--number', type=int, default=20, help='liczba powtórzeń mikro-benchmarków')
+    parser.add_argument('--pages', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.02, help='opóźnienie odpowiedzi atrapy OLX (s)')
+    parser.add_argument('--workers', type=int, default=app.FETCH_WORKERS)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    try:
+        if not args.e2e:
+            run_micro(args.number)
+        if not args.micro:
+            run_e2e(args.pages, args.latency, args.workers)
+    finally:
+        STUB.stop()
+
+
+if __name__ == '__main__':
+    main()
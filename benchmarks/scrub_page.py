@@ -0,0 +1,95 @@
+"""Usuwa dane osobowe z zapisanej strony OLX (lista wyników albo /oferta/) przed dodaniem jej do korpusu.
+
+- JSON stanu (`window.__PRERENDERED_STATE__`): `user` zastąpiony stałym pseudonimem ID (ten sam sprzedawca
+  zostaje tym samym sprzedawcą - ważne dla wykrywania repostów), usunięte `contact`, `phone`, `email`, `map`
+- cała strona: adresy e-mail i numery telefonów (+48 albo grupy 3-3-3) zastąpione atrapami
+- elementy z nazwą sprzedawcy (`data-testid` z "user-name"/"seller-name") dostają nazwę zastępczą
+
+Znaczniki, klasy i skrypty zostają bez zmian - korpus ma mierzyć parser na prawdziwym układzie OLX.
+
+Uruchomienie (z katalogu repozytorium):
+    python benchmarks/scrub_page.py zapisana.html                 # -> benchmarks/fixtures/saved/zapisana.html
+    python benchmarks/scrub_page.py zapisana.html wynik.html
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ['SCANNER_MODE'] = 'single'  # wymuszone - import app nie może dołączyć do wyborów skanera
+
+import app  # noqa: E402
+
+SAVED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'saved')
+DROPPED_KEYS = {'contact', 'phone', 'phones', 'email', 'map'}
+EMAIL_RE = re.compile(r'[\w.+-]+@[\w-]+\.[\w.-]+')
+PHONE_RE = re.compile(r'(?<![\w/])(?:\+48[\s-]?\d{3}[\s-]?\d{3}[\s-]?\d{3}|\d{3}[\s-]\d{3}[\s-]\d{3})(?![\w/])')
+SELLER_NAME_RE = re.compile(r'(data-testid="[^"]*(?:user-name|seller-name)[^"]*"[^>]*>)([^<]*)')
+
+
+def pseudonym(value):
+    return int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=4).digest(), 'big')
+
+
+def scrub_state(node):
+    """Rekurencyjnie czyści JSON stanu; zwraca oczyszczoną kopię"""
+    if isinstance(node, list):
+        return [scrub_state(item) for item in node]
+    if not isinstance(node, dict):
+        return node
+    scrubbed = {}
+    for key, value in node.items():
+        if key in DROPPED_KEYS:
+            continue
+        if key == 'user' and isinstance(value, dict):
+            scrubbed[key] = {'id': pseudonym(value.get('id')), 'name': 'Sprzedawca'}
+            if 'isBusiness' in value:
+                scrubbed[key]['isBusiness'] = value['isBusiness']
+            continue
+        scrubbed[key] = scrub_state(value)
+    return scrubbed
+
+
+def replace_state(html):
+    """Podmienia JSON stanu na oczyszczony, w tej samej postaci (obiekt albo string JSON w literale JS)"""
+    pos = html.find(app.PRERENDERED_STATE_MARKER)
+    if pos < 0:
+        return html
+    start = html.find('=', pos + len(app.PRERENDERED_STATE_MARKER)) + 1
+    while html[start:start + 1].isspace():
+        start += 1
+    state, end = json.JSONDecoder().raw_decode(html, start)
+    if isinstance(state, str):
+        encoded = json.dumps(json.dumps(scrub_state(json.loads(state)), ensure_ascii=False), ensure_ascii=False)
+    else:
+        encoded = json.dumps(scrub_state(state), ensure_ascii=False)
+    return html[:start] + encoded + html[end:]
+
+
+def scrub_page(html):
+    html = replace_state(html)
+    html = SELLER_NAME_RE.sub(lambda m: m.group(1) + 'Sprzedawca', html)
+    html = EMAIL_RE.sub('sprzedawca@example.com', html)
+    return PHONE_RE.sub('000 000 000', html)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('source', help='zapisana strona OLX (HTML)')
+    parser.add_argument('target', nargs='?', help=f'plik wynikowy (domyślnie {SAVED_DIR}/<nazwa>)')
+    args = parser.parse_args()
+    with open(args.source, 'r', encoding='utf-8') as f:
+        html = f.read()
+    target = args.target or os.path.join(SAVED_DIR, os.path.basename(args.source))
+    os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+    with open(target, 'w', encoding='utf-8') as f:
+        f.write(scrub_page(html))
+    print(f"✅ Zapisano oczyszczoną stronę: {target}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""Lokalny serwer-atrapa OLX i webhooka Discord do benchmarków (bez sieci).
+
+- GET  /<dowolna ścieżka>?page=N  -> strona z korpusu: najpierw zapisane strony OLX (`fixtures/saved/listing_*.html`),
+  potem syntetyczne (`fixtures/listing_01..04`), cyklicznie,
+  wybrane strony zwracają błędy (np. {7: 500, 9: 429}), strony > `last_page` są puste
+- POST /webhook                   -> atrapa Discorda: 204 + nagłówki X-RateLimit-*, co N-te żądanie 429
+
+Uruchomienie samodzielne:
+    python benchmarks/stub_server.py --port 8765
+"""
+import argparse
+import glob
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+class StubServer:
+    """Serwer w wątku tła; liczniki żądań dostępne w `stats`"""
+
+    def __init__(self, port=0, errors=None, last_page=50, latency=0.0, webhook_429_every=0, fixtures_dir=FIXTURES_DIR):
+        paths = sorted(glob.glob(os.path.join(fixtures_dir, 'saved', 'listing_*.html')))
+        paths += sorted(glob.glob(os.path.join(fixtures_dir, 'listing_??.html')))  # syntetyczne - tylko dla liczby stron
+        self.pages = [open(p, 'rb').read() for p in paths]
+        self.empty = open(os.path.join(fixtures_dir, 'empty.html'), 'rb').read()
+        self.errors = errors or {}
+        self.last_page = last_page
+        self.latency = latency
+        self.webhook_429_every = webhook_429_every
+        self.stats = {'listing_hits': 0, 'errors_served': 0, 'webhook_posts': 0, 'webhook_embeds': 0, 'webhook_429': 0}
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self.thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    @property
+    def listing_url(self):
+        return self.base_url + '/elektronika/telefony/q-iphone/'
+
+    @property
+    def webhook_url(self):
+        return self.base_url + '/webhook'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='stub-server', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _count(self, key, n=1):
+        with self.lock:
+            self.stats[key] += n
+            return self.stats[key]
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body=b'', headers=None):
+                self.send_response(status)
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                server._count('listing_hits')
+                if server.latency:
+                    time.sleep(server.latency)
+                query = parse_qs(urlparse(self.path).query)
+                page = int(query.get('page', ['1'])[0])
+                status = server.errors.get(page)
+                if status:
+                    server._count('errors_served')
+                    self._send(status, b'error', {'Content-Type': 'text/plain', 'Retry-After': '1'})
+                    return
+                body = server.empty if page > server.last_page else server.pages[(page - 1) % len(server.pages)]
+                self._send(200, body, {'Content-Type': 'text/html; charset=utf-8'})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                posts = server._count('webhook_posts')
+                if server.webhook_429_every and posts % server.webhook_429_every == 0:
+                    server._count('webhook_429')
+                    body = json.dumps({'message': 'You are being rate limited.', 'retry_after': 0.05}).encode()
+                    self._send(429, body, {'Content-Type': 'application/json'})
+                    return
+                server._count('webhook_embeds', len(payload.get('embeds', [])))
+                self._send(204, b'', {'X-RateLimit-Limit': '5', 'X-RateLimit-Remaining': str(4 - posts % 5),
+                                      'X-RateLimit-Reset-After': '0.05'})
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--last-page', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.05, help='sztuczne opóźnienie odpowiedzi (s)')
+    args = parser.parse_args()
+    server = StubServer(args.port, errors={7: 500, 9: 429}, last_page=args.last_page, latency=args.latency,
+                        webhook_429_every=7).start()
+    print(f"🌐 OLX: {server.listing_url}\n📨 Discord: {server.webhook_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,18 @@
+"""Konfiguracja gunicorna (wczytywana automatycznie z katalogu roboczego): gunicorn app:app
+
+Import app.py nie uruchamia żadnych wątków - monitoring startuje tutaj, po starcie workera.
+Przy SCANNER_MODE=leader każdy worker dołącza do wyborów skanera (skanuje dokładnie jeden),
+w trybie pojedynczym monitoring startuje tylko przy jednym workerze, żeby nie skanować kilka razy.
+"""
+import logging
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '10000')}"
+
+
+def post_worker_init(worker):
+    import app
+    if app.SCANNER_MODE == 'leader' or worker.cfg.workers == 1:
+        app.start_monitoring()
+    else:
+        logging.warning("⚠️ Kilka workerów bez SCANNER_MODE=leader - monitoring nie został uruchomiony")
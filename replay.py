@@ -0,0 +1,158 @@
+"""Powtórka offline: przepuszcza zarchiwizowane strony wyników OLX przez ten sam potok co bot
+(karty -> klasyfikacja modelu -> filtry, czyli match_cards/check_filters z app.py) i wypisuje
+oferty, które wywołałyby alert, oraz przepustowość. Strony rozdzielane są na pulę procesów.
+
+Etapy zależne od stanu bota (widziane ogłoszenia, historia cen i wynik okazji, reposty) są pomijane -
+wynik to "co przeszłoby filtry" przy podanej konfiguracji, a nie "co zostałoby wysłane".
+
+Źródłem może być katalog ze stronami (*.html / *.html.gz, rekurencyjnie) albo archiwum stron bota
+(PAGE_ARCHIVE_DIR - segmenty z indeksem; każdy proces czyta swoje strony przez mmap).
+
+Uruchomienie (z katalogu repozytorium):
+    python replay.py strony/                            # wszystkie *.html / *.html.gz rekurencyjnie
+    python replay.py page_archive/ --since 24           # archiwum bota, ostatnie 24 h
+    python replay.py strony/ --config config.json --output alerty.jsonl --workers 8
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+import sys
+import time
+import zlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+os.environ['SCANNER_MODE'] = 'single'  # wymuszone - powtórka (i każdy proces puli) nigdy nie dołącza do wyborów skanera
+
+import app  # noqa: E402
+
+PAGE_SUFFIXES = ('.html', '.htm', '.html.gz', '.htm.gz')
+
+
+def find_pages(root):
+    """Ścieżki zarchiwizowanych stron w katalogu (rekurencyjnie), w stałej kolejności"""
+    if os.path.isfile(root):
+        return [root]
+    pages = []
+    for dirpath, _, filenames in os.walk(root):
+        pages.extend(os.path.join(dirpath, name) for name in filenames if name.lower().endswith(PAGE_SUFFIXES))
+    return sorted(pages)
+
+
+def find_archived_pages(root, since_hours=None):
+    """Zadania dla stron z archiwum bota: (segment, offset, długość, etykieta) - bez czytania danych"""
+    archive = app.PageArchive(root, 0, 0)
+    since = time.time() - since_hours * 3600 if since_hours else None
+    return [(archive.segment_path(entry), entry['offset'], entry['length'],
+             f"{entry['url']} @ {datetime.fromtimestamp(entry['ts']):%Y-%m-%d %H:%M:%S}")
+            for entry in archive.entries(since)]
+
+
+def is_page_archive(root):
+    return os.path.isdir(root) and any(name.startswith('seg_') and name.endswith('.idx') for name in os.listdir(root))
+
+
+def read_page(path):
+    opener = gzip.open if path.lower().endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8', errors='replace') as f:
+        return f.read()
+
+
+def init_worker(config, log_level):
+    """Inicjalizacja procesu puli: ta sama konfiguracja i prekompilowany plan filtrów co w rodzicu"""
+    logging.getLogger().setLevel(log_level)
+    app.apply_config(config)
+
+
+def replay_page(task):
+    """Jedna strona (plik albo wpis archiwum) przez bezstanowy potok.
+    Zwraca (etykieta, źródło, liczba kart, [(ad_key, ad_data)], czas s)"""
+    started = time.perf_counter()
+    path = task[3] if isinstance(task, tuple) else task
+    try:
+        html = app.read_archived_page(*task[:3]) if isinstance(task, tuple) else read_page(task)
+    except (OSError, ValueError, zlib.error) as e:
+        logging.error(f"❌ Nie można odczytać {path}: {e}")
+        return path, 'error', 0, [], time.perf_counter() - started
+    cards, source = app.extract_page_cards(html)
+    models = app.model_classifier.classify_many([card['title'] for card in cards])
+    keys = [app.canonical_ad_id(card['link']) for card in cards]
+    matched, _ = app.match_cards(cards, keys, models, app.filter_plan)
+    alerts = [(ad_key, ad_data) for ad_key, _, ad_data in matched]
+    return path, source, len(cards), alerts, time.perf_counter() - started
+
+
+def load_config(path):
+    """CONFIG z app.py nadpisany kluczami z pliku JSON (ten sam format co zapis z panelu)"""
+    config = dict(app.CONFIG)
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            config.update(json.load(f))
+    return config
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path', help='katalog ze stronami, archiwum stron bota albo pojedynczy plik')
+    parser.add_argument('--since', type=float, help='archiwum bota: tylko strony z ostatnich N godzin')
+    parser.add_argument('--config', help='plik JSON z konfiguracją nadpisującą domyślny CONFIG')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='liczba procesów (domyślnie wszystkie rdzenie)')
+    parser.add_argument('--chunksize', type=int, default=4, help='stron na jedno zadanie puli')
+    parser.add_argument('--output', help='zapisz dopasowane oferty jako JSON Lines (domyślnie tylko podsumowanie)')
+    parser.add_argument('--keep-duplicates', action='store_true', help='nie łącz tej samej oferty z wielu stron')
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    archived = is_page_archive(args.path)
+    pages = find_archived_pages(args.path, args.since) if archived else find_pages(args.path)
+    if not pages:
+        print(f"⚠️ Brak stron HTML w {args.path}")
+        return 1
+    config = load_config(args.config)
+    workers = max(1, min(args.workers, len(pages)))
+    print(f"🔁 Powtórka{' archiwum' if archived else ''}: {len(pages)} stron, {workers} procesów")
+
+    alerts = {}
+    duplicates = 0
+    cards_total = 0
+    sources = Counter()
+    cpu_seconds = 0.0
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(config, logging.WARNING)) as executor:
+        for path, source, cards, matched, elapsed in executor.map(replay_page, pages, chunksize=args.chunksize):
+            sources[source] += 1
+            cards_total += cards
+            cpu_seconds += elapsed
+            for ad_key, ad_data in matched:
+                key = ad_key if not args.keep_duplicates else (ad_key, path)
+                if key in alerts:
+                    duplicates += 1
+                    continue
+                if not archived and os.path.isdir(args.path):
+                    path = os.path.relpath(path, args.path)
+                alerts[key] = dict(ad_data, source_page=path)
+    wall = time.perf_counter() - started
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            for ad_data in alerts.values():
+                f.write(json.dumps(ad_data, ensure_ascii=False) + '\n')
+
+    per_model = Counter(ad_data['model'] for ad_data in alerts.values())
+    print(f"  czas:                 {wall:.2f} s (suma w procesach {cpu_seconds:.2f} s)")
+    print(f"  strony/s:             {len(pages) / wall:.1f} ({', '.join(f'{k}: {v}' for k, v in sorted(sources.items()))})")
+    print(f"  karty/s:              {cards_total / wall:.1f} ({cards_total} kart)")
+    print(f"  alerty:               {len(alerts)} (powtórzenia między stronami: {duplicates})")
+    for model, count in per_model.most_common():
+        print(f"    {model:<24}{count:>6}")
+    if args.output:
+        print(f"💾 Zapisano {len(alerts)} ofert do {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""FetchController: zadziałanie bezpiecznika, schłodzenie, zapytanie próbne i spóźnione odpowiedzi"""
+import os
+import sys
+import time
+
+os.environ['SCANNER_MODE'] = 'single'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+import app  # noqa: E402
+
+COOLDOWN = 0.05
+
+
+def make_controller():
+    # bez limitu tempa i bez przerw - testy sprawdzają tylko stan bezpiecznika
+    return app.FetchController(0, 0, 1, 10, 0, 0, 3, COOLDOWN, 1)
+
+
+def trip(controller):
+    for _ in range(3):
+        assert controller.acquire() is False
+        controller.record(429, 0.1)
+    assert controller.state == 'open'
+
+
+def test_trips_after_failures_in_row():
+    controller = make_controller()
+    trip(controller)
+    with pytest.raises(app.CircuitOpenError):
+        controller.acquire()
+
+
+def test_single_probe_after_cooldown_closes_the_breaker():
+    controller = make_controller()
+    trip(controller)
+    time.sleep(COOLDOWN * 1.5)
+    assert controller.acquire() is True
+    assert controller.state == 'half-open'
+    with pytest.raises(app.CircuitOpenError):
+        controller.acquire()  # jedno zapytanie próbne naraz
+    controller.record(200, 0.1, probe=True)
+    assert controller.state == 'closed'
+    assert controller.acquire() is False
+
+
+def test_failed_probe_reopens_with_longer_cooldown():
+    controller = make_controller()
+    trip(controller)
+    time.sleep(COOLDOWN * 1.5)
+    probe = controller.acquire()
+    controller.record(503, 0.1, probe=probe)
+    assert controller.state == 'open'
+    assert controller.seconds_until_probe() > COOLDOWN * 1.5
+    assert controller.stats['trips'] == 2
+
+
+def test_late_success_does_not_close_open_or_half_open_breaker():
+    controller = make_controller()
+    trip(controller)
+    controller.record(200, 0.1)  # zapytanie wysłane przed zadziałaniem
+    assert controller.state == 'open'
+    with pytest.raises(app.CircuitOpenError):
+        controller.acquire()
+    time.sleep(COOLDOWN * 1.5)
+    probe = controller.acquire()
+    controller.record(200, 0.1)
+    assert controller.state == 'half-open'
+    controller.record(200, 0.1, probe=probe)
+    assert controller.state == 'closed'
+
+
+def test_late_failure_does_not_extend_open_breaker():
+    controller = make_controller()
+    trip(controller)
+    controller.record(429, 0.1)
+    assert controller.stats['trips'] == 1
+    assert controller.seconds_until_probe() <= COOLDOWN
@@ -0,0 +1,30 @@
+"""listing_region: skrót strony wyników obejmuje tylko oferty, nie nagłówek ani stopkę"""
+import os
+import sys
+
+os.environ['SCANNER_MODE'] = 'single'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+
+def card(n, price=800):
+    return (f'<div data-cy="l-card" data-testid="l-card" id="{n}"><div><a href="/d/oferta/iphone-13-CID99-ID{n}.html">'
+            f'<h6>iPhone 13 128GB</h6></a><p data-testid="ad-price">{price} zł</p></div></div>')
+
+
+def dom_page(cards, footer):
+    return (f'<html><body><div data-testid="listing-grid">{"".join(cards)}</div>'
+            f'<section data-testid="pagination"><a href="?page=2">2</a></section>'
+            f'<footer>{footer}</footer><script>window.dataLayer=[{{"pv":"{footer}"}}]</script></body></html>')
+
+
+def test_pages_differing_only_in_footer_have_the_same_digest():
+    cards = [card(n) for n in range(1, 4)]
+    assert app.listing_digest(dom_page(cards, 'a1b2')) == app.listing_digest(dom_page(cards, 'c3d4'))
+
+
+def test_change_in_last_card_changes_the_digest():
+    before = dom_page([card(1), card(2)], 'a1b2')
+    after = dom_page([card(1), card(2, price=750)], 'a1b2')
+    assert app.listing_digest(before) != app.listing_digest(after)
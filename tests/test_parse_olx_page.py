@@ -0,0 +1,68 @@
+"""Regresje parse_olx_page (uruchomienie: python -m pytest -q tests/)"""
+import json
+import os
+import sys
+import tempfile
+
+WORKDIR = tempfile.mkdtemp(prefix='olx-tests-')
+os.environ['SCANNER_MODE'] = 'single'
+os.environ['PRICE_HISTORY_DIR'] = os.path.join(WORKDIR, 'price_history')
+os.environ['REPOST_INDEX_FILE'] = os.path.join(WORKDIR, 'repost_index.json')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+import app  # noqa: E402
+
+AD_URL = 'https://www.olx.pl/d/oferta/iphone-13-128gb-CID99-IDabcXYZ.html'
+TITLE = 'iPhone 13 128GB stan bardzo dobry'
+
+
+def state_page(ads):
+    state = {'listing': {'listing': {'ads': ads}}}
+    return f"<html><body><script>window.__PRERENDERED_STATE__= {json.dumps(state)};</script></body></html>"
+
+
+def state_ad(url, promoted=False):
+    return {'id': 1, 'url': url, 'title': TITLE, 'price': {'regularPrice': {'value': 800}},
+            'location': {'cityName': 'Warszawa'}, 'photos': [], 'isPromoted': promoted}
+
+
+def dom_card(href):
+    return (f'<div data-cy="l-card" data-testid="l-card"><a href="{href}"><h6>{TITLE}</h6></a>'
+            f'<p data-testid="ad-price">800 zł</p>'
+            f'<p data-testid="location-date">Warszawa - Dzisiaj o 12:00</p></div>')
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    """Pusty magazyn widzianych i indeks repostów w pamięci, konfiguracja przepuszczająca iPhone 13 za 800 zł"""
+    monkeypatch.setattr(app, 'seen_ads', app.SeenAdsStore(':memory:', app.SEEN_ADS_TTL_DAYS, app.SEEN_ADS_CACHE_SIZE))
+    monkeypatch.setattr(app, 'repost_index', app.RepostIndex(os.path.join(WORKDIR, 'reposts.json'), app.REPOST_WINDOW_DAYS,
+                                                            app.REPOST_INDEX_SIZE, app.REPOST_SIMILARITY))
+    config = app.CONFIG
+    app.apply_config(dict(config, active_models=list(app.IPHONE_PRICE_RANGES), ignore_age_limit=True,
+                          keywords=[], min_deal_score=None, profiles=[]))
+    yield
+    app.apply_config(config)
+
+
+def test_same_ad_twice_on_json_page_alerts_once():
+    html = state_page([state_ad(AD_URL + '?reason=extended_search_promoted', promoted=True), state_ad(AD_URL)])
+    result = app.parse_olx_page(html)
+    assert result['source'] == 'json'
+    assert [ad['url'] for ad in result['ads']] == [AD_URL + '?reason=extended_search_promoted']
+
+
+def test_same_ad_twice_on_dom_page_alerts_once():
+    path = AD_URL.replace('https://www.olx.pl', '')
+    html = f"<html><body>{dom_card(path + '?reason=extended_search_promoted')}{dom_card(path)}</body></html>"
+    result = app.parse_olx_page(html)
+    assert result['source'] == 'dom'
+    assert len(result['ads']) == 1
+
+
+def test_seen_ad_is_not_alerted_again():
+    html = state_page([state_ad(AD_URL)])
+    assert len(app.parse_olx_page(html)['ads']) == 1
+    assert app.parse_olx_page(html)['ads'] == []
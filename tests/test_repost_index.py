@@ -0,0 +1,68 @@
+"""RepostIndex: repost wymaga tożsamości (sprzedawca, a bez niego zdjęcie), samo podobieństwo tytułu nie wystarcza"""
+import os
+import random
+import sys
+import tempfile
+
+os.environ['SCANNER_MODE'] = 'single'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+TITLE = 'iPhone 13 Pro 128GB stan bardzo dobry'
+
+
+def make_index():
+    return app.RepostIndex(os.path.join(tempfile.mkdtemp(prefix='olx-reposts-'), 'reposts.json'))
+
+
+def ad(n, price=1100, image=None, seller=None, title=TITLE):
+    return {'title': title, 'model': '13 Pro', 'price_value': price, 'location': 'Warszawa', 'url': f'u{n}',
+            'image': image if image is not None else f'https://ireland.apollo.olxcdn.com:443/v1/files/{n}-PL/image;s=640x480',
+            'seller_id': seller}
+
+
+def test_formulaic_titles_from_different_photos_are_not_reposts():
+    index = make_index()
+    rnd = random.Random(7)
+    hits = sum(index.check_and_add(n, ad(n, price=rnd.randint(1050, 1150))) is not None for n in range(200))
+    assert hits == 0
+
+
+def test_different_sellers_are_not_reposts():
+    index = make_index()
+    index.check_and_add(1, ad(1, image='', seller=10))
+    assert index.check_and_add(2, ad(2, image='', seller=11)) is None
+
+
+def test_same_seller_or_same_photo_is_a_repost():
+    index = make_index()
+    index.check_and_add(1, ad(1, image='', seller=10))
+    assert index.check_and_add(2, ad(2, image='', seller=10, title=TITLE + ' komplet'))['url'] == 'u1'
+    photo = 'https://ireland.apollo.olxcdn.com:443/v1/files/555-PL/image;s=640x480'
+    index.check_and_add(3, ad(3, price=2000, image=photo))
+    assert index.check_and_add(4, ad(4, price=1950, image=photo.replace('640x480', '216x152')))['url'] == 'u3'
+
+
+def test_same_seller_with_reuploaded_photo_is_a_repost():
+    index = make_index()
+    index.check_and_add(1, ad(1, seller=10))
+    assert index.check_and_add(2, ad(2, seller=10))['url'] == 'u1'
+
+
+def test_different_sellers_with_same_photo_are_not_reposts():
+    index = make_index()
+    photo = 'https://ireland.apollo.olxcdn.com:443/v1/files/555-PL/image;s=640x480'
+    index.check_and_add(1, ad(1, image=photo, seller=10))
+    assert index.check_and_add(2, ad(2, image=photo, seller=11)) is None
+
+
+def test_identity_survives_save_and_load():
+    index = make_index()
+    index.check_and_add(1, ad(1, image='', seller=10))
+    index.save()
+    loaded = make_index()
+    loaded.path = index.path
+    assert loaded.load() == 1
+    assert loaded.check_and_add(2, ad(2, image='', seller=10)) is not None
+    assert loaded.check_and_add(3, ad(3, image='', seller=12)) is None